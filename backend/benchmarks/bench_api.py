@@ -0,0 +1,393 @@
+"""
+Query-count and latency regression benchmark for the API endpoints.
+
+Seeds a realistic catalogue into a dedicated SQLite database, measures the
+query count, p50/p95 latency and response size of every API endpoint, and
+compares the results against a stored baseline.
+
+Usage::
+
+    # Build the dataset (2,000 series, 40,000 chapters, 1.6M pages)
+    python -m benchmarks.bench_api seed --series 2000 --chapters 20 --pages 40
+
+    # Measure every endpoint and write the results
+    python -m benchmarks.bench_api run --output benchmarks/results/current.json
+
+    # Measure responses served from the API response cache
+    python -m benchmarks.bench_api run --warm
+
+    # Flag regressions against a baseline (exit status 1 on regression)
+    python -m benchmarks.bench_api compare benchmarks/results/baseline.json \\
+        benchmarks/results/current.json
+
+The database and media root can be moved with the ``BENCH_DB`` and
+``BENCH_MEDIA_ROOT`` environment variables.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+from datetime import timedelta
+
+from benchmarks.common import BACKEND_DIR, Timer, print_table, setup_django, summarize
+
+SAMPLE_IMAGE_COUNT = 8
+
+
+def seed(args):
+    """Create the benchmark database and fill it with a synthetic catalogue."""
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from django.utils.timezone import now
+    from PIL import Image
+
+    from reader.models import (
+        Alias, ApprovalStatus, Artist, Author, Category, Chapter, Kind, Page,
+        Series, Status, Volume,
+    )
+
+    db_path = settings.DATABASES['default']['NAME']
+    if os.path.exists(db_path):
+        if not args.reset:
+            sys.exit(f'{db_path} already exists; pass --reset to rebuild it.')
+        connection.close()
+        os.remove(db_path)
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(args.seed)
+
+    # A few real image files so the media endpoint has something to serve
+    sample_dir = os.path.join(settings.MEDIA_ROOT, 'series', 'bench-samples')
+    os.makedirs(sample_dir, exist_ok=True)
+    sample_images = []
+    for index in range(SAMPLE_IMAGE_COUNT):
+        name = f'series/bench-samples/page-{index}.jpg'
+        buffer = io.BytesIO()
+        Image.effect_noise((1000, 1500), 50).convert('RGB').save(buffer, format='JPEG', quality=80)
+        with open(os.path.join(settings.MEDIA_ROOT, name), 'wb') as fileobj:
+            fileobj.write(buffer.getvalue())
+        sample_images.append(name)
+
+    batch = args.batch_size
+    print(f'Seeding {db_path}...')
+    with Timer() as timer, transaction.atomic():
+        authors = Author.objects.bulk_create(
+            [Author(name=f'Author {i}') for i in range(args.people)], batch_size=batch
+        )
+        artists = Artist.objects.bulk_create(
+            [Artist(name=f'Artist {i}') for i in range(args.people)], batch_size=batch
+        )
+        categories = [Category(id=f'category-{i}', name=f'Category {i}', description='')
+                      for i in range(20)]
+        Category.objects.bulk_create(categories)
+
+        statuses, kinds = list(Status.values), list(Kind.values)
+        series_list = Series.objects.bulk_create([
+            Series(
+                title=f'Series {i} {rng.choice(["Blade", "Moon", "Sky", "Ашуу", "Тоо"])}',
+                slug=f'series-{i}',
+                description=f'Synthetic benchmark series number {i}. ' * 5,
+                cover=sample_images[i % SAMPLE_IMAGE_COUNT],
+                status=rng.choice(statuses),
+                kind=rng.choice(kinds),
+            )
+            for i in range(args.series)
+        ], batch_size=batch)
+
+        Series.authors.through.objects.bulk_create([
+            Series.authors.through(series_id=s.pk, author_id=rng.choice(authors).pk)
+            for s in series_list
+        ], batch_size=batch)
+        Series.artists.through.objects.bulk_create([
+            Series.artists.through(series_id=s.pk, artist_id=rng.choice(artists).pk)
+            for s in series_list
+        ], batch_size=batch)
+        Series.categories.through.objects.bulk_create([
+            Series.categories.through(series_id=s.pk, category_id=category.pk)
+            for s in series_list
+            for category in rng.sample(categories, 3)
+        ], batch_size=batch)
+
+        from django.contrib.contenttypes.models import ContentType
+        series_type = ContentType.objects.get_for_model(Series)
+        Alias.objects.bulk_create([
+            Alias(name=f'Alias {s.pk}', content_type=series_type, object_id=s.pk)
+            for s in series_list
+        ], batch_size=batch)
+
+        volumes = Volume.objects.bulk_create([
+            Volume(series=s, number=number)
+            for s in series_list
+            for number in range(1, args.chapters // 10 + 2)
+        ], batch_size=batch)
+        volume_map = {(v.series_id, v.number): v for v in volumes}
+
+        start = now() - timedelta(days=365 * 3)
+        chapters = Chapter.objects.bulk_create([
+            Chapter(
+                title=f'Chapter {number}',
+                number=number,
+                series=s,
+                volume=volume_map[(s.pk, number // 10 + 1)],
+                approval_status=(
+                    ApprovalStatus.APPROVED if rng.random() < 0.9 else ApprovalStatus.PENDING
+                ),
+                published_at=start + timedelta(minutes=rng.randrange(365 * 3 * 24 * 60)),
+                views=rng.randrange(10_000),
+            )
+            for s in series_list
+            for number in range(1, args.chapters + 1)
+        ], batch_size=batch)
+
+        pages = []
+        for chapter in chapters:
+            for number in range(1, args.pages + 1):
+                pages.append(Page(
+                    chapter_id=chapter.pk,
+                    number=number,
+                    image=sample_images[number % SAMPLE_IMAGE_COUNT],
+                    width=1000,
+                    height=1500,
+                    mime_type='image/jpeg',
+                ))
+            if len(pages) >= batch * 10:
+                Page.objects.bulk_create(pages, batch_size=batch)
+                pages = []
+        Page.objects.bulk_create(pages, batch_size=batch)
+
+    # bulk_create() doesn't send the signals that maintain the search index
+    # and the series stats
+    call_command('rebuild_search_index', verbosity=0)
+    call_command('rebuild_series_stats', verbosity=0)
+
+    print(
+        f'Seeded {len(series_list)} series, {len(chapters)} chapters and '
+        f'{len(chapters) * args.pages} pages in {timer.elapsed:.1f}s.'
+    )
+
+
+def build_endpoints():
+    """Return ``(name, path)`` pairs for every endpoint, using seeded objects."""
+    from django.conf import settings
+    from django.db.models import Count
+
+    from reader.models import ApprovalStatus, Artist, Author, Category, Chapter, Page, Series
+
+    series = Series.objects.annotate(n=Count('chapters')).order_by('-n', 'pk').first()
+    chapter = Chapter.objects.filter(
+        series=series, approval_status=ApprovalStatus.APPROVED
+    ).order_by('pk').first()
+    if series is None or chapter is None:
+        sys.exit('The benchmark database is empty; run the seed command first.')
+    author = Author.objects.order_by('pk').first()
+    artist = Artist.objects.order_by('pk').first()
+    category = Category.objects.order_by('pk').first()
+    image = Page.objects.filter(chapter=chapter).order_by('number').first().image.name
+
+    # The last page of each paginated listing
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    series_last_page = max(1, -(-Series.objects.count() // page_size))
+    chapters_last_page = max(
+        1, -(-Chapter.objects.filter(approval_status=ApprovalStatus.APPROVED).count() // page_size)
+    )
+
+    return [
+        ('api-root', '/api/'),
+        ('series-list', '/api/series/'),
+        ('series-list-search', '/api/series/?search=moon'),
+        ('series-list-ordered', '/api/series/?ordering=title'),
+        ('series-list-deep-page', f'/api/series/?page={series_last_page}'),
+        ('series-detail', f'/api/series/{series.pk}/'),
+        ('series-chapters-action', f'/api/series/{series.pk}/chapters/'),
+        ('chapter-list', '/api/chapters/'),
+        ('chapter-list-deep-page', f'/api/chapters/?page={chapters_last_page}'),
+        ('chapter-detail', f'/api/chapters/{chapter.pk}/'),
+        ('chapter-pages-action', f'/api/chapters/{chapter.pk}/pages/'),
+        ('author-list', '/api/authors/'),
+        ('author-detail', f'/api/authors/{author.pk}/'),
+        ('artist-list', '/api/artists/'),
+        ('artist-detail', f'/api/artists/{artist.pk}/'),
+        ('category-list', '/api/categories/'),
+        ('category-detail', f'/api/categories/{category.pk}/'),
+        ('series-chapters-by-slug', f'/api/series/{series.slug}/chapters/'),
+        ('chapter-pages', f'/api/chapters/{chapter.pk}/pages/'),
+        ('media', f'/media/{image}'),
+    ]
+
+
+def measure_endpoint(client, path, runs, before_request=None, headers=None):
+    """Request ``path`` ``runs`` times, returning latency, query and size stats."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # Warm up connection, caches of compiled SQL and imports
+    client.get(path)
+
+    durations, query_counts = [], []
+    status_code, size = None, 0
+    for _ in range(runs):
+        if before_request:
+            before_request()
+        with CaptureQueriesContext(connection) as queries, Timer() as timer:
+            response = client.get(path, headers=headers)
+            content = b''.join(response) if response.streaming else response.content
+        durations.append(timer.elapsed)
+        query_counts.append(len(queries))
+        status_code, size = response.status_code, len(content)
+
+    return {
+        'path': path,
+        'status': status_code,
+        'queries': max(query_counts),
+        'bytes': size,
+        **summarize(durations),
+    }
+
+
+def dataset_summary():
+    """Return the row counts of the seeded dataset."""
+    from reader.models import Chapter, Page, Series
+
+    return {
+        'series': Series.objects.count(),
+        'chapters': Chapter.objects.count(),
+        'pages': Page.objects.count(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Measure every endpoint and write the results as JSON."""
+    from django.core.cache import cache
+    from django.test import Client
+    from django.utils.timezone import now
+
+    client = Client()
+    # Cold runs measure the database path by emptying the response cache
+    # before every request
+    before_request = None if args.warm else cache.clear
+    endpoints = build_endpoints()
+    if args.only:
+        endpoints = [(name, path) for name, path in endpoints if name in args.only]
+
+    results = {}
+    rows = []
+    for name, path in endpoints:
+        result = measure_endpoint(client, path, args.runs, before_request=before_request)
+        results[name] = result
+        rows.append({'endpoint': name, **result})
+
+    report = {
+        'meta': {
+            'created_at': now().isoformat(),
+            'git_revision': git_revision(),
+            'runs': args.runs,
+            'cache': 'warm' if args.warm else 'cold',
+            'dataset': dataset_summary(),
+        },
+        'endpoints': results,
+    }
+
+    print_table(rows, ['endpoint', 'status', 'queries', 'p50_ms', 'p95_ms', 'bytes'])
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as fileobj:
+            json.dump(report, fileobj, indent=2)
+        print(f'\nResults written to {args.output}')
+
+
+def compare(args):
+    """Compare two result files and report regressions."""
+    with open(args.baseline) as fileobj:
+        baseline = json.load(fileobj)['endpoints']
+    with open(args.current) as fileobj:
+        current = json.load(fileobj)['endpoints']
+
+    rows = []
+    regressions = 0
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append({'endpoint': name, 'verdict': 'new'})
+            continue
+
+        problems = []
+        if result['status'] != base['status']:
+            problems.append(f"status {base['status']}->{result['status']}")
+        if result['queries'] > base['queries']:
+            problems.append(f"queries {base['queries']}->{result['queries']}")
+        slower = result['p95_ms'] - base['p95_ms']
+        if slower > args.min_ms and slower > base['p95_ms'] * args.threshold:
+            problems.append(f"p95 +{slower:.1f}ms")
+        if result['bytes'] > base['bytes'] * (1 + args.threshold):
+            problems.append(f"bytes {base['bytes']}->{result['bytes']}")
+
+        regressions += bool(problems)
+        rows.append({
+            'endpoint': name,
+            'queries': f"{base['queries']} -> {result['queries']}",
+            'p95_ms': f"{base['p95_ms']} -> {result['p95_ms']}",
+            'bytes': f"{base['bytes']} -> {result['bytes']}",
+            'verdict': 'REGRESSION: ' + ', '.join(problems) if problems else 'ok',
+        })
+
+    print_table(rows, ['endpoint', 'queries', 'p95_ms', 'bytes', 'verdict'])
+    if regressions:
+        print(f'\n{regressions} endpoint(s) regressed.')
+        sys.exit(1)
+    print('\nNo regressions.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help='Build the benchmark dataset')
+    seed_parser.add_argument('--series', type=int, default=2000)
+    seed_parser.add_argument('--chapters', type=int, default=20, help='Chapters per series')
+    seed_parser.add_argument('--pages', type=int, default=40, help='Pages per chapter')
+    seed_parser.add_argument('--people', type=int, default=500, help='Authors and artists')
+    seed_parser.add_argument('--batch-size', type=int, default=2000)
+    seed_parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    seed_parser.add_argument('--reset', action='store_true', help='Replace an existing dataset')
+
+    run_parser = subparsers.add_parser('run', help='Measure every endpoint')
+    run_parser.add_argument('--runs', type=int, default=20, help='Requests per endpoint')
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--only', nargs='+', help='Only measure these endpoints')
+    run_parser.add_argument('--warm', action='store_true',
+                            help='Keep the response cache between requests')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare results to a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='Allowed relative p95/size increase (default: 0.2)')
+    compare_parser.add_argument('--min-ms', type=float, default=1.0,
+                                help='Ignore p95 increases smaller than this (default: 1ms)')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        compare(args)
+        return
+
+    setup_django()
+    {'seed': seed, 'run': run}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
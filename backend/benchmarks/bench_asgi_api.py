@@ -0,0 +1,185 @@
+"""
+Load test of the API under the ASGI application and under WSGI threads.
+
+Seeds a small catalogue into a temporary SQLite database, adds
+``--db-latency-ms`` to every query (the round trip to a database server),
+and sends ``--requests`` series list requests through:
+
+- ``wsgi``: Django's WSGI handler on ``--threads`` threads, as a gunicorn
+  ``gthread`` worker serves them
+- ``asgi``: ``mangakg.asgi.application`` on one event loop with every request
+  in flight, once for each ``--limits`` value of ``ASGI_DJANGO_CONCURRENCY``
+
+Reported per run: throughput, latency (including the wait for a thread or a
+slot) and the threads alive at the peak, each of which holds a database
+connection while it serves a request.
+
+Usage::
+
+    python -m benchmarks.bench_asgi_api --requests 400 --db-latency-ms 5 --limits 1,8,1000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import Timer, print_table, setup_django, summarize
+
+PATH = '/api/series/'
+
+
+class Probe:
+    """Records the peak number of threads."""
+
+    def __init__(self):
+        self.peak_threads = threading.active_count()
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+def seed(series_count):
+    from reader.models import ApprovalStatus, Chapter, Series
+
+    series = Series.objects.bulk_create(
+        Series(title=f'Series {i}', slug=f'series-{i}') for i in range(series_count)
+    )
+    Chapter.objects.bulk_create(
+        Chapter(series=item, title=f'Chapter {number}', number=number, approval_status=ApprovalStatus.APPROVED)
+        for item in series for number in range(1, 6)
+    )
+
+
+def add_latency(latency, probe):
+    """Delay every query by ``latency`` seconds on every connection."""
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        probe.sample()
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # A thread's connection object reconnects for every request
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+    return lambda: connection_created.disconnect(install)
+
+
+def run_wsgi(count, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    started = time.perf_counter()
+
+    def request(_):
+        response = handler.get_response(factory.get(PATH))
+        response.close()
+        return time.perf_counter() - started, response.status_code
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(request, range(count)))
+
+
+async def run_asgi(count):
+    from mangakg.asgi import application
+
+    started = time.perf_counter()
+
+    async def request():
+        status = None
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                # The client stays connected until the response is sent
+                await asyncio.Event().wait()
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': PATH, 'query_string': b'', 'http_version': '1.1',
+            'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 1),
+        }
+        await application(scope, receive, send)
+        return time.perf_counter() - started, status
+
+    return await asyncio.gather(*(request() for _ in range(count)))
+
+
+def report(mode, limit, results, elapsed, probe):
+    return {
+        'server': mode,
+        'threads_or_limit': limit,
+        'requests': len(results),
+        'ok': sum(1 for _, status in results if status == 200),
+        'req_per_s': round(len(results) / elapsed, 1),
+        **summarize([latency for latency, _ in results]),
+        'peak_threads': probe.peak_threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400, help='Requests per run')
+    parser.add_argument('--series', type=int, default=200, help='Series to seed')
+    parser.add_argument('--db-latency-ms', type=float, default=5, help='Added to every query')
+    parser.add_argument('--threads', type=int, default=8, help='Threads of the WSGI run')
+    parser.add_argument('--limits', default='1,8,1000', help='ASGI_DJANGO_CONCURRENCY values to run')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-asgi-')
+    os.environ['BENCH_DB'] = os.path.join(workdir, 'bench.sqlite3')
+    setup_django()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    call_command('migrate', verbosity=0)
+    seed(args.series)
+
+    rows = []
+    # The API response cache would answer all but the first request
+    dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    with override_settings(CACHES={**settings.CACHES, 'default': dummy}):
+        probe = Probe()
+        remove = add_latency(args.db_latency_ms / 1000, probe)
+        with Timer() as timer:
+            results = run_wsgi(args.requests, args.threads)
+        remove()
+        rows.append(report('wsgi', args.threads, results, timer.elapsed, probe))
+
+        for limit in (int(value) for value in args.limits.split(',')):
+            probe = Probe()
+            remove = add_latency(args.db_latency_ms / 1000, probe)
+            with override_settings(ASGI_DJANGO_CONCURRENCY=limit), Timer() as timer:
+                results = asyncio.run(run_asgi(args.requests))
+            remove()
+            rows.append(report('asgi', limit, results, timer.elapsed, probe))
+
+    print(f'{args.requests} requests of {PATH}, {args.db_latency_ms:g} ms per query\n')
+    print_table(rows, [
+        'server', 'threads_or_limit', 'requests', 'ok', 'req_per_s', 'p50_ms', 'p95_ms',
+        'peak_threads',
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark of conditional GET requests against the API.
+
+For every cached API endpoint, compares an unconditional request (with the
+response cache emptied, and served from the response cache) with a repeat
+request that sends the ``ETag`` back in ``If-None-Match`` and gets a 304.
+Uses the dataset seeded by ``benchmarks.bench_api seed``.
+
+Usage::
+
+    python -m benchmarks.bench_conditional --runs 50
+"""
+
+import argparse
+
+from benchmarks.common import print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='Requests per endpoint and mode')
+    parser.add_argument('--only', nargs='+', help='Only measure these endpoints')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.cache import cache
+    from django.test import Client
+
+    from benchmarks.bench_api import build_endpoints, measure_endpoint
+
+    client = Client()
+    endpoints = [
+        (name, path) for name, path in build_endpoints()
+        if name != 'media' and (not args.only or name in args.only)
+    ]
+
+    rows = []
+    for name, path in endpoints:
+        response = client.get(path)
+        etag = response.get('ETag')
+        if etag is None:
+            continue
+
+        cold = measure_endpoint(client, path, args.runs, before_request=cache.clear)
+        warm = measure_endpoint(client, path, args.runs)
+        # Clearing the cache would also reset the stamps behind the ETag
+        revalidated = measure_endpoint(
+            client, path, args.runs, headers={'If-None-Match': client.get(path)['ETag']}
+        )
+        for mode, result in (('full', cold), ('cached', warm), ('304', revalidated)):
+            rows.append({'endpoint': name, 'mode': mode, **result})
+
+    print_table(rows, ['endpoint', 'mode', 'status', 'queries', 'p50_ms', 'p95_ms', 'bytes'])
+
+
+if __name__ == '__main__':
+    main()
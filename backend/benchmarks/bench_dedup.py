@@ -0,0 +1,123 @@
+"""
+Benchmark re-uploading a chapter with and without page deduplication.
+
+Processes the same synthetic archive twice into a chapter, as when an
+uploader replaces a chapter archive, and reports the upload time and storage
+used with ``PAGE_DEDUPLICATION`` off and on. Runs against a throwaway SQLite
+database and media root. ``--latency-ms`` adds an artificial delay to every
+storage write to approximate the round-trip of an object storage PUT.
+
+Usage::
+
+    python -m benchmarks.bench_dedup --pages 200 --latency-ms 20
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_ingestion import build_archive
+from benchmarks.common import Timer, print_table, setup_django
+
+
+def add_storage_latency(latency, counter):
+    """Make local storage writes sleep ``latency`` seconds and count them."""
+    from django.core.files.storage import FileSystemStorage
+
+    save = FileSystemStorage._save
+
+    def _save(self, name, content):
+        time.sleep(latency)
+        counter['writes'] += 1
+        return save(self, name, content)
+
+    FileSystemStorage._save = _save
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def measure(label, archive_path, media_root, counter, deduplicate):
+    """Process the archive into a new chapter twice, timing each run."""
+    from django.core.files import File
+    from django.test import override_settings
+
+    from reader.models import Chapter, Series
+
+    with override_settings(PAGE_DEDUPLICATION=deduplicate):
+        series = Series.objects.create(title=f'Bench {label}')
+        chapter = Chapter.objects.create(title='Chapter 1', number=1, series=series)
+        runs = []
+        for _ in range(2):
+            counter['writes'] = 0
+            with open(archive_path, 'rb') as fileobj:
+                chapter.file = File(fileobj, name='chapter.zip')
+                chapter.save(update_fields=['file'])
+            with Timer() as timer:
+                chapter.process_uploaded_file()
+            runs.append((timer.elapsed, counter['writes']))
+
+    (first, _), (second, writes) = runs
+    stored = directory_size(os.path.join(media_root, 'series', series.slug))
+    return {
+        'dedup': 'on' if deduplicate else 'off',
+        'upload_s': f'{first:.2f}',
+        'reupload_s': f'{second:.2f}',
+        'reupload_writes': writes,
+        'stored_mb': f'{stored / (1024 * 1024):.1f}',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--latency-ms', type=float, default=20.0,
+                        help='Simulated storage latency per upload')
+    parser.add_argument('--derivatives', type=int, nargs='*', default=[],
+                        help='Also render derivatives of these widths (e.g. 480 960)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-dedup-')
+    media_root = os.path.join(workdir, 'media')
+    os.environ['BENCH_DB'] = os.path.join(workdir, 'bench.sqlite3')
+    os.environ['BENCH_MEDIA_ROOT'] = media_root
+    setup_django()
+
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    try:
+        call_command('migrate', verbosity=0)
+        archive_path = os.path.join(workdir, 'chapter.zip')
+        print(f'Building {args.pages}-page archive ({args.width}x{args.height})...')
+        build_archive(archive_path, args.pages, args.width, args.height)
+        print(f'Storage latency: {args.latency_ms} ms\n')
+
+        counter = {'writes': 0}
+        add_storage_latency(args.latency_ms / 1000, counter)
+        with override_settings(PAGE_DERIVATIVE_WIDTHS=args.derivatives):
+            rows = [
+                measure('without dedup', archive_path, media_root, counter, False),
+                measure('with dedup', archive_path, media_root, counter, True),
+            ]
+        print_table(rows, ['dedup', 'upload_s', 'reupload_s', 'reupload_writes', 'stored_mb'])
+
+        before, after = rows
+        saved_s = float(before['reupload_s']) - float(after['reupload_s'])
+        saved_mb = float(before['stored_mb']) - float(after['stored_mb'])
+        print(f'\nRe-upload: {saved_s:.2f}s faster, {saved_mb:.1f} MB less storage')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
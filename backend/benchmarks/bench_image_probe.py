@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the per-page image parsing cost during ingestion.
+
+Compares the legacy double parse (``Image.open().verify()`` followed by a
+second ``Image.open`` for the dimensions) with ``probe_image``, with and
+without full verification, over JPEG, PNG and WebP fixtures.
+
+Usage::
+
+    python -m benchmarks.bench_image_probe --width 1200 --height 1800
+"""
+
+import argparse
+import io
+import time
+
+from benchmarks.common import print_table, setup_django
+
+
+def make_fixture(fmt, width, height):
+    """Return a noisy test page encoded as ``fmt``."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 60).convert('RGB').save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def legacy_probe(data):
+    """The parse sequence used before ``reader.imaging``."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.verify()
+    img = Image.open(io.BytesIO(data))
+    return img.width, img.height, img.get_format_mimetype()
+
+
+def cpu_per_call(func, data, repeat):
+    """Return the mean CPU time of ``func(data)`` in microseconds."""
+    func(data)  # Warm up plugin imports
+    start = time.process_time()
+    for _ in range(repeat):
+        func(data)
+    return (time.process_time() - start) / repeat * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=1800)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from reader.imaging import probe_image
+
+    rows = []
+    for fmt in ('JPEG', 'PNG', 'WEBP'):
+        data = make_fixture(fmt, args.width, args.height)
+        legacy = cpu_per_call(legacy_probe, data, args.repeat)
+        header = cpu_per_call(probe_image, data, args.repeat)
+        verified = cpu_per_call(lambda d: probe_image(d, verify=True), data, args.repeat)
+        rows.append({
+            'format': fmt,
+            'size_kb': len(data) // 1024,
+            'legacy_us': f'{legacy:.1f}',
+            'probe_us': f'{header:.1f}',
+            'probe+verify_us': f'{verified:.1f}',
+            'speedup': f'{legacy / header:.1f}x' if header else 'n/a',
+        })
+
+    print(f'CPU time per page ({args.width}x{args.height}, {args.repeat} runs)\n')
+    print_table(rows, ['format', 'size_kb', 'legacy_us', 'probe_us', 'probe+verify_us', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark chapter ingestion: the legacy serial loop against ``ChapterIngestor``.
+
+Builds a synthetic archive of noisy JPEG pages and ingests it into a
+temporary local storage. ``--latency-ms`` adds an artificial delay to every
+storage write to approximate the round-trip of an object storage PUT.
+
+Usage::
+
+    python -m benchmarks.bench_ingestion --pages 500 --latency-ms 20
+"""
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from hashlib import blake2b
+
+from benchmarks.common import Timer, print_table, setup_django
+
+
+def build_archive(path, pages, width, height):
+    """Write a ZIP archive with ``pages`` synthetic JPEG pages to ``path``."""
+    from PIL import Image
+
+    # A handful of distinct noise images keeps generation fast while still
+    # giving the encoder realistic, incompressible content.
+    variants = []
+    for seed in range(8):
+        buffer = io.BytesIO()
+        noise = Image.effect_noise((width, height), 40 + seed * 5).convert('RGB')
+        noise.save(buffer, format='JPEG', quality=85)
+        variants.append(buffer.getvalue())
+
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for number in range(1, pages + 1):
+            # Append the page number so every member hashes differently
+            zf.writestr(f'{number:04}.jpg', variants[number % len(variants)] + number.to_bytes(4, 'big'))
+
+
+def make_storage(location, latency):
+    """Return a local storage that sleeps ``latency`` seconds per write."""
+    from django.core.files.storage import FileSystemStorage
+
+    class LatencyStorage(FileSystemStorage):
+        def _save(self, name, content):
+            time.sleep(latency)
+            return super()._save(name, content)
+
+    return LatencyStorage(location=location)
+
+
+def legacy_ingest(archive_path, storage, base_path):
+    """The original serial loop from ``Chapter.process_uploaded_file``."""
+    from django.core.files.base import ContentFile
+    from PIL import Image
+
+    pages = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for number, name in enumerate(sorted(zf.namelist()), start=1):
+            data = zf.read(name)
+            img = Image.open(io.BytesIO(data))
+            img.verify()
+            file_hash = blake2b(data, digest_size=16).hexdigest()
+            ext = os.path.splitext(name)[-1]
+            saved_path = storage.save(f'{base_path}/{file_hash}{ext}', ContentFile(data))
+            img = Image.open(io.BytesIO(data))
+            pages.append((number, saved_path, img.width, img.height, img.get_format_mimetype()))
+    return pages
+
+
+def pipeline_ingest(archive_path, storage, base_path, workers, upload_concurrency,
+                    derivative_widths=(), render_processes=0):
+    """Ingest with the streaming, parallel ``ChapterIngestor``."""
+    from reader.ingestion import ChapterIngestor
+
+    with open(archive_path, 'rb') as fileobj:
+        return ChapterIngestor(
+            base_path, storage=storage, workers=workers,
+            upload_concurrency=upload_concurrency,
+            derivative_widths=derivative_widths, render_processes=render_processes,
+        ).ingest_archive(fileobj)
+
+
+def measure(label, func, pages):
+    """Run ``func`` once, reporting wall time, throughput and peak memory."""
+    tracemalloc.start()
+    with Timer() as timer:
+        result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == pages, f'{label} ingested {len(result)} of {pages} pages'
+    return {
+        'engine': label,
+        'seconds': f'{timer.elapsed:.2f}',
+        'pages/sec': f'{pages / timer.elapsed:.1f}',
+        'peak_mem_mb': f'{peak / (1024 * 1024):.1f}',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--latency-ms', type=float, default=20.0,
+                        help='Simulated storage latency per upload')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--upload-concurrency', type=int, default=8)
+    parser.add_argument('--derivatives', type=int, nargs='*',
+                        help='Also measure rendering derivatives of these widths (e.g. 480 960)')
+    parser.add_argument('--render-processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-ingest-')
+    os.environ['BENCH_DB'] = os.path.join(workdir, 'bench.sqlite3')
+    setup_django()
+
+    from django.core.management import call_command
+
+    try:
+        call_command('migrate', verbosity=0)
+        archive_path = os.path.join(workdir, 'chapter.zip')
+        print(f'Building {args.pages}-page archive ({args.width}x{args.height})...')
+        build_archive(archive_path, args.pages, args.width, args.height)
+        size_mb = os.path.getsize(archive_path) / (1024 * 1024)
+        print(f'Archive size: {size_mb:.1f} MB, storage latency: {args.latency_ms} ms\n')
+
+        latency = args.latency_ms / 1000
+        rows = [
+            measure('serial (legacy)', lambda: legacy_ingest(
+                archive_path, make_storage(os.path.join(workdir, 'legacy'), latency), 'bench'
+            ), args.pages),
+            measure(
+                f'pipeline (w={args.workers}, u={args.upload_concurrency})',
+                lambda: pipeline_ingest(
+                    archive_path, make_storage(os.path.join(workdir, 'pipeline'), latency),
+                    'bench', args.workers, args.upload_concurrency
+                ),
+                args.pages,
+            ),
+        ]
+        if args.derivatives:
+            rows.append(measure(
+                f'pipeline + derivatives {args.derivatives} (p={args.render_processes})',
+                lambda: pipeline_ingest(
+                    archive_path, make_storage(os.path.join(workdir, 'derivatives'), latency),
+                    'bench', args.workers, args.upload_concurrency,
+                    args.derivatives, args.render_processes,
+                ),
+                args.pages,
+            ))
+        print_table(rows, ['engine', 'seconds', 'pages/sec', 'peak_mem_mb'])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Load test of the sync and async media proxy paths against a local fake S3.
+
+Starts an S3-compatible server on localhost that answers every ``GetObject``
+after ``--latency-ms`` (the time to first byte of the bucket), then downloads
+``--requests`` page images through:
+
+- ``sync``: ``reader.media.serve_media`` on ``--sync-workers`` threads, as
+  gunicorn's sync workers serve it under WSGI
+- ``async``: ``reader.media_proxy.MediaProxy`` on one event loop with
+  ``--concurrency`` downloads in flight, as under ASGI
+
+Latencies include the time a request waits for a free worker.
+
+Usage::
+
+    python -m benchmarks.bench_media_proxy --requests 500 --concurrency 200 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import Timer, print_table, setup_django, summarize
+
+
+def fake_s3(size, latency):
+    """An ASGI app serving a ``size``-byte object at every key after ``latency`` seconds."""
+    body = bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        await asyncio.sleep(latency)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'image/jpeg'),
+            (b'content-length', str(size).encode()),
+            (b'etag', b'"bench"'),
+        ]})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        for start in range(0, size, 64 * 1024):
+            await send({'type': 'http.response.body', 'body': body[start:start + 64 * 1024], 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    return app
+
+
+def start_server(app):
+    """Serve ``app`` on a free local port in a background thread; returns the port."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        app, host='127.0.0.1', port=port, log_level='warning', lifespan='off', backlog=4096
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+def run_sync(storage, names, workers):
+    """Download ``names`` through the WSGI view code on ``workers`` threads."""
+    from django.test import RequestFactory
+
+    from reader.media import serve_media
+
+    factory = RequestFactory()
+    started = time.perf_counter()
+
+    def download(name):
+        response = serve_media(factory.get(f'/media/{name}'), name, storage)
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        return time.perf_counter() - started, response.status_code, size
+
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(download, names))
+
+
+async def run_async(storage, names, concurrency):
+    """Download ``names`` through ``MediaProxy`` with ``concurrency`` requests in flight."""
+    from reader.media_proxy import MediaProxy, close_client
+
+    proxy = MediaProxy(None, storage=storage)
+    prefix = proxy.prefix
+    limit = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def download(name):
+        async with limit:
+            status, size = None, 0
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                nonlocal status, size
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                else:
+                    size += len(message['body'])
+
+            scope = {'type': 'http', 'method': 'GET', 'path': prefix + name, 'headers': []}
+            await proxy(scope, receive, send)
+            return time.perf_counter() - started, status, size
+
+    try:
+        return await asyncio.gather(*(download(name) for name in names))
+    finally:
+        await close_client()
+
+
+def report(mode, workers, results, elapsed):
+    latencies = [latency for latency, _, _ in results]
+    ok = sum(1 for _, status, _ in results if status == 200)
+    return {
+        'path': mode,
+        'workers': workers,
+        'requests': len(results),
+        'ok': ok,
+        'req_per_s': round(len(results) / elapsed, 1),
+        'MB_per_s': round(sum(size for _, _, size in results) / elapsed / 1024 ** 2, 1),
+        **summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400, help='Downloads per path')
+    parser.add_argument('--size', type=int, default=300 * 1024, help='Object size in bytes')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Fake S3 time to first byte')
+    parser.add_argument('--sync-workers', type=int, default=2, help='Threads of the sync path')
+    parser.add_argument('--concurrency', type=int, default=200, help='Downloads in flight on the async path')
+    parser.add_argument('--only', choices=['sync', 'async'], help='Only run one path')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import override_settings
+
+    port = start_server(fake_s3(args.size, args.latency_ms / 1000))
+    names = [f'series/bench/ch1/{i:05d}.jpg' for i in range(args.requests)]
+
+    with override_settings(
+        AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench', AWS_STORAGE_BUCKET_NAME='bench',
+        AWS_S3_ENDPOINT_URL=f'http://127.0.0.1:{port}', AWS_S3_ADDRESSING_STYLE='path',
+        MEDIA_CACHE_DIR='', MEDIA_PROXY_MAX_CONNECTIONS=args.concurrency,
+    ):
+        from reader.storage import TigrisMediaStorage
+
+        storage = TigrisMediaStorage()
+        print(f'Fake S3 on port {port}: {args.size // 1024} KiB objects, '
+              f'{args.latency_ms:g} ms to first byte\n')
+
+        rows = []
+        if args.only in (None, 'sync'):
+            with Timer() as timer:
+                results = run_sync(storage, names, args.sync_workers)
+            rows.append(report('sync', args.sync_workers, results, timer.elapsed))
+        if args.only in (None, 'async'):
+            with Timer() as timer:
+                results = asyncio.run(run_async(storage, names, args.concurrency))
+            rows.append(report('async', args.concurrency, results, timer.elapsed))
+
+    print_table(rows, ['path', 'workers', 'requests', 'ok', 'req_per_s', 'MB_per_s', 'p50_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of deep pages in page-number and cursor pagination.
+
+For the series and chapter listings, measures the latency and query count of
+page N in page-number mode (``?page=N``) against the same page in cursor
+mode, reached by following ``next`` links. Uses the dataset seeded by
+``benchmarks.bench_api seed``, with the response cache emptied before every
+request.
+
+Usage::
+
+    # 100,000 chapters
+    python -m benchmarks.bench_api seed --series 5000 --chapters 20 --pages 1
+
+    python -m benchmarks.bench_pagination --runs 20
+"""
+
+import argparse
+
+from benchmarks.common import print_table, setup_django
+
+LISTINGS = (
+    ('series', '/api/series/'),
+    ('chapters', '/api/chapters/'),
+)
+
+
+def cursor_url(client, path, depth):
+    """Return the URL of page ``depth`` of ``path`` in cursor mode."""
+    url = f'{path}?pagination=cursor'
+    for _ in range(depth - 1):
+        next_url = client.get(url).json()['next']
+        if next_url is None:
+            break
+        url = next_url
+    return url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='Requests per page')
+    parser.add_argument('--depths', type=int, nargs='+',
+                        help='Page numbers to measure (default: 1, 10, 100 and the last)')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import Client
+
+    from benchmarks.bench_api import measure_endpoint
+    from reader.models import ApprovalStatus, Chapter, Series
+
+    client = Client()
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    totals = {
+        'series': Series.objects.count(),
+        'chapters': Chapter.objects.filter(approval_status=ApprovalStatus.APPROVED).count(),
+    }
+
+    rows = []
+    for name, path in LISTINGS:
+        last_page = max(1, -(-totals[name] // page_size))
+        depths = sorted({min(depth, last_page) for depth in args.depths or (1, 10, 100, last_page)})
+        for depth in depths:
+            modes = (
+                ('page', f'{path}?page={depth}'),
+                ('cursor', cursor_url(client, path, depth)),
+            )
+            for mode, url in modes:
+                result = measure_endpoint(client, url, args.runs, before_request=cache.clear)
+                rows.append({'listing': name, 'page': depth, 'mode': mode, **result})
+
+    print_table(rows, ['listing', 'page', 'mode', 'status', 'queries', 'p50_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark of the typeahead index against database search.
+
+Builds the in-process suggestion index from the dataset seeded by
+``benchmarks.bench_api seed``, optionally padded with synthetic titles that
+only exist in the index, and times lookups for prefixes, misspellings and transliterations of random
+titles. Short prefixes are expected to miss; they show the latency of
+broad queries. Each lookup is compared with the full-text search filter and with the
+``icontains`` search the API used before it, reporting latency and how often
+the intended series is among the first 10 results.
+
+Usage::
+
+    # 50,000 series in the database
+    python -m benchmarks.bench_api seed --series 50000 --chapters 1 --pages 1
+    python -m benchmarks.bench_suggest --queries 200
+
+    # Only the index, padded to 50,000 titles
+    python -m benchmarks.bench_suggest --queries 200 --synthetic 50000 --skip-db
+"""
+
+import argparse
+import random
+
+from benchmarks.common import Timer, print_table, setup_django, summarize
+
+# Synthetic titles are built from made-up words, so their trigrams are about
+# as varied as those of real titles
+ONSETS = {
+    'latin': ['', 'b', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w',
+              'y', 'z', 'sh', 'ch', 'ts', 'kr', 'br', 'st', 'gr', 'th', 'pl'],
+    'cyrillic': ['', 'б', 'д', 'ж', 'з', 'к', 'л', 'м', 'н', 'п', 'р', 'с', 'т', 'ч', 'ш', 'кр', 'ст'],
+}
+VOWELS = {
+    'latin': ['a', 'e', 'i', 'o', 'u', 'ai', 'ou', 'ei', 'ya', 'yu', 'oo'],
+    'cyrillic': ['а', 'е', 'и', 'о', 'у', 'ө', 'ү', 'ы', 'ай', 'ой', 'уу'],
+}
+CODAS = {
+    'latin': ['', '', 'n', 'r', 's', 'l', 'k', 't', 'm', 'ng'],
+    'cyrillic': ['', '', 'н', 'р', 'с', 'л', 'к', 'т', 'м', 'ң'],
+}
+COMMON_WORDS = ['no', 'the', 'of', 'жана', 'ai', 'kun']
+LEGACY_SEARCH_FIELDS = ['title', 'description', 'authors__name', 'artists__name', 'aliases__name']
+
+
+def synthetic_title(rng):
+    script = 'cyrillic' if rng.random() < 0.3 else 'latin'
+    words = [
+        ''.join(
+            rng.choice(ONSETS[script]) + rng.choice(VOWELS[script]) + rng.choice(CODAS[script])
+            for _ in range(rng.randint(1, 3))
+        )
+        for _ in range(rng.randint(1, 3))
+    ]
+    if rng.random() < 0.3:
+        words.insert(1, rng.choice(COMMON_WORDS))
+    return ' '.join(words).title()
+
+
+def misspell(rng, text):
+    """Drop one letter from the middle of ``text``."""
+    if len(text) < 5:
+        return text
+    index = rng.randrange(2, len(text) - 2)
+    return text[:index] + text[index + 1:]
+
+
+def make_queries(rng, titles, count):
+    """Return ``(kind, query, series ID)`` triples for random titles."""
+    from reader.suggest import transliterate
+
+    queries = []
+    for series_id, title in rng.sample(titles, min(count, len(titles))):
+        queries.append(('short', title[:3], series_id))
+        queries.append(('prefix', title[:max(3, len(title) // 2)], series_id))
+        queries.append(('typo', misspell(rng, title), series_id))
+        queries.append(('latin', transliterate(title), series_id))
+    return queries
+
+
+def legacy_search(queryset, query):
+    """Filter ``queryset`` the way ``SearchFilter`` did over ``LEGACY_SEARCH_FIELDS``."""
+    from django.db.models import Q
+
+    for term in query.split():
+        condition = Q()
+        for field in LEGACY_SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    return queryset.distinct()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queries', type=int, default=100, help='Titles to query per kind')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Pad the index with synthetic titles up to this many series')
+    parser.add_argument('--skip-db', action='store_true', help='Only time the in-memory index')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from reader import search
+    from reader.models import Series
+    from reader.suggest import SuggestIndex, load_series
+
+    rng = random.Random(args.seed)
+    rows = load_series()
+    database_ids = set(rows)
+    print(f'Loaded {len(rows)} series from the database')
+    for series_id in range(max(rows, default=0) + 1, max(rows, default=0) + 1 + args.synthetic - len(rows)):
+        rows[series_id] = (synthetic_title(rng), f'synthetic-{series_id}', [])
+
+    with Timer() as timer:
+        index = SuggestIndex.from_rows(rows)
+    print(f'Indexed {len(index)} series in {timer.elapsed * 1000:.0f}ms')
+
+    # Query titles that are in the database too, so every mode can find them
+    titles = [(series_id, entry[0]) for series_id, entry in index.series.items()]
+    if database_ids and not args.skip_db:
+        titles = [(series_id, title) for series_id, title in titles if series_id in database_ids]
+    queries = make_queries(rng, titles, args.queries)
+
+    modes = {'suggest': lambda query: [item['id'] for item in index.suggest(query)]}
+    if not args.skip_db:
+        series = Series.objects.order_by()
+        modes['fts'] = lambda query: list(
+            search.search(series, query).order_by('-search_rank').values_list('pk', flat=True)[:10]
+        )
+        modes['icontains'] = lambda query: list(
+            legacy_search(series, query).values_list('pk', flat=True)[:10]
+        )
+
+    rows = []
+    for kind in ('short', 'prefix', 'typo', 'latin'):
+        batch = [(query, series_id) for query_kind, query, series_id in queries if query_kind == kind]
+        for mode, lookup in modes.items():
+            durations, found = [], 0
+            for query, series_id in batch:
+                with Timer() as timer:
+                    results = lookup(query)
+                durations.append(timer.elapsed)
+                found += series_id in results
+            rows.append({
+                'query': kind,
+                'mode': mode,
+                'found': f'{found / len(batch):.0%}' if batch else '-',
+                **summarize(durations),
+            })
+
+    print_table(rows, ['query', 'mode', 'runs', 'found', 'p50_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
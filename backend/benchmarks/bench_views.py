@@ -0,0 +1,126 @@
+"""
+Stress test of chapter view counting with concurrent readers.
+
+Threads count views of a small set of hot chapters from the dataset seeded by
+``benchmarks.bench_api seed``, either by incrementing ``Chapter.views`` once
+per view (``direct``) or through the write-behind counter in
+``reader.tracking`` (``buffered``). Reports the views counted per second, the
+latency of a single view, how many views failed (e.g. SQLite's "database is
+locked") and whether the stored counts add up. Duplicate filtering is
+disabled so every view is counted.
+
+Usage::
+
+    python -m benchmarks.bench_api seed --series 200 --chapters 10 --pages 1
+    python -m benchmarks.bench_views --threads 1 4 16 --views 2000
+"""
+
+import argparse
+import threading
+
+from benchmarks.common import Timer, print_table, setup_django, summarize
+
+
+def direct_view(chapter_id):
+    from django.db.models import F
+    from reader.models import Chapter
+
+    Chapter.objects.filter(pk=chapter_id).update(views=F('views') + 1)
+
+
+def buffered_view(request, chapter_id):
+    from reader import tracking
+
+    tracking.record_view(request, chapter_id)
+
+
+def run(mode, threads, views, chapter_ids):
+    """Count ``views`` views per thread; returns durations, failures and elapsed time."""
+    from django.db import connection
+    from django.test import RequestFactory
+
+    from reader import tracking
+
+    request = RequestFactory().get('/')
+    durations, failures = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def reader(offset):
+        local_durations, local_failures = [], 0
+        start.wait()
+        try:
+            for i in range(views):
+                chapter_id = chapter_ids[(offset + i) % len(chapter_ids)]
+                try:
+                    with Timer() as timer:
+                        if mode == 'direct':
+                            direct_view(chapter_id)
+                        else:
+                            buffered_view(request, chapter_id)
+                    local_durations.append(timer.elapsed)
+                except Exception:
+                    local_failures += 1
+        finally:
+            connection.close()
+        with lock:
+            durations.extend(local_durations)
+            failures.append(local_failures)
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    with Timer() as timer:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        tracking.flush()
+    return durations, sum(failures), timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--views', type=int, default=1000, help='Views per thread')
+    parser.add_argument('--chapters', type=int, default=10, help='Number of hot chapters')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='Seconds between flushes')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db.models import Sum
+
+    from reader import tracking
+    from reader.models import ApprovalStatus, Chapter
+
+    settings.VIEW_DEDUPE_WINDOW = 0
+    settings.VIEW_FLUSH_INTERVAL = args.flush_interval
+
+    chapters = Chapter.objects.filter(approval_status=ApprovalStatus.APPROVED)
+    chapter_ids = list(chapters.order_by('pk').values_list('pk', flat=True)[:args.chapters])
+    if not chapter_ids:
+        parser.error('No approved chapters; seed the benchmark database first')
+    hot = Chapter.objects.filter(pk__in=chapter_ids)
+
+    rows = []
+    for threads in args.threads:
+        for mode in ('direct', 'buffered'):
+            tracking.reset()
+            before = hot.aggregate(total=Sum('views'))['total']
+            durations, failures, elapsed = run(mode, threads, args.views, chapter_ids)
+            stored = hot.aggregate(total=Sum('views'))['total'] - before
+            rows.append({
+                'threads': threads,
+                'mode': mode,
+                'views_per_s': round(len(durations) / elapsed),
+                'failed': failures,
+                'stored_ok': stored == len(durations),
+                **summarize(durations),
+            })
+
+    print_table(rows, ['threads', 'mode', 'runs', 'views_per_s', 'failed', 'stored_ok',
+                       'p50_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Django settings for running the MangaKG benchmarks.
+
+Uses a dedicated SQLite database and local media directory so benchmark runs
+never touch development or production data.
+"""
+
+import os
+import warnings
+from pathlib import Path
+
+from mangakg.settings import *  # noqa: F401,F403
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('BENCH_DB', str(BENCH_DIR / 'bench.sqlite3')),
+    }
+}
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MEDIA_URL = '/media/'
+MEDIA_ROOT = Path(os.getenv('BENCH_MEDIA_ROOT', str(BENCH_DIR / 'media')))
+
+# Benchmarks hammer the API far beyond the public rate limits
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_THROTTLE_CLASSES': [],
+}
+
+# collectstatic is not needed to benchmark the API
+warnings.filterwarnings('ignore', message='No directory at', module='django.core.handlers.base')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'root': {'level': 'WARNING'},
+}
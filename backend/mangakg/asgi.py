@@ -2,6 +2,8 @@
 ASGI config for mangakg project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Media requests are streamed from storage on the event loop by
+``reader.media_proxy.MediaProxy``; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mangakg.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from reader.media_proxy import MediaProxy  # noqa: E402
+
+application = MediaProxy(django_application)
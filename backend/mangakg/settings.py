@@ -117,6 +117,67 @@ else:
         }
     }
 
+# Cache configuration
+# 'locmem' is per process, so it is only the default for development; use
+# 'file' or 'db' to share the cache (and its invalidations) between gunicorn
+# workers and the processing worker
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem' if DEBUG else 'file')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '20000'))
+
+# The 'stamps' cache holds the few values that must never be evicted: the
+# API cache stamps (see reader.cache) and the typeahead index version. When
+# the default cache is full it culls a third of its entries, and a culled
+# stamp would invalidate every cached response at once.
+STAMPS_MAX_ENTRIES = 1000
+
+if CACHE_BACKEND == 'file':
+    cache_location = os.getenv(
+        'CACHE_LOCATION',
+        '/data/cache' if os.path.exists('/data') else str(BASE_DIR / '.cache')
+    )
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_location,
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+        'stamps': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(cache_location, 'stamps'),
+            'OPTIONS': {'MAX_ENTRIES': STAMPS_MAX_ENTRIES},
+        },
+    }
+elif CACHE_BACKEND == 'db':
+    # Create the tables with `python manage.py createcachetable`
+    cache_location = os.getenv('CACHE_LOCATION', 'mangakg_cache')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': cache_location,
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+        'stamps': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': f'{cache_location}_stamps',
+            'OPTIONS': {'MAX_ENTRIES': STAMPS_MAX_ENTRIES},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mangakg',
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+        'stamps': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mangakg-stamps',
+            'OPTIONS': {'MAX_ENTRIES': STAMPS_MAX_ENTRIES},
+        },
+    }
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '300'))  # Seconds, 0 disables the response cache
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -211,6 +272,48 @@ CORS_ALLOW_HEADERS = [
 FILE_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB
 
+# Chapter ingestion settings
+CHAPTER_INGEST_WORKERS = int(os.getenv('CHAPTER_INGEST_WORKERS', '4'))  # Threads probing pages
+CHAPTER_UPLOAD_CONCURRENCY = int(os.getenv('CHAPTER_UPLOAD_CONCURRENCY', '8'))  # Parallel uploads
+CHAPTER_INGEST_VERIFY_IMAGES = os.getenv('CHAPTER_INGEST_VERIFY_IMAGES', 'False').lower() == 'true'  # Full check, slow
+CHAPTER_RENDER_PROCESSES = int(os.getenv('CHAPTER_RENDER_PROCESSES', str(os.cpu_count() or 1)))  # 0 renders on threads
+PAGE_DEDUPLICATION = os.getenv('PAGE_DEDUPLICATION', 'True').lower() == 'true'  # Reuse stored images with the same content
+
+# Downscaled page copies generated at ingestion for responsive images
+PAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.getenv('PAGE_DERIVATIVE_WIDTHS', '480,960,1600').split(',') if width.strip()]
+PAGE_DERIVATIVE_FORMAT = os.getenv('PAGE_DERIVATIVE_FORMAT', 'WEBP')  # Or AVIF, if Pillow supports it
+PAGE_DERIVATIVE_QUALITY = int(os.getenv('PAGE_DERIVATIVE_QUALITY', '80'))
+
+# On-demand WebP thumbnails (admin: 100/200, series lists: 320)
+THUMBNAIL_WIDTHS = [100, 200, 320]
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '75'))
+
+# Uploaded chapters are processed by `manage.py process_chapters` when enabled
+CHAPTER_PROCESSING_ASYNC = os.getenv('CHAPTER_PROCESSING_ASYNC', 'True').lower() == 'true'
+CHAPTER_PROCESSING_MAX_ATTEMPTS = int(os.getenv('CHAPTER_PROCESSING_MAX_ATTEMPTS', '3'))
+CHAPTER_PROCESSING_RETRY_DELAY = int(os.getenv('CHAPTER_PROCESSING_RETRY_DELAY', '60'))  # Seconds, doubled per attempt
+
+# Local read-through cache of media objects fetched from Tigris (empty disables)
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', '/data/media-cache' if os.path.exists('/data') else '')
+MEDIA_CACHE_MAX_SIZE = int(os.getenv('MEDIA_CACHE_MAX_SIZE', str(2 * 1024 ** 3)))  # Bytes
+MEDIA_CACHE_MAX_OBJECT_SIZE = int(os.getenv('MEDIA_CACHE_MAX_OBJECT_SIZE', str(50 * 1024 ** 2)))  # Bytes
+
+# Async media proxy under ASGI (see reader.media_proxy): one connection pool per process
+MEDIA_PROXY_MAX_CONNECTIONS = int(os.getenv('MEDIA_PROXY_MAX_CONNECTIONS', '100'))
+MEDIA_PROXY_TIMEOUT = float(os.getenv('MEDIA_PROXY_TIMEOUT', '30'))  # Seconds
+# Other requests run at once per ASGI process, each on a thread with its own database connection
+ASGI_DJANGO_CONCURRENCY = int(os.getenv('ASGI_DJANGO_CONCURRENCY', '8'))
+
+# How API responses link media files: proxy, direct or presigned (see reader.media_urls)
+MEDIA_URL_STRATEGY = os.getenv('MEDIA_URL_STRATEGY', 'proxy')
+MEDIA_URL_PRESIGN_EXPIRY = int(os.getenv('MEDIA_URL_PRESIGN_EXPIRY', '3600'))  # Seconds
+
+# Chapter views are buffered per process and written in batches (see reader.tracking)
+VIEW_FLUSH_INTERVAL = int(os.getenv('VIEW_FLUSH_INTERVAL', '10'))  # Seconds
+VIEW_FLUSH_MAX_PENDING = int(os.getenv('VIEW_FLUSH_MAX_PENDING', '500'))  # Chapters
+VIEW_DEDUPE_WINDOW = int(os.getenv('VIEW_DEDUPE_WINDOW', str(30 * 60)))  # Seconds, 0 counts every view
+VIEW_DEDUPE_MAX_ENTRIES = int(os.getenv('VIEW_DEDUPE_MAX_ENTRIES', '100000'))  # Views remembered per process and window
+
 # Fly.io Tigris storage configuration
 USE_TIGRIS = os.getenv('AWS_ACCESS_KEY_ID') is not None
 
@@ -245,6 +348,15 @@ if USE_TIGRIS:
     AWS_S3_USE_SSL = True
     AWS_S3_VERIFY = True
     
+    # Shared S3 client: connection pool, keep-alive, retries with jittered backoff
+    AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', '50'))
+    AWS_S3_BATCH_CONCURRENCY = int(os.getenv('AWS_S3_BATCH_CONCURRENCY', '16'))  # Threads per batch operation
+    AWS_S3_TCP_KEEPALIVE = True
+    AWS_S3_RETRY_MODE = os.getenv('AWS_S3_RETRY_MODE', 'standard')
+    AWS_S3_MAX_ATTEMPTS = int(os.getenv('AWS_S3_MAX_ATTEMPTS', '5'))
+    AWS_S3_MULTIPART_THRESHOLD = int(os.getenv('AWS_S3_MULTIPART_THRESHOLD', str(16 * 1024 * 1024)))
+    AWS_S3_MULTIPART_CHUNKSIZE = int(os.getenv('AWS_S3_MULTIPART_CHUNKSIZE', str(8 * 1024 * 1024)))
+    
     # Update media URL to use Tigris CDN if custom domain is configured
     if AWS_S3_CUSTOM_DOMAIN:
         MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
@@ -325,5 +437,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # One line per proxied media request otherwise
+        'httpx': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -2,6 +2,8 @@
 Django admin configuration for the MangaKG reader app.
 """
 
+from collections import defaultdict
+
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.utils.html import format_html
@@ -11,8 +13,13 @@ from django.contrib.admin import SimpleListFilter
 
 from .models import (
     Series, Chapter, Page, Volume, Author, Artist, Category, Alias,
-    ApprovalStatus
+    ApprovalStatus, ProcessingStatus
 )
+from .jobs import enqueue_chapter
+from .manifests import schedule_chapter_refresh
+from .stats import refresh_series_stats
+from .thumbnails import thumbnail_url
+from . import cache
 
 
 class AliasInline(GenericTabularInline):
@@ -135,13 +142,15 @@ class SeriesAdmin(admin.ModelAdmin):
     inlines = [AliasInline, VolumeInline, ChapterInline]
     
     def chapter_count(self, obj):
-        """Display number of chapters for this series."""
-        return obj.chapters.count()
+        """Display number of approved chapters for this series."""
+        stats = getattr(obj, 'stats', None)
+        return stats.chapter_count if stats else 0
     chapter_count.short_description = 'Chapters'
+    chapter_count.admin_order_field = 'stats__chapter_count'
     
     def get_queryset(self, request):
         """Optimize queryset with prefetch_related."""
-        return super().get_queryset(request).select_related('manager').prefetch_related(
+        return super().get_queryset(request).select_related('manager', 'stats').prefetch_related(
             'authors', 'artists', 'categories'
         )
 
@@ -173,8 +182,8 @@ class PageInline(admin.TabularInline):
         """Display thumbnail of the page image."""
         if obj.image:
             return format_html(
-                '<img src="{}" style="width: 50px; height: auto;" />',
-                obj.image.url
+                '<img src="{}" style="width: 50px; height: auto;" loading="lazy" />',
+                thumbnail_url(obj.image.name, 100)
             )
         return '-'
     image_thumbnail.short_description = 'Thumbnail'
@@ -185,16 +194,18 @@ class ChapterAdmin(admin.ModelAdmin):
     """Admin interface for Chapter model."""
     list_display = [
         'title', 'series', 'volume', 'number', 'approval_status', 
-        'views', 'published_at', 'uploaded_by'
+        'processing_progress', 'views', 'published_at', 'uploaded_by'
     ]
     list_filter = [
-        'series', 'approval_status', 'is_final', 'published_at', 
+        'series', 'approval_status', 'processing_status', 'is_final', 'published_at', 
         'created_at', ApprovalStatusFilter
     ]
     search_fields = ['title', 'series__title']
     ordering = ['series', 'volume__number', 'number']
     readonly_fields = [
-        'views', 'created_at', 'updated_at', 'approved_at'
+        'views', 'created_at', 'updated_at', 'approved_at',
+        'processing_status', 'processing_progress', 'processing_attempts',
+        'processing_error'
     ]
     
     fieldsets = (
@@ -205,6 +216,13 @@ class ChapterAdmin(admin.ModelAdmin):
             'fields': ('file',),
             'description': 'Upload a ZIP file containing the chapter pages.'
         }),
+        ('Processing', {
+            'fields': (
+                'processing_status', 'processing_progress',
+                'processing_attempts', 'processing_error'
+            ),
+            'classes': ['collapse']
+        }),
         ('Approval Workflow', {
             'fields': (
                 'approval_status', 'rejection_reason', 
@@ -222,17 +240,31 @@ class ChapterAdmin(admin.ModelAdmin):
     
     inlines = [PageInline]
     
-    actions = ['approve_chapters', 'reject_chapters']
+    actions = ['approve_chapters', 'reject_chapters', 'retry_processing']
+    
+    def processing_progress(self, obj):
+        """Display the processing state with page progress."""
+        if obj.processing_status == ProcessingStatus.PROCESSING and obj.pages_total:
+            return f'{obj.get_processing_status_display()} ({obj.pages_processed}/{obj.pages_total})'
+        return obj.get_processing_status_display()
+    processing_progress.short_description = 'Processing'
     
     def approve_chapters(self, request, queryset):
         """Approve selected chapters."""
-        updated = queryset.filter(
-            approval_status=ApprovalStatus.PENDING
-        ).update(
+        pending = queryset.filter(approval_status=ApprovalStatus.PENDING)
+        chapters = defaultdict(list)
+        for series_id, chapter_id in pending.values_list('series_id', 'pk'):
+            chapters[series_id].append(chapter_id)
+        updated = pending.update(
             approval_status=ApprovalStatus.APPROVED,
             approved_by=request.user,
             approved_at=timezone.now()
         )
+        # Bulk updates don't send signals
+        cache.invalidate(cache.CHAPTERS)
+        refresh_series_stats(chapters)
+        for series_id, chapter_ids in chapters.items():
+            schedule_chapter_refresh(series_id, chapter_ids)
         self.message_user(
             request, f'{updated} chapter(s) were approved.'
         )
@@ -240,16 +272,31 @@ class ChapterAdmin(admin.ModelAdmin):
     
     def reject_chapters(self, request, queryset):
         """Reject selected chapters."""
-        updated = queryset.filter(
-            approval_status=ApprovalStatus.PENDING
-        ).update(
+        pending = queryset.filter(approval_status=ApprovalStatus.PENDING)
+        series_ids = set(pending.values_list('series_id', flat=True))
+        updated = pending.update(
             approval_status=ApprovalStatus.REJECTED
         )
+        cache.invalidate(cache.CHAPTERS)
+        refresh_series_stats(series_ids)
+        # Pending chapters have no manifests and aren't linked from any
         self.message_user(
             request, f'{updated} chapter(s) were rejected.'
         )
     reject_chapters.short_description = 'Reject selected chapters'
     
+    def retry_processing(self, request, queryset):
+        """Re-queue failed chapters that still have their uploaded file."""
+        chapters = queryset.filter(
+            processing_status=ProcessingStatus.FAILED
+        ).exclude(file__isnull=True).exclude(file='')
+        for chapter in chapters:
+            enqueue_chapter(chapter, reset_attempts=True)
+        self.message_user(
+            request, f'{len(chapters)} chapter(s) were queued for processing.'
+        )
+    retry_processing.short_description = 'Retry processing of selected chapters'
+    
     def get_queryset(self, request):
         """Optimize queryset."""
         return super().get_queryset(request).select_related(
@@ -294,8 +341,8 @@ class PageAdmin(admin.ModelAdmin):
         """Display thumbnail of the page image."""
         if obj.image:
             return format_html(
-                '<img src="{}" style="width: 100px; height: auto;" />',
-                obj.image.url
+                '<img src="{}" style="width: 100px; height: auto;" loading="lazy" />',
+                thumbnail_url(obj.image.name, 200)
             )
         return '-'
     image_thumbnail.short_description = 'Image'
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReaderConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reader"
+
+    def ready(self):
+        # Connect the response cache invalidation handlers
+        from reader import signals  # noqa: F401
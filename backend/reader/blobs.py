@@ -0,0 +1,161 @@
+"""
+Content-addressed storage of page images.
+
+Every image uploaded by ``reader.ingestion`` is recorded as a ``PageBlob``
+keyed by its content hash, so ingesting the same bytes again (a re-uploaded
+chapter, a page shared by several chapters) reuses the stored file instead of
+uploading it again.
+
+``PageBlob.ref_count`` counts the pages using a blob, plus the pages of
+ingestions in progress: ``reuse`` and ``register`` take a reference as soon
+as an ingested page is pointed at a blob, so the blob cannot be deleted
+before the page is saved. The ingested pages hand their references over to
+the saved ``Page`` rows; code that fails to save them calls ``release``.
+``reader.signals`` calls ``release`` when pages are deleted, and the files of
+a blob are deleted once the transaction dropping its last reference commits.
+"""
+
+import logging
+from collections import Counter
+from itertools import groupby
+
+from django.apps import apps as global_apps
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from reader.inventory import delete_objects
+
+logger = logging.getLogger(__name__)
+
+
+def find(digest, apps=global_apps):
+    """Return the blob with the content hash ``digest``, or None."""
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    return PageBlob.objects.filter(pk=digest).first()
+
+
+def _take(PageBlob, digest):
+    # A single conditional UPDATE: a blob deleted since it was read matches
+    # no row, and one holding a reference is never deleted
+    return PageBlob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1) == 1
+
+
+def reuse(digest, apps=global_apps):
+    """
+    Take a reference to the blob with the content hash ``digest``.
+
+    Returns:
+        The blob, or None if there is none
+    """
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    blob = find(digest, apps=apps)
+    if blob is None or not _take(PageBlob, digest):
+        return None
+    return blob
+
+
+def register(page, apps=global_apps):
+    """
+    Record an uploaded ``IngestedPage`` as a blob, taking a reference to it.
+
+    Returns:
+        ``(blob, created)``; when another upload of the same content was
+        recorded first, ``blob`` is that one
+    """
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    while True:
+        blob, created = PageBlob.objects.get_or_create(pk=page.digest, defaults={
+            'name': page.name,
+            'size': page.size,
+            'width': page.width,
+            'height': page.height,
+            'mime_type': page.mime_type,
+            'variants': page.variants,
+            'ref_count': 1,
+        })
+        # Otherwise the other blob was deleted in the meantime; record this one
+        if created or _take(PageBlob, blob.pk):
+            return blob, created
+
+
+def _add_references(names, sign, apps):
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    counts = Counter(name for name in names if name)
+    # One UPDATE per distinct number of references
+    by_count = sorted(counts.items(), key=lambda item: item[1])
+    for count, group in groupby(by_count, key=lambda item: item[1]):
+        PageBlob.objects.filter(name__in=[name for name, _ in group]).update(
+            ref_count=Greatest(F('ref_count') + sign * count, 0)
+        )
+    return list(counts)
+
+
+def retain(names, apps=global_apps):
+    """Add a reference to the blobs stored as ``names``, once per occurrence."""
+    _add_references(names, 1, apps)
+
+
+def release(names, apps=global_apps):
+    """
+    Drop a reference to the blobs stored as ``names``, once per occurrence.
+
+    Blobs left without references are deleted when the current transaction
+    commits. Names that are not blobs (images uploaded through the admin)
+    are ignored.
+    """
+    names = _add_references(names, -1, apps)
+    if names:
+        transaction.on_commit(lambda: delete_unreferenced(names, apps=apps))
+
+
+def delete_rows(queryset):
+    """
+    Delete the blobs matched by ``queryset`` in a single statement.
+
+    ``QuerySet.delete()`` reads the rows first and deletes them by primary
+    key, so a blob reused in between would be deleted with its reference;
+    a single ``DELETE`` re-checks the filter (e.g. ``ref_count=0``) per row.
+
+    Returns:
+        The number of blobs deleted
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_unreferenced(names, storage=None, apps=global_apps):
+    """
+    Delete the blobs among ``names`` that have no references, with their files.
+
+    Returns:
+        The number of blobs deleted
+    """
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    storage = storage or default_storage
+    deleted, files = 0, []
+    for blob in PageBlob.objects.filter(name__in=names, ref_count=0):
+        # Skip blobs reused since they were read
+        if delete_rows(PageBlob.objects.filter(pk=blob.pk, ref_count=0)):
+            deleted += 1
+            files += [blob.name, *(variant['name'] for variant in blob.variants)]
+    if files:
+        # One batched request instead of one per file
+        try:
+            failed = delete_objects(storage, files)
+        except Exception:
+            logger.exception('Failed to delete %d unreferenced page image(s)', len(files))
+        else:
+            for name in failed:
+                logger.error('Failed to delete unreferenced page image %s', name)
+    return deleted
+
+
+def set_variants(names_and_variants, apps=global_apps):
+    """Record regenerated variants on the blobs, from ``(name, variants)`` pairs."""
+    PageBlob = apps.get_model('reader', 'PageBlob')
+    variants = dict(names_and_variants)
+    blobs = list(PageBlob.objects.filter(name__in=variants))
+    for blob in blobs:
+        blob.variants = variants[blob.name]
+    PageBlob.objects.bulk_update(blobs, ['variants'])
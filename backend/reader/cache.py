@@ -0,0 +1,162 @@
+"""
+Response caching and conditional GET support for the read-only catalogue API.
+
+Cached responses are keyed on the request URL (scheme, host, path and
+normalized query parameters) plus a *stamp* for every data namespace the
+view reads from. Saving or deleting a model replaces the stamps of its
+namespaces (see ``reader.signals``) when the change commits, so every
+response built from the old data stops matching at once, without having to
+track individual keys.
+The same stamps provide the ``ETag`` and ``Last-Modified`` validators.
+
+Stamps are kept in the ``stamps`` cache rather than the default one, which
+culls entries when it fills up with responses.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from reader import media_urls
+
+# Data namespaces a cached view can depend on
+SERIES = 'series'
+CHAPTERS = 'chapters'  # Chapters and volumes
+PAGES = 'pages'
+PEOPLE = 'people'  # Authors and artists
+CATEGORIES = 'categories'
+
+STAMP_KEY_PREFIX = 'api:stamp:'
+# Stamps live in their own cache, where they are never culled to make room
+STAMPS_CACHE = 'stamps'
+RESPONSE_KEY_PREFIX = 'api:response:'
+
+
+def get_stamps(namespaces):
+    """
+    Return the current stamps of ``namespaces`` as a dict.
+
+    Stamps are nanosecond timestamps of the last change, so they never
+    repeat even if the cache is cleared.
+    """
+    stamp_cache = caches[STAMPS_CACHE]
+    keys = {STAMP_KEY_PREFIX + namespace: namespace for namespace in namespaces}
+    stamps = {keys[key]: value for key, value in stamp_cache.get_many(keys).items()}
+    for key, namespace in keys.items():
+        if namespace not in stamps:
+            stamp_cache.add(key, time.time_ns(), timeout=None)
+            stamps[namespace] = stamp_cache.get(key)
+    return stamps
+
+
+def invalidate(*namespaces):
+    """
+    Invalidate every cached response that depends on ``namespaces``.
+
+    The stamps are replaced once the current transaction commits: replaced
+    earlier, a request reading the uncommitted change's old data would cache
+    it under the new stamps, and serve it (and 304s for it) until the next
+    change.
+    """
+    transaction.on_commit(lambda: _replace_stamps(namespaces))
+
+
+def _replace_stamps(namespaces):
+    stamp = time.time_ns()
+    caches[STAMPS_CACHE].set_many(
+        {STAMP_KEY_PREFIX + namespace: stamp for namespace in namespaces}, timeout=None
+    )
+
+
+def normalized_query(request):
+    """Return the request's query string with sorted, non-empty parameters."""
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+        if value != ''
+    )
+    return urlencode(params)
+
+
+def response_cache_key(request, namespaces, stamps=None):
+    """Build the cache key for a request to a view depending on ``namespaces``."""
+    if stamps is None:
+        stamps = get_stamps(namespaces)
+    raw = '|'.join([
+        request.scheme,
+        request.get_host(),
+        request.path,
+        normalized_query(request),
+        *(f'{namespace}={stamps[namespace]}' for namespace in sorted(stamps)),
+    ])
+    return RESPONSE_KEY_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def last_modified_from(stamps):
+    """Return the latest stamp as a Unix timestamp in whole seconds, rounded up."""
+    return -(-max(stamps.values()) // 1_000_000_000)
+
+
+class CachedResponseMixin:
+    """
+    Cache successful GET responses of an API view and answer conditional
+    requests.
+
+    Set ``cache_namespaces`` to the data namespaces the view's responses are
+    built from. Responses carry an ``ETag`` and ``Last-Modified`` derived from
+    the namespace stamps, so ``If-None-Match``/``If-Modified-Since`` requests
+    are answered with a 304 before the view touches the database. Cache hits
+    skip authentication, throttling and serialization entirely.
+
+    ``Last-Modified`` has a one-second resolution; clients that need to see
+    changes made within the same second should revalidate with the ETag.
+    """
+    cache_namespaces = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not self.cache_namespaces:
+            return super().dispatch(request, *args, **kwargs)
+
+        # Presigned media URLs in the response expire even when the data does not change
+        stamps = {**get_stamps(self.cache_namespaces), **media_urls.response_stamps()}
+        key = response_cache_key(request, self.cache_namespaces, stamps)
+        etag = f'"{key[len(RESPONSE_KEY_PREFIX):]}"'
+        last_modified = last_modified_from(stamps)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+
+        timeout = getattr(settings, 'API_CACHE_TIMEOUT', 300)
+        use_cache = request.method == 'GET' and timeout
+        cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return self.add_validators(response, etag, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if use_cache:
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+                response['X-Cache'] = 'MISS'
+            self.add_validators(response, etag, last_modified)
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Let clients keep responses, but always revalidate them
+        response['Cache-Control'] = 'no-cache'
+        return response
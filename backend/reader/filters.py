@@ -0,0 +1,27 @@
+"""
+Filter backends for the MangaKG API.
+"""
+
+from rest_framework import filters
+
+from reader import search
+
+
+class SeriesSearchFilter(filters.SearchFilter):
+    """Search series through the full-text index in ``reader.search``."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search.search(queryset, query)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """Order search results by relevance unless another ordering is requested."""
+
+    def get_ordering(self, request, queryset, view):
+        if (
+            not request.query_params.get(self.ordering_param)
+            and 'search_rank' in queryset.query.annotations
+        ):
+            return ['-search_rank', '-id']
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,131 @@
+"""
+Image probing and resizing for chapter pages and cover images.
+
+Pillow's ``Image.open`` only reads the image header; pixel data is never
+decoded unless it is accessed. ``probe_image`` collects everything the app
+needs (format, MIME type, dimensions, mode) from that one header parse, and
+can optionally run ``verify()`` on the same image object instead of opening
+the file a second time. ``render_derivatives`` produces the downscaled page
+copies served to small screens.
+"""
+
+import io
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """Header information of an image file."""
+    format: str
+    mime_type: str
+    width: int
+    height: int
+    mode: str
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
+def probe_image(source, verify=False):
+    """
+    Read the format, dimensions and mode of an image with a single parse.
+
+    Args:
+        source: Image bytes, a file path, or a binary file-like object. The
+            position of a file-like object is restored afterwards.
+        verify: Also check the image data for corruption. This reads the
+            whole file, so keep it off hot paths.
+
+    Returns:
+        An ``ImageInfo``
+
+    Raises:
+        ValidationError: If the source is not a readable image
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    position = source.tell() if hasattr(source, 'tell') else None
+    try:
+        with Image.open(source) as img:
+            info = ImageInfo(
+                format=img.format,
+                mime_type=img.get_format_mimetype() or 'image/jpeg',
+                width=img.width,
+                height=img.height,
+                mode=img.mode,
+            )
+            if verify:
+                img.verify()
+    except Exception as e:
+        raise ValidationError('File is not a valid image.') from e
+    finally:
+        if position is not None:
+            source.seek(position)
+
+    return info
+
+
+def _encodable(img):
+    """Convert palette and other exotic modes to one every encoder accepts."""
+    if img.mode in ('RGB', 'RGBA', 'L', 'LA'):
+        return img
+    return img.convert('RGBA' if 'transparency' in img.info or img.mode.endswith('A') else 'RGB')
+
+
+def render_derivatives(data, widths, format='WEBP', quality=80):
+    """
+    Encode downscaled copies of an image at each of ``widths``.
+
+    Widths at or above the original width are skipped, so images are never
+    upscaled. Only takes and returns plain values, so it can run in a
+    process pool.
+
+    Returns:
+        A list of ``(width, height, mime_type, bytes)`` tuples, widest first
+    """
+    widths = sorted({width for width in widths if width > 0}, reverse=True)
+    with Image.open(io.BytesIO(data)) as img:
+        widths = [width for width in widths if width < img.width]
+        if not widths:
+            return []
+
+        # Let JPEG decoding downscale by a power of two up front
+        img.draft('RGB', (widths[0], round(img.height * widths[0] / img.width)))
+        img = _encodable(img)
+
+        results = []
+        for width in widths:
+            height = max(1, round(img.height * width / img.width))
+            # Each size is resized from the previous, larger one
+            img = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            buffer = io.BytesIO()
+            img.save(buffer, format=format, quality=quality)
+            # Image.MIME is filled in once the format's plugin is loaded
+            mime_type = Image.MIME.get(format.upper(), 'application/octet-stream')
+            results.append((width, height, mime_type, buffer.getvalue()))
+    return results
+
+
+def render_thumbnail(data, width, format='WEBP', quality=75):
+    """
+    Encode a copy of an image at most ``width`` pixels wide.
+
+    Returns:
+        A ``(mime_type, bytes)`` pair
+    """
+    derivatives = render_derivatives(data, [width], format, quality)
+    if derivatives:
+        _, _, mime_type, thumbnail = derivatives[0]
+        return mime_type, thumbnail
+
+    # Already narrow enough: only re-encode
+    with Image.open(io.BytesIO(data)) as img:
+        buffer = io.BytesIO()
+        _encodable(img).save(buffer, format=format, quality=quality)
+    return Image.MIME.get(format.upper(), 'application/octet-stream'), buffer.getvalue()
@@ -0,0 +1,363 @@
+"""
+Bulk import of whole series from directories and archives.
+
+A source is a directory or a ZIP/CBZ archive holding many chapters. Each
+chapter is a folder of page images or a nested ZIP/CBZ archive; volume and
+chapter numbers are read from the folder and archive names along its path
+(``Vol 02/Ch 011 - Title``, ``v2 c11.cbz``, ``Том 1/Глава 3``). Pages are
+ingested with ``reader.ingestion.ChapterIngestor``, and the ``Volume``,
+``Chapter`` and ``Page`` rows are created with ``bulk_create``.
+
+Imports can be resumed: pages whose number and content hash match a page
+already stored for the chapter are skipped, so re-running an interrupted
+import only uploads what is missing or changed.
+"""
+
+import io
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from zipfile import ZipFile, is_zipfile
+
+from django.db import transaction
+from django.utils import timezone
+
+from reader import blobs, cache
+from reader.ingestion import ChapterIngestor, retain_pages
+from reader.manifests import schedule_refresh
+from reader.models import ApprovalStatus, Chapter, Page, Volume
+from reader.stats import refresh_series_stats
+from reader.validators import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EXTENSIONS = {'.zip', '.cbz'}
+VOLUME_RE = re.compile(r'\b(?:volume|vol|v|том|t)\.?\s*(\d+)', re.IGNORECASE)
+CHAPTER_RE = re.compile(
+    r'\b(?:chapter|ch|c|глава|гл|бөлүм|#)\.?\s*(\d+(?:\.\d+)?)', re.IGNORECASE
+)
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+TITLE_STRIP = ' -_:.,()[]'
+# Page file names start with the content hash (see ChapterIngestor)
+DIGEST_RE = re.compile(r'^[0-9a-f]{32}')
+
+
+@dataclass
+class ChapterSource:
+    """The pages of one chapter, as ``(source_name, read)`` pairs."""
+    path: str
+    volume: int
+    number: float
+    title: str
+    pages: list = field(default_factory=list)
+
+
+def natural_key(name):
+    """Sort key ordering ``2.jpg`` before ``10.jpg``."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def is_image(name):
+    return os.path.splitext(name)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def is_archive(name):
+    return os.path.splitext(name)[-1].lower() in ARCHIVE_EXTENSIONS
+
+
+def is_hidden(name):
+    # macOS metadata and dotfiles
+    return any(part.startswith('.') or part == '__MACOSX' for part in name.split('/'))
+
+
+def parse_chapter_path(parts):
+    """
+    Infer ``(volume, number, title)`` from the names along a chapter's path.
+
+    The volume is the first volume marker found in any name (0 if none), the
+    chapter number is the chapter marker in the last name, or else its last
+    number. Returns None if the last name contains no number.
+    """
+    names = [os.path.splitext(part)[0] if is_archive(part) else part for part in parts]
+    name = names[-1]
+
+    volume = 0
+    for part in names:
+        match = VOLUME_RE.search(part)
+        if match:
+            volume = int(match.group(1))
+            break
+
+    match = CHAPTER_RE.search(name)
+    if match is None:
+        volume_match = VOLUME_RE.search(name)
+        numbers = [
+            number for number in NUMBER_RE.finditer(name)
+            if volume_match is None or number.start() >= volume_match.end()
+        ]
+        if not numbers:
+            return None
+        match = numbers[-1]
+    number = float(match.group(match.lastindex or 0))
+
+    title = name[match.end():].strip(TITLE_STRIP)
+    return volume, number, title or f'Chapter {number:g}'
+
+
+def scan_directory(root):
+    """Return the chapters under the directory ``root``."""
+    chapters = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not is_hidden(name))
+        relative = os.path.relpath(directory, root)
+        parts = [] if relative == '.' else relative.split(os.sep)
+
+        images = sorted(
+            (name for name in filenames if is_image(name) and not is_hidden(name)), key=natural_key
+        )
+        if images:
+            chapters.append(make_chapter(
+                os.path.join(directory, ''),
+                parts or [os.path.basename(os.path.abspath(root))],
+                [(name, file_reader(os.path.join(directory, name))) for name in images],
+            ))
+        for name in sorted(filenames, key=natural_key):
+            if is_archive(name) and not is_hidden(name):
+                path = os.path.join(directory, name)
+                chapters.extend(scan_archive(open(path, 'rb'), parts + [name], path))
+    return [chapter for chapter in chapters if chapter is not None]
+
+
+def scan_archive(fileobj, parts=(), path=''):
+    """
+    Return the chapters in a ZIP/CBZ archive.
+
+    Page images are grouped by folder, and nested archives are read as
+    chapters of their own. ``parts`` are the names leading to the archive.
+    """
+    zf = ZipFile(fileobj)
+    folders = {}
+    chapters = []
+    for name in sorted(zf.namelist(), key=natural_key):
+        if zf.getinfo(name).is_dir() or is_hidden(name):
+            continue
+        folder, filename = os.path.split(name)
+        if is_image(filename):
+            folders.setdefault(folder, []).append(name)
+        elif is_archive(filename):
+            # Nested archives are small enough to hold, and ZipFile needs
+            # a seekable file
+            nested = io.BytesIO(zf.read(name))
+            if is_zipfile(nested):
+                chapters.extend(scan_archive(nested, [*parts, *name.split('/')], f'{path}!{name}'))
+
+    for folder, names in folders.items():
+        folder_parts = [*parts, *folder.split('/')] if folder else list(parts)
+        chapters.append(make_chapter(
+            f'{path}!{folder}' if folder else path,
+            folder_parts or ['archive'],
+            [(name, lambda name=name: zf.read(name)) for name in names],
+        ))
+    return [chapter for chapter in chapters if chapter is not None]
+
+
+def file_reader(path):
+    def read():
+        with open(path, 'rb') as fileobj:
+            return fileobj.read()
+    return read
+
+
+def make_chapter(path, parts, pages):
+    parsed = parse_chapter_path(parts)
+    if parsed is None:
+        logger.warning('Skipping %s: no chapter number in its name', path)
+        return None
+    volume, number, title = parsed
+    return ChapterSource(path=path, volume=volume, number=number, title=title[:250], pages=pages)
+
+
+def scan(path):
+    """Return the chapters in the directory or archive at ``path``, in reading order."""
+    if os.path.isdir(path):
+        chapters = scan_directory(path)
+    else:
+        chapters = scan_archive(open(path, 'rb'), [os.path.basename(path)], path)
+    return sorted(chapters, key=lambda chapter: (chapter.volume, chapter.number))
+
+
+def stored_digest(name):
+    """Return the content hash in a stored page image's name, or None."""
+    match = DIGEST_RE.match(os.path.basename(name))
+    return match.group(0) if match else None
+
+
+def read_digest(read):
+    return blake2b(read(), digest_size=16).hexdigest()
+
+
+@dataclass
+class ImportResult:
+    """Counts of what an import created, uploaded and skipped."""
+    chapters_created: int = 0
+    chapters_skipped: int = 0
+    pages_uploaded: int = 0
+    pages_reused: int = 0
+    pages_skipped: int = 0
+
+
+class SeriesImporter:
+    """
+    Import chapters into a series.
+
+    Args:
+        series: The ``Series`` to add chapters to
+        approve: Create chapters approved instead of pending review
+        batch_size: Rows per ``bulk_create``
+        ingestor_options: Keyword arguments for ``ChapterIngestor``
+        progress: Optional ``callable(chapter, added, skipped)`` invoked
+            after each chapter
+    """
+
+    def __init__(self, series, approve=False, batch_size=500, ingestor_options=None,
+                 progress=None):
+        self.series = series
+        self.approve = approve
+        self.batch_size = batch_size
+        self.ingestor_options = ingestor_options or {}
+        self.progress = progress
+
+    def run(self, sources):
+        """Import ``ChapterSource`` objects; returns an ``ImportResult``."""
+        result = ImportResult()
+        chapters = self.get_or_create_chapters(sources, result)
+        pending_pages, stale_pages = [], []
+
+        try:
+            with ChapterIngestor('', **self.ingestor_options) as ingestor:
+                for source, chapter in zip(sources, chapters):
+                    if chapter is None:
+                        continue
+                    new_pages, stale = self.ingest_chapter(ingestor, source, chapter, result)
+                    pending_pages.extend(new_pages)
+                    stale_pages.extend(stale)
+                    if len(pending_pages) >= self.batch_size:
+                        self.save_pages(pending_pages, stale_pages)
+                        pending_pages, stale_pages = [], []
+        finally:
+            # Keep the rows of the pages already uploaded, so an interrupted
+            # import resumes after them
+            self.save_pages(pending_pages, stale_pages)
+            # Nothing above sent signals
+            cache.invalidate(cache.CHAPTERS, cache.PAGES)
+            refresh_series_stats([self.series.pk])
+            schedule_refresh([self.series.pk])
+        return result
+
+    def get_or_create_chapters(self, sources, result):
+        """Return the chapter of each source, creating missing volumes and chapters."""
+        volumes = {volume.number: volume for volume in self.series.volumes.all()}
+        missing = sorted({source.volume for source in sources if source.volume} - set(volumes))
+        created = Volume.objects.bulk_create(
+            [Volume(series=self.series, number=number) for number in missing],
+            batch_size=self.batch_size,
+        )
+        volumes.update({volume.number: volume for volume in created})
+
+        existing = {
+            (chapter.volume.number if chapter.volume else 0, chapter.number): chapter
+            for chapter in self.series.chapters.select_related('volume')
+        }
+        approval = {}
+        if self.approve:
+            approval = {'approval_status': ApprovalStatus.APPROVED, 'approved_at': timezone.now()}
+
+        chapters, new_chapters, seen = [], [], set()
+        for source in sources:
+            key = (source.volume, source.number)
+            if key in seen:
+                logger.warning('Skipping %s: duplicate of volume %s chapter %g', source.path, *key)
+                result.chapters_skipped += 1
+                chapters.append(None)
+                continue
+            seen.add(key)
+            chapter = existing.get(key)
+            if chapter is None:
+                chapter = Chapter(
+                    series=self.series,
+                    volume=volumes.get(source.volume),
+                    number=source.number,
+                    title=source.title,
+                    **approval
+                )
+                new_chapters.append(chapter)
+            chapters.append(chapter)
+
+        Chapter.objects.bulk_create(new_chapters, batch_size=self.batch_size)
+        result.chapters_created = len(new_chapters)
+        return chapters
+
+    def ingest_chapter(self, ingestor, source, chapter, result):
+        """
+        Upload the new and changed pages of a chapter.
+
+        Returns:
+            The unsaved new ``Page`` objects, and the saved pages they replace
+        """
+        existing = {page.number: page for page in chapter.pages.all()}
+        numbers = list(range(1, len(source.pages) + 1))
+        if existing:
+            # Hash the source pages to find the ones already stored
+            digests = list(ingestor.map_read(read_digest, [read for _, read in source.pages]))
+            numbers = [
+                number for number, digest in zip(numbers, digests)
+                if number not in existing or stored_digest(existing[number].image.name) != digest
+            ]
+        result.pages_skipped += len(source.pages) - len(numbers)
+
+        # The same directory as Chapter.process_uploaded_file
+        vol_num = source.volume
+        base_path = f'series/{self.series.slug}/vol{vol_num}/ch{chapter.number}'
+        ingested = ingestor.ingest(
+            [source.pages[number - 1] for number in numbers], numbers=numbers, base_path=base_path
+        )
+        retain_pages(ingested)
+        reused = sum(page.reused for page in ingested)
+        result.pages_uploaded += len(ingested) - reused
+        result.pages_reused += reused
+        if self.progress:
+            self.progress(chapter, len(ingested), len(source.pages) - len(numbers))
+
+        stale = [
+            page for number, page in existing.items()
+            if number in numbers or number > len(source.pages)
+        ]
+        pages = [
+            Page(
+                chapter=chapter,
+                number=page.number,
+                image=page.name,
+                width=page.width,
+                height=page.height,
+                mime_type=page.mime_type,
+                variants=page.variants
+            )
+            for page in ingested
+        ]
+        return pages, stale
+
+    def save_pages(self, pages, stale):
+        # The new pages already hold references to their images (see
+        # ingest_chapter), which the saved rows take over
+        try:
+            with transaction.atomic():
+                # A raw delete skips the per-page signals; run() refreshes the
+                # series once at the end
+                Page.objects.filter(pk__in=[page.pk for page in stale])._raw_delete(Page.objects.db)
+                blobs.release(page.image.name for page in stale)
+                Page.objects.bulk_create(pages, batch_size=self.batch_size)
+        except BaseException:
+            blobs.release(page.image.name for page in pages)
+            raise
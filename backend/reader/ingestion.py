@@ -0,0 +1,364 @@
+"""
+Streaming, parallel ingestion of chapter page archives.
+
+Pages are read out of the archive one member at a time, probed, hashed and
+measured on a bounded thread pool, downscaled into responsive derivatives on
+a process pool, then uploaded to storage with a separate concurrency limit.
+At most ``workers + render_processes + upload_concurrency`` pages are held in
+memory at once, regardless of how many pages the chapter has.
+
+Pages whose content hash is already stored (see ``reader.blobs``) skip
+rendering and uploading and reuse the stored image.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from zipfile import ZipFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from reader import blobs
+from reader.imaging import probe_image, render_derivatives
+from reader.inventory import save_objects
+from reader.validators import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestedPage:
+    """A page image that has been processed and stored."""
+    number: int
+    source: str
+    digest: str
+    width: int
+    height: int
+    mime_type: str
+    size: int = 0
+    name: str = ''
+    reused: bool = False
+    # Whether the page holds a reference to its blob (see reader.blobs)
+    retained: bool = False
+    data: bytes = b''
+    derivatives: list = field(default_factory=list)
+    variants: list = field(default_factory=list)
+
+
+def iter_archive_members(zf):
+    """Yield the names of the archive members that are page images, in page order."""
+    for name in sorted(zf.namelist()):
+        if zf.getinfo(name).is_dir():
+            continue
+
+        # Skip macOS metadata files
+        filename = os.path.basename(name)
+        if (name.startswith('__MACOSX/') or
+                filename.startswith('._') or
+                filename == '.DS_Store'):
+            continue
+
+        # Skip metadata files (.txt, .nfo, ...) allowed by validate_zip_file
+        if os.path.splitext(filename)[-1].lower() not in IMAGE_EXTENSIONS:
+            continue
+
+        yield name
+
+
+def probe_page(number, source, data, verify=False):
+    """
+    Collect the hash, dimensions and MIME type of a page image.
+
+    Args:
+        verify: Fully verify the image data instead of only parsing its header
+
+    Raises:
+        ValidationError: If the data is not a valid image
+    """
+    try:
+        info = probe_image(data, verify=verify)
+    except ValidationError as e:
+        raise ValidationError(f'Invalid image file: {source}') from e
+
+    return IngestedPage(
+        number=number,
+        source=source,
+        digest=blake2b(data, digest_size=16).hexdigest(),
+        width=info.width,
+        height=info.height,
+        mime_type=info.mime_type,
+        size=len(data),
+        data=data,
+    )
+
+
+def store_derivatives(storage, original_name, derivatives, overwrite=False):
+    """
+    Save rendered derivatives next to the original image.
+
+    Args:
+        derivatives: ``(width, height, mime_type, data)`` tuples, as returned
+            by ``render_derivatives``
+        overwrite: Replace existing files, for content-addressed originals
+
+    Returns:
+        The ``Page.variants`` entries describing the stored files
+    """
+    base = os.path.splitext(original_name)[0]
+    names = save_objects(storage, [
+        (f"{base}-{width}w.{mime_type.split('/')[-1]}", ContentFile(data))
+        for width, _, mime_type, data in derivatives
+    ], overwrite=overwrite)
+    return [
+        {'name': name, 'width': width, 'height': height, 'mime_type': mime_type}
+        for name, (width, height, mime_type, _) in zip(names, derivatives)
+    ]
+
+
+def retain_pages(pages):
+    """
+    Take a reference for the ingested ``pages`` that don't hold one yet.
+
+    Pages ingested without deduplication may still be stored under the name
+    of a blob, so code saving them as ``Page`` rows calls this first.
+    """
+    unretained = [page for page in pages if not page.retained]
+    blobs.retain(page.name for page in unretained)
+    for page in unretained:
+        page.retained = True
+
+
+class ChapterIngestor:
+    """
+    Extract, validate and upload the pages of a chapter.
+
+    Args:
+        base_path: Storage directory the page images are saved under
+        storage: Storage backend to upload to (default: ``default_storage``)
+        workers: Number of threads reading and probing pages
+        upload_concurrency: Maximum number of uploads in flight
+        progress: Optional ``callable(done, total)`` invoked as pages finish
+        verify: Fully verify each image (default: ``CHAPTER_INGEST_VERIFY_IMAGES``)
+        derivative_widths: Widths of the downscaled copies to generate
+            (default: ``PAGE_DERIVATIVE_WIDTHS``); empty to disable
+        render_processes: Size of the process pool rendering derivatives
+            (default: ``CHAPTER_RENDER_PROCESSES``); 0 renders on the
+            probing threads instead
+        deduplicate: Reuse stored images with the same content instead of
+            uploading them again (default: ``PAGE_DEDUPLICATION``). Only
+            applies to ``default_storage``, where the blobs are recorded
+
+    Used as a context manager, the ingestor keeps its thread and process
+    pools open across ``ingest`` calls, which saves starting the render
+    processes again for every chapter of a bulk import.
+    """
+
+    def __init__(self, base_path, storage=None, workers=None,
+                 upload_concurrency=None, progress=None, verify=None,
+                 derivative_widths=None, render_processes=None, deduplicate=None):
+        self.base_path = base_path
+        self.storage = storage or default_storage
+        if deduplicate is None:
+            deduplicate = getattr(settings, 'PAGE_DEDUPLICATION', True)
+        self.deduplicate = deduplicate and self.storage is default_storage
+        self.workers = max(1, workers or getattr(settings, 'CHAPTER_INGEST_WORKERS', 4))
+        self.upload_concurrency = max(
+            1, upload_concurrency or getattr(settings, 'CHAPTER_UPLOAD_CONCURRENCY', 8)
+        )
+        self.progress = progress
+        if verify is None:
+            verify = getattr(settings, 'CHAPTER_INGEST_VERIFY_IMAGES', False)
+        self.verify = verify
+        if derivative_widths is None:
+            derivative_widths = getattr(settings, 'PAGE_DERIVATIVE_WIDTHS', [])
+        self.derivative_widths = list(derivative_widths)
+        self.derivative_format = getattr(settings, 'PAGE_DERIVATIVE_FORMAT', 'WEBP')
+        self.derivative_quality = getattr(settings, 'PAGE_DERIVATIVE_QUALITY', 80)
+        if render_processes is None:
+            render_processes = getattr(settings, 'CHAPTER_RENDER_PROCESSES', os.cpu_count() or 1)
+        self.render_processes = max(0, render_processes)
+        self._pools = None
+
+    def __enter__(self):
+        self._pools = self._open_pools()
+        return self
+
+    def __exit__(self, *exc):
+        pools, self._pools = self._pools, None
+        self._close_pools(pools)
+        return False
+
+    def _open_pools(self):
+        """Return the ``(probe, render, upload)`` executors."""
+        probe_pool = ThreadPoolExecutor(self.workers, thread_name_prefix='ingest-probe')
+        upload_pool = ThreadPoolExecutor(self.upload_concurrency, thread_name_prefix='ingest-upload')
+        render_pool = probe_pool
+        if self.derivative_widths and self.render_processes:
+            # Spawned rather than forked: the parent already runs threads
+            render_pool = ProcessPoolExecutor(
+                self.render_processes, mp_context=multiprocessing.get_context('spawn')
+            )
+        return probe_pool, render_pool, upload_pool
+
+    def _close_pools(self, pools):
+        probe_pool, render_pool, upload_pool = pools
+        probe_pool.shutdown(wait=True, cancel_futures=True)
+        upload_pool.shutdown(wait=True, cancel_futures=True)
+        if render_pool is not probe_pool:
+            render_pool.shutdown(wait=True, cancel_futures=True)
+
+    def ingest_archive(self, fileobj):
+        """Ingest every page image of a ZIP/CBZ archive."""
+        with ZipFile(fileobj) as zf:
+            members = list(iter_archive_members(zf))
+            # ZipFile serializes access to the underlying file, so members
+            # can be read concurrently from the worker threads.
+            return self.ingest([(name, lambda name=name: zf.read(name)) for name in members])
+
+    def ingest(self, sources, numbers=None, base_path=None):
+        """
+        Ingest pages from ``(source_name, read)`` pairs, where ``read()``
+        returns the raw image bytes. Pages are numbered in the given order,
+        unless their ``numbers`` are given.
+
+        Args:
+            base_path: Storage directory for these pages, instead of the
+                ingestor's
+
+        Returns:
+            The list of ``IngestedPage`` objects, in the order of ``sources``.
+            Deduplicated pages hold a reference to their blob (see
+            ``reader.blobs``), which must be released if the page is not
+            saved; see ``retain_pages`` for the others.
+        """
+        total = len(sources)
+        if numbers is None:
+            numbers = range(1, total + 1)
+        positions = {number: position for position, number in enumerate(numbers)}
+        base_path = base_path or self.base_path
+        pages = [None] * total
+        window = self.workers + self.render_processes + self.upload_concurrency
+        queue = iter(zip(numbers, sources))
+        pending = set()
+        done_count = 0
+
+        pools = self._pools or self._open_pools()
+        probe_pool, render_pool, upload_pool = pools
+        try:
+            while True:
+                # Keep the pipeline full, but never hold more than `window`
+                # pages in memory at once.
+                while len(pending) < window:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    number, (source, read) = item
+                    future = probe_pool.submit(self._read_and_probe, number, source, read)
+                    future.stage = 'probe'
+                    pending.add(future)
+
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future.stage == 'probe':
+                        page = future.result()
+                        # Blobs are looked up and recorded on this thread,
+                        # which owns the database connection
+                        if self.deduplicate and self._reuse(page):
+                            stage = 'done'
+                        elif self.derivative_widths:
+                            stage = 'render'
+                        else:
+                            stage = 'upload'
+                    elif future.stage == 'render':
+                        page = future.page
+                        page.derivatives = future.result()
+                        stage = 'upload'
+                    else:
+                        page = future.result()
+                        if self.deduplicate:
+                            self._register(page)
+                        stage = 'done'
+
+                    if stage == 'done':
+                        pages[positions[page.number]] = page
+                        done_count += 1
+                        if self.progress:
+                            self.progress(done_count, total)
+                        continue
+
+                    if stage == 'render':
+                        next_future = render_pool.submit(
+                            render_derivatives, page.data, self.derivative_widths,
+                            self.derivative_format, self.derivative_quality,
+                        )
+                        next_future.page = page
+                    else:
+                        next_future = upload_pool.submit(self._upload, page, base_path)
+                    next_future.stage = stage
+                    pending.add(next_future)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            blobs.release(page.name for page in pages if page is not None and page.retained)
+            raise
+        finally:
+            if pools is not self._pools:
+                self._close_pools(pools)
+
+        return pages
+
+    def map_read(self, func, reads):
+        """Return ``func(read)`` for each of ``reads``, computed on the probing threads."""
+        pools = self._pools or self._open_pools()
+        try:
+            return list(pools[0].map(func, reads))
+        finally:
+            if pools is not self._pools:
+                self._close_pools(pools)
+
+    def _reuse(self, page):
+        """Point ``page`` at the stored blob with its content, if there is one."""
+        blob = blobs.reuse(page.digest)
+        if blob is None:
+            return False
+        page.name = blob.name
+        page.variants = blob.variants
+        page.reused = page.retained = True
+        page.data = b''
+        return True
+
+    def _register(self, page):
+        blob, created = blobs.register(page)
+        page.retained = True
+        if not created and blob.name != page.name:
+            # The same content was uploaded concurrently (or twice in this
+            # chapter); keep the first copy
+            for name in [page.name, *(variant['name'] for variant in page.variants)]:
+                self.storage.delete(name)
+            page.name = blob.name
+            page.variants = blob.variants
+
+    def _read_and_probe(self, number, source, read):
+        return probe_page(number, source, read(), verify=self.verify)
+
+    def _upload(self, page, base_path):
+        ext = os.path.splitext(page.source)[-1]
+        relative_path = f'{base_path}/{page.digest}{ext}'
+        # The name is the content hash: an existing file there has the same
+        # content, so skip the existence checks and overwrite it
+        [page.name] = save_objects(self.storage, [(relative_path, ContentFile(page.data))], overwrite=True)
+        page.variants = store_derivatives(self.storage, page.name, page.derivatives, overwrite=True)
+
+        # Release the bytes as soon as they are stored
+        page.data = b''
+        page.derivatives = []
+        return page
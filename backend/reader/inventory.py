@@ -0,0 +1,185 @@
+"""
+Bulk listing, saving, checking and deletion of media storage objects.
+
+S3 storages (``TigrisMediaStorage``) are listed with paginated
+``ListObjectsV2`` requests: the first level of "directories" under the prefix
+(one per series for ``series/``) is listed concurrently on a thread pool.
+Saving, existence checks and deletion go through the batch API of
+``TigrisMediaStorage`` (``save_many``, ``exists_many``, ``delete_many``).
+``find_existing`` checks many names against one listing, falling back to
+existence checks where listing is not allowed. Other storages
+(``FileSystemStorage`` in development) fall back to ``listdir``, ``save``,
+``exists`` and ``delete``.
+"""
+
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from reader.storage import MAX_DELETE_BATCH
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    """An object found in storage."""
+    name: str
+    size: int
+    modified: datetime
+
+
+def is_s3(storage):
+    return isinstance(storage, S3Boto3Storage)
+
+
+def list_objects(storage, prefix='', concurrency=8):
+    """
+    Yield a ``StoredObject`` for every object whose name starts with ``prefix``.
+
+    Objects are yielded as their listing pages arrive; the order is
+    unspecified.
+    """
+    if is_s3(storage):
+        yield from _list_s3(storage, prefix, concurrency)
+    else:
+        yield from _list_local(storage, prefix)
+
+
+def find_existing(storage, names, prefix='', concurrency=8):
+    """
+    Return the subset of ``names`` that exist in storage.
+
+    Names under ``prefix`` are looked up in a single listing of the prefix,
+    the others with concurrent existence checks. If the storage refuses the
+    listing, every name is checked individually.
+
+    Raises:
+        OSError, ClientError: If an existence check fails for another reason
+            than the object being missing
+    """
+    names = set(names)
+    listed = {name for name in names if name.startswith(prefix)}
+    existing = set()
+    if listed:
+        try:
+            existing = {
+                stored.name for stored in list_objects(storage, prefix, concurrency=concurrency)
+                if stored.name in listed
+            }
+        except ClientError as e:
+            if _status(e) != 403:
+                raise
+            logger.warning('Listing %s is not allowed; checking objects one by one', prefix)
+            listed = set()
+
+    unlisted = sorted(names - listed)
+    if hasattr(storage, 'exists_many'):
+        return existing | storage.exists_many(unlisted)
+    with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix='inventory') as pool:
+        for name, found in zip(unlisted, pool.map(storage.exists, unlisted)):
+            if found:
+                existing.add(name)
+    return existing
+
+
+def save_objects(storage, items, overwrite=False):
+    """
+    Save ``(name, content)`` pairs; returns the names they were saved as.
+
+    Args:
+        overwrite: Skip the existence checks of storages that support it,
+            for content-addressed names
+    """
+    if hasattr(storage, 'save_many'):
+        return storage.save_many(items, overwrite=overwrite)
+    return [storage.save(name, content) for name, content in items]
+
+
+def delete_objects(storage, names, batch_size=MAX_DELETE_BATCH):
+    """
+    Delete the objects ``names``.
+
+    Returns:
+        The names that could not be deleted
+    """
+    if hasattr(storage, 'delete_many'):
+        return storage.delete_many(names, batch_size=batch_size)
+    failed = []
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.exception('Failed to delete %s', name)
+            failed.append(name)
+    return failed
+
+
+def _status(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+
+
+def _name(storage, key):
+    location = storage.location.strip('/')
+    return key[len(location) + 1:] if location else key
+
+
+def _list_pages(client, **kwargs):
+    """Yield the responses of a paginated ``ListObjectsV2`` request."""
+    while True:
+        response = client.list_objects_v2(**kwargs)
+        yield response
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def _list_s3(storage, prefix, concurrency):
+    client = storage.connection.meta.client
+    location = storage.location.strip('/')
+    key_prefix = f'{location}/{prefix}' if location else prefix
+
+    def to_objects(contents):
+        return [
+            StoredObject(_name(storage, item['Key']), item['Size'], item['LastModified'])
+            for item in contents
+        ]
+
+    def list_all(sub_prefix):
+        objects = []
+        for response in _list_pages(client, Bucket=storage.bucket_name, Prefix=sub_prefix):
+            objects.extend(to_objects(response.get('Contents', [])))
+        return objects
+
+    # List the top level with a delimiter to split the rest of the listing
+    sub_prefixes = []
+    for response in _list_pages(
+        client, Bucket=storage.bucket_name, Prefix=key_prefix, Delimiter='/'
+    ):
+        yield from to_objects(response.get('Contents', []))
+        sub_prefixes.extend(item['Prefix'] for item in response.get('CommonPrefixes', []))
+
+    with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix='inventory') as pool:
+        for objects in pool.map(list_all, sub_prefixes):
+            yield from objects
+
+
+def _list_local(storage, prefix):
+    directory = prefix if prefix.endswith('/') else posixpath.dirname(prefix)
+    pending = [directory.rstrip('/')]
+    while pending:
+        path = pending.pop()
+        try:
+            dirnames, filenames = storage.listdir(path)
+        except FileNotFoundError:
+            continue
+        for filename in filenames:
+            name = posixpath.join(path, filename)
+            if name.startswith(prefix):
+                yield StoredObject(name, storage.size(name), storage.get_modified_time(name))
+        pending.extend(posixpath.join(path, dirname) for dirname in dirnames)
@@ -0,0 +1,138 @@
+"""
+Database-backed processing queue for uploaded chapter archives.
+
+The queue lives on the ``Chapter`` table itself: ``processing_status`` marks
+queued work and ``process_after`` schedules retries. Workers claim a chapter
+with a conditional ``UPDATE``, which is atomic on both PostgreSQL and SQLite,
+so several ``process_chapters`` workers can run side by side without an
+external broker.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from reader.models import Chapter, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_chapter(chapter, delay=0, reset_attempts=False):
+    """Queue a chapter for (re)processing of its uploaded archive."""
+    chapter.processing_status = ProcessingStatus.QUEUED
+    chapter.process_after = now() + timedelta(seconds=delay)
+    chapter.processing_error = ''
+    if reset_attempts:
+        chapter.processing_attempts = 0
+    chapter.save(update_fields=[
+        'processing_status', 'process_after', 'processing_error', 'processing_attempts'
+    ])
+
+
+def requeue_stale_chapters(stale_after):
+    """
+    Return chapters stuck in processing (e.g. after a worker crash) to the queue.
+
+    Args:
+        stale_after: ``timedelta`` after which a running job is considered dead
+
+    Returns:
+        The number of chapters re-queued
+    """
+    return Chapter.objects.filter(
+        processing_status=ProcessingStatus.PROCESSING,
+        processing_started_at__lt=now() - stale_after,
+    ).update(processing_status=ProcessingStatus.QUEUED, process_after=now())
+
+
+def claim_next_chapter():
+    """
+    Atomically claim the next due chapter for processing.
+
+    Returns:
+        The claimed ``Chapter``, or None if the queue is empty
+    """
+    due = Chapter.objects.filter(
+        Q(process_after__isnull=True) | Q(process_after__lte=now()),
+        processing_status=ProcessingStatus.QUEUED,
+    ).order_by(F('process_after').asc(nulls_first=True), 'pk')
+
+    for pk in due.values_list('pk', flat=True)[:10]:
+        # Only one worker can move the row out of the queued state
+        claimed = Chapter.objects.filter(
+            pk=pk, processing_status=ProcessingStatus.QUEUED
+        ).update(
+            processing_status=ProcessingStatus.PROCESSING,
+            processing_started_at=now(),
+            processing_attempts=F('processing_attempts') + 1,
+            pages_processed=0,
+            pages_total=0,
+        )
+        if claimed:
+            return Chapter.objects.select_related('series', 'volume').get(pk=pk)
+    return None
+
+
+class ProgressReporter:
+    """Write page progress to the chapter row, at most once per interval."""
+
+    def __init__(self, chapter_id, interval=1.0):
+        self.chapter_id = chapter_id
+        self.interval = interval
+        self.last_write = 0.0
+
+    def __call__(self, done, total):
+        current = time.monotonic()
+        if done < total and current - self.last_write < self.interval:
+            return
+        self.last_write = current
+        Chapter.objects.filter(pk=self.chapter_id).update(
+            pages_processed=done, pages_total=total
+        )
+
+
+def run_chapter_job(chapter, max_attempts=None, retry_delay=None):
+    """
+    Process a claimed chapter, recording the outcome on the chapter.
+
+    Failed attempts are retried with exponential backoff until
+    ``max_attempts`` is reached; the chapter is then marked as failed. The
+    uploaded archive is kept so the chapter can be retried from the admin.
+
+    Returns:
+        The resulting ``ProcessingStatus``
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'CHAPTER_PROCESSING_MAX_ATTEMPTS', 3)
+    if retry_delay is None:
+        retry_delay = getattr(settings, 'CHAPTER_PROCESSING_RETRY_DELAY', 60)
+
+    try:
+        chapter.process_uploaded_file(progress=ProgressReporter(chapter.pk))
+    except Exception as e:
+        chapter.processing_error = str(e)
+        if chapter.processing_attempts < max_attempts:
+            delay = retry_delay * 2 ** (chapter.processing_attempts - 1)
+            logger.warning(
+                f'Processing {chapter} failed (attempt {chapter.processing_attempts}/'
+                f'{max_attempts}), retrying in {delay}s: {e}'
+            )
+            chapter.processing_status = ProcessingStatus.QUEUED
+            chapter.process_after = now() + timedelta(seconds=delay)
+        else:
+            logger.error(f'Processing {chapter} failed permanently: {e}')
+            chapter.processing_status = ProcessingStatus.FAILED
+    else:
+        chapter.processing_status = ProcessingStatus.DONE
+        chapter.processing_error = ''
+        chapter.pages_total = chapter.pages_processed = chapter.pages.count()
+
+    chapter.save(update_fields=[
+        'processing_status', 'processing_error', 'process_after',
+        'pages_total', 'pages_processed',
+    ])
+    return chapter.processing_status
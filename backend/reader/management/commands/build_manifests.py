@@ -0,0 +1,27 @@
+"""
+Django management command to rebuild the chapter page manifests.
+"""
+
+from django.core.management.base import BaseCommand
+
+from reader import manifests
+
+
+class Command(BaseCommand):
+    """Rebuild the page manifests of every approved chapter."""
+
+    help = 'Build the page manifests of approved chapters, storing the ones that changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Series rebuilt per batch',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        self.stdout.write('Building chapter manifests...')
+        count = manifests.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated the manifests of {count} chapter(s).'))
@@ -0,0 +1,106 @@
+"""
+Django management command to delete unreferenced page images and thumbnails from storage.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reader import orphans
+from reader.inventory import MAX_DELETE_BATCH
+from reader.thumbnails import THUMBNAIL_PREFIX
+
+
+class Command(BaseCommand):
+    """Delete objects under a storage prefix that no page or series references."""
+
+    help = (
+        'Delete page images, covers, thumbnails and chapter manifests in storage that the database '
+        'no longer references'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without deleting anything',
+        )
+        parser.add_argument(
+            '--prefix',
+            action='append',
+            dest='prefixes',
+            help="Storage prefix to collect; repeat for several (default: 'series/' and 'thumbnails/')",
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24.0,
+            help='Keep objects modified within this many hours (default: 24)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Concurrent listing requests (default: 8)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MAX_DELETE_BATCH,
+            help=f'Objects deleted per request (default and maximum: {MAX_DELETE_BATCH})',
+        )
+        parser.add_argument(
+            '--bloom',
+            action='store_true',
+            help='Hold the references in a Bloom filter to bound memory on very large catalogues',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        if not 1 <= options['batch_size'] <= MAX_DELETE_BATCH:
+            raise CommandError(f'--batch-size must be between 1 and {MAX_DELETE_BATCH}')
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN: No changes will be made.'))
+        for prefix in options['prefixes'] or ['series/', f'{THUMBNAIL_PREFIX}/']:
+            self._collect(prefix, options)
+
+    def _collect(self, prefix, options):
+        dry_run = options['dry_run']
+        self.stdout.write(f"Collecting unreferenced objects under '{prefix}'...")
+
+        started = time.monotonic()
+        result = orphans.collect(
+            prefix=prefix,
+            grace=timedelta(hours=options['grace_hours']),
+            dry_run=dry_run,
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            bloom=options['bloom'],
+            # List every orphan with -v 2
+            on_orphan=self._report_orphan if options['verbosity'] >= 2 else None,
+        )
+        elapsed = time.monotonic() - started
+
+        size_mb = result.orphan_bytes / (1024 * 1024)
+        self.stdout.write(
+            f'Scanned {result.scanned} object(s) in {elapsed:.1f}s: {result.orphans} orphan(s) '
+            f'({size_mb:.1f} MB), {result.recent} unreferenced but within the grace period.'
+        )
+        if dry_run:
+            self.stdout.write(
+                f'Would delete {result.orphans} object(s) and forget {result.stale_blobs} '
+                f'unreferenced blob(s).'
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {result.deleted} object(s) and forgot {result.stale_blobs} '
+            f'unreferenced blob(s).'
+        ))
+        if result.failed:
+            self.stdout.write(self.style.ERROR(f'Failed to delete {result.failed} object(s).'))
+
+    def _report_orphan(self, stored):
+        self.stdout.write(f'  {stored.name} ({stored.size} bytes, modified {stored.modified:%Y-%m-%d %H:%M})')
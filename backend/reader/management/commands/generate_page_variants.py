@@ -0,0 +1,89 @@
+"""
+Django management command to generate responsive variants for existing pages.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reader import blobs, cache
+from reader.imaging import render_derivatives
+from reader.ingestion import store_derivatives
+from reader.models import Page
+
+
+class Command(BaseCommand):
+    """Render downscaled copies of pages ingested before variants existed."""
+    
+    help = 'Generate the downscaled page variants configured by PAGE_DERIVATIVE_WIDTHS'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chapter',
+            type=int,
+            action='append',
+            help='Only process pages of this chapter ID (repeatable)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants for pages that already have them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=32,
+            help='Pages read into memory and rendered at once',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=getattr(settings, 'CHAPTER_RENDER_PROCESSES', 0) or 1,
+            help='Rendering processes',
+        )
+    
+    def handle(self, *args, **options):
+        """Handle the command."""
+        widths = settings.PAGE_DERIVATIVE_WIDTHS
+        if not widths:
+            self.stdout.write(self.style.WARNING('PAGE_DERIVATIVE_WIDTHS is empty; nothing to do.'))
+            return
+        
+        pages = Page.objects.order_by('pk')
+        if options['chapter']:
+            pages = pages.filter(chapter_id__in=options['chapter'])
+        if not options['force']:
+            pages = pages.filter(variants=[])
+        
+        total = pages.count()
+        self.stdout.write(f'Generating variants for {total} pages...')
+        
+        done = 0
+        iterator = pages.iterator()
+        with ProcessPoolExecutor(
+            options['processes'], mp_context=multiprocessing.get_context('spawn')
+        ) as pool:
+            while batch := list(islice(iterator, options['batch_size'])):
+                images = []
+                for page in batch:
+                    with page.image.open('rb') as fileobj:
+                        images.append(fileobj.read())
+                
+                rendered = pool.map(
+                    render_derivatives, images, repeat(widths),
+                    repeat(settings.PAGE_DERIVATIVE_FORMAT), repeat(settings.PAGE_DERIVATIVE_QUALITY),
+                )
+                for page, derivatives in zip(batch, rendered):
+                    page.variants = store_derivatives(page.image.storage, page.image.name, derivatives)
+                Page.objects.bulk_update(batch, ['variants'])
+                blobs.set_variants((page.image.name, page.variants) for page in batch)
+                
+                done += len(batch)
+                self.stdout.write(f'  {done}/{total}')
+        
+        # bulk_update doesn't send post_save
+        cache.invalidate(cache.PAGES)
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} pages.'))
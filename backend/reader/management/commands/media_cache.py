@@ -0,0 +1,61 @@
+"""
+Django management command to inspect and maintain the local media cache.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reader.media_cache import DiskCache
+
+
+class Command(BaseCommand):
+    """Show media cache statistics, or evict or clear its entries."""
+    
+    help = 'Show hit/miss/eviction counters and disk usage of the local media cache'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Evict least recently used entries down to the size limit',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove every cached file',
+        )
+        parser.add_argument(
+            '--reset-stats',
+            action='store_true',
+            help='Reset the hit/miss/eviction counters',
+        )
+    
+    def handle(self, *args, **options):
+        """Handle the command."""
+        media_cache = DiskCache.from_settings()
+        if media_cache is None:
+            raise CommandError('The media cache is disabled; set MEDIA_CACHE_DIR to enable it.')
+        
+        if options['clear']:
+            media_cache.clear()
+            self.stdout.write(self.style.SUCCESS('Media cache cleared.'))
+        elif options['evict']:
+            evicted = media_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {evicted} entries.'))
+        
+        if options['reset_stats']:
+            media_cache.reset_stats()
+        
+        stats = media_cache.stats()
+        entries, size = media_cache.usage()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0
+        
+        self.stdout.write(f'Directory: {media_cache.directory}')
+        self.stdout.write(
+            f'Entries:   {entries} ({size / 1024 ** 2:.1f} of '
+            f'{media_cache.max_size / 1024 ** 2:.1f} MiB)'
+        )
+        self.stdout.write(f'Hits:      {stats["hits"]} ({hit_rate:.1f}%)')
+        self.stdout.write(f'Misses:    {stats["misses"]}')
+        self.stdout.write(f'Evictions: {stats["evictions"]}')
+        self.stdout.write(f'Bypasses:  {stats["bypasses"]}')
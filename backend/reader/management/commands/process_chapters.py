@@ -0,0 +1,93 @@
+"""
+Django management command that runs the chapter processing worker.
+"""
+
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reader.jobs import claim_next_chapter, requeue_stale_chapters, run_chapter_job
+from reader.models import ProcessingStatus
+
+
+class Command(BaseCommand):
+    """Process queued chapter uploads outside the request/response cycle."""
+
+    help = 'Run a worker that extracts pages from queued chapter uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process all due chapters and exit instead of polling',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when the queue is empty (default: 5)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=getattr(settings, 'CHAPTER_PROCESSING_MAX_ATTEMPTS', 3),
+            help='Attempts per chapter before it is marked as failed',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=30,
+            help='Minutes after which a running job is assumed dead and re-queued (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        stale_after = timedelta(minutes=options['stale_after'])
+
+        self.stdout.write('Chapter processing worker started.')
+
+        while not self.stopping:
+            close_old_connections()
+
+            requeued = requeue_stale_chapters(stale_after)
+            if requeued:
+                self.stdout.write(
+                    self.style.WARNING(f'Re-queued {requeued} stale chapter(s).')
+                )
+
+            chapter = claim_next_chapter()
+            if chapter is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Processing: {chapter} (attempt {chapter.processing_attempts})')
+            started = time.monotonic()
+            result = run_chapter_job(chapter, max_attempts=options['max_attempts'])
+            elapsed = time.monotonic() - started
+
+            if result == ProcessingStatus.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Processed: {chapter} ({chapter.pages_total} pages in {elapsed:.1f}s)'
+                ))
+            elif result == ProcessingStatus.QUEUED:
+                self.stdout.write(self.style.WARNING(
+                    f'Will retry: {chapter} ({chapter.processing_error})'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'Failed: {chapter} ({chapter.processing_error})'
+                ))
+
+        self.stdout.write('Chapter processing worker stopped.')
+
+    def _request_stop(self, signum, frame):
+        """Finish the current chapter, then exit."""
+        self.stopping = True
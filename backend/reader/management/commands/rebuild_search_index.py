@@ -0,0 +1,28 @@
+"""
+Django management command to rebuild the series search index.
+"""
+
+from django.core.management.base import BaseCommand
+
+from reader import cache, search
+
+
+class Command(BaseCommand):
+    """Recreate the search document of every series."""
+    
+    help = 'Rebuild the full-text search index of series, authors, artists and aliases'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Series indexed per transaction',
+        )
+    
+    def handle(self, *args, **options):
+        """Handle the command."""
+        self.stdout.write('Rebuilding the search index...')
+        count = search.rebuild(batch_size=options['batch_size'])
+        cache.invalidate(cache.SERIES)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} series.'))
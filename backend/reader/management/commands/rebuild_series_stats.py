@@ -0,0 +1,28 @@
+"""
+Django management command to rebuild the series statistics.
+"""
+
+from django.core.management.base import BaseCommand
+
+from reader import cache, stats
+
+
+class Command(BaseCommand):
+    """Recompute the stats of every series."""
+
+    help = 'Rebuild the chapter counts, page counts, views and latest chapters of series'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Series computed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        self.stdout.write('Rebuilding series stats...')
+        count = stats.rebuild(batch_size=options['batch_size'])
+        cache.invalidate(cache.SERIES)
+        self.stdout.write(self.style.SUCCESS(f'Computed the stats of {count} series.'))
@@ -0,0 +1,298 @@
+"""
+Precomputed page manifests of approved chapters.
+
+A manifest is a single JSON document with everything a reader needs to open
+a chapter: its pages with their URLs, dimensions, spread flags and
+variants, links to the neighbouring chapters, and the first page of the
+next chapter to prefetch. Manifests are stored under a name derived from
+their content (``manifests/<digest>.json``), so a stored manifest never
+changes and is served with far-future caching; ``Chapter.manifest`` names
+the current one, and a chapter whose data changes gets a new manifest.
+
+A chapter's manifest also depends on its neighbours, so a change to a chapter
+or its pages refreshes the chapter and the chapters next to it, before and
+after the change. ``reader.signals`` schedules a refresh when chapters,
+volumes or pages are saved or deleted; code changing them in bulk (admin
+actions, archive processing) schedules one itself. The refreshes scheduled
+in a transaction run together once it commits, and only manifests whose
+content changed are stored. Replaced manifests are left for
+``gc_storage --prefix manifests/``.
+
+Media URLs in a manifest follow ``MEDIA_URL_STRATEGY``, except that
+presigned URLs would expire, so the proxy is used instead. Proxy URLs are
+relative to the manifest's URL. Rebuild the manifests with
+``manage.py build_manifests`` after changing the strategy.
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from hashlib import blake2b
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+
+from reader import cache
+from reader.inventory import save_objects
+from reader.media_urls import media_url
+from reader.models import ApprovalStatus, Chapter, Page, Series
+from reader.navigation import chapter_sequence
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = 'manifests'
+# Bumped when the document layout changes
+VERSION = 1
+
+# Chapter fields the manifests depend on; saves of other fields skip the refresh
+CHAPTER_FIELDS = frozenset({'series', 'volume', 'number', 'title', 'approval_status'})
+
+# Changes waiting for the current transaction of each thread to commit
+_pending = threading.local()
+
+
+def manifest_name(digest):
+    """Return the storage name of the manifest with the content hash ``digest``."""
+    return f'{MANIFEST_PREFIX}/{digest}.json'
+
+
+def manifest_url(chapter, request=None):
+    """
+    Return the URL of a chapter's stored manifest.
+
+    Chapters without one yet get the URL of the endpoint building it.
+    """
+    if chapter.manifest:
+        digest = chapter.manifest.rsplit('/', 1)[-1].split('.', 1)[0]
+        url = reverse('reader:manifest', kwargs={'digest': digest})
+    else:
+        url = reverse('reader:chapter-manifest', kwargs={'pk': chapter.pk})
+    return request.build_absolute_uri(url) if request else url
+
+
+def page_entry(image, width, height, position, is_spread, variants):
+    return {
+        'url': media_url(image, signed=False),
+        'width': width,
+        'height': height,
+        'position': position,
+        'is_spread': is_spread,
+        'variants': [
+            {
+                'url': media_url(variant['name'], signed=False),
+                'width': variant['width'],
+                'height': variant['height'],
+                'mime_type': variant['mime_type'],
+            }
+            for variant in variants
+        ],
+    }
+
+
+def chapter_entry(link):
+    if link is None:
+        return None
+    return {
+        **link._asdict(),
+        'manifest_url': reverse('reader:chapter-manifest', kwargs={'pk': link.id}),
+    }
+
+
+def build_series_manifests(series_id, chapter_ids=None, sequence=None):
+    """
+    Return the manifests of the approved chapters of a series.
+
+    Args:
+        chapter_ids: Only build the manifests of these chapters
+        sequence: The series' ``chapter_sequence``, if already read
+
+    Returns:
+        A dict mapping chapter IDs to the encoded manifests
+    """
+    # Manifests are refreshed as changes commit, before the cached sequence
+    # is replaced (see reader.cache.invalidate)
+    ids, links = sequence or chapter_sequence(series_id, cached=False)
+    if chapter_ids is None:
+        indexes = range(len(links))
+    else:
+        chapter_ids = set(chapter_ids)
+        indexes = [index for index, chapter_id in enumerate(ids) if chapter_id in chapter_ids]
+    # The pages of the chapters built, and the first page of the ones after them
+    page_chapters = {ids[i] for index in indexes for i in (index, index + 1) if i < len(ids)}
+
+    pages = defaultdict(list)
+    rows = Page.objects.filter(chapter_id__in=page_chapters).order_by('chapter_id', 'number').values_list(
+        'chapter_id', 'number', 'image', 'width', 'height', 'position', 'is_spread', 'variants'
+    )
+    for chapter_id, number, *fields in rows:
+        pages[chapter_id].append({'number': number, **page_entry(*fields)})
+
+    manifests = {}
+    for index in indexes:
+        link = links[index]
+        following = links[index + 1] if index + 1 < len(links) else None
+        next_chapter = chapter_entry(following)
+        if next_chapter:
+            # Prefetched while the last pages of this chapter are read
+            next_chapter['first_page'] = (pages[following.id] or [None])[0]
+        document = {
+            'version': VERSION,
+            'chapter': link._asdict(),
+            'pages': pages[link.id],
+            'prev_chapter': chapter_entry(links[index - 1] if index > 0 else None),
+            'next_chapter': next_chapter,
+        }
+        manifests[link.id] = json.dumps(document, separators=(',', ':'), sort_keys=True).encode()
+    return manifests
+
+
+def refresh_series_manifests(series_ids, storage=None):
+    """
+    Rebuild the manifests of the approved chapters of ``series_ids``.
+
+    Changed manifests are stored and recorded on their chapters, and
+    chapters that are no longer approved lose theirs.
+
+    Returns:
+        The number of chapters whose manifest changed
+    """
+    return _refresh({series_id: None for series_id in series_ids}, storage)
+
+
+def refresh_chapter_manifests(series_id, chapter_ids, neighbours=True, storage=None):
+    """
+    Rebuild the manifests of some chapters of a series.
+
+    Args:
+        neighbours: Also rebuild the manifests of the chapters before and
+            after them, which link to them
+
+    Returns:
+        The number of chapters whose manifest changed
+    """
+    return _refresh({series_id: set(chapter_ids)}, storage, neighbours)
+
+
+def _refresh(changes, storage=None, neighbours=True):
+    """Rebuild the manifests of ``{series ID: chapter IDs, or None for all}``."""
+    storage = storage or default_storage
+    changed = 0
+    for series_id, chapter_ids in sorted(changes.items()):
+        sequence = ids, _ = chapter_sequence(series_id, cached=False)
+        chapters = Chapter.objects.filter(series_id=series_id)
+        if chapter_ids is not None:
+            positions = {chapter_id: index for index, chapter_id in enumerate(ids)}
+            built = set()
+            for chapter_id in chapter_ids & positions.keys():
+                index = positions[chapter_id]
+                built.update(ids[max(index - 1, 0):index + 2] if neighbours else [chapter_id])
+            chapters = chapters.filter(pk__in=built | chapter_ids)
+            chapter_ids = built
+        current = dict(chapters.values_list('pk', 'manifest'))
+        manifests = build_series_manifests(series_id, chapter_ids, sequence)
+        updates, documents = {}, {}
+        for chapter_id, content in manifests.items():
+            name = manifest_name(blake2b(content, digest_size=16).hexdigest())
+            if current.get(chapter_id) != name:
+                updates[chapter_id] = name
+                documents[name] = content
+        withdrawn = [pk for pk, name in current.items() if name and pk not in manifests]
+
+        save_objects(storage, [
+            (name, ContentFile(documents[name])) for name in _missing(storage, list(documents))
+        ], overwrite=True)
+        Chapter.objects.bulk_update(
+            [Chapter(pk=pk, manifest=name) for pk, name in updates.items()], ['manifest']
+        )
+        Chapter.objects.filter(pk__in=withdrawn).update(manifest='')
+        changed += len(updates) + len(withdrawn)
+    if changed:
+        # Chapter responses link the manifests; bulk updates don't send signals
+        cache.invalidate(cache.CHAPTERS)
+    return changed
+
+
+def _missing(storage, names):
+    # Identical manifests may already be stored, e.g. after an edit is reverted
+    if hasattr(storage, 'exists_many'):
+        existing = storage.exists_many(names)
+    else:
+        existing = {name for name in names if storage.exists(name)}
+    return [name for name in names if name not in existing]
+
+
+def schedule_refresh(series_ids):
+    """Refresh every manifest of ``series_ids`` once the current transaction commits."""
+    for series_id in series_ids:
+        _schedule(series_id, None)
+
+
+def schedule_chapter_refresh(series_id, chapter_ids):
+    """
+    Refresh the manifests of some chapters of a series, and of the chapters
+    next to them, once the current transaction commits.
+    """
+    chapter_ids = set(chapter_ids)
+    if chapter_ids:
+        _schedule(series_id, chapter_ids)
+
+
+def schedule_neighbour_refresh(chapter):
+    """
+    Refresh the manifests of the chapters next to ``chapter`` as it is now,
+    before it is moved, withdrawn or deleted, once the current transaction
+    commits.
+    """
+    series_id = Chapter.objects.filter(
+        pk=chapter.pk, approval_status=ApprovalStatus.APPROVED
+    ).values_list('series_id', flat=True).first()
+    if series_id is None:
+        # Not in the reading order, so not linked from other manifests
+        return
+    ids, _ = chapter_sequence(series_id, cached=False)
+    index = ids.index(chapter.pk)
+    schedule_chapter_refresh(series_id, [
+        chapter_id for chapter_id in ids[max(index - 1, 0):index + 2] if chapter_id != chapter.pk
+    ])
+
+
+def _schedule(series_id, chapter_ids):
+    # Every call registers a callback, but the first to run refreshes all
+    # the changes of its transaction and leaves nothing for the others.
+    # Changes of a rolled back transaction are refreshed with the next
+    # commit, which only costs a rebuild that finds nothing to store.
+    pending = _pending.__dict__.setdefault('changes', {})
+    if chapter_ids is None:
+        pending[series_id] = None
+    elif pending.get(series_id, ()) is not None:
+        pending.setdefault(series_id, set()).update(chapter_ids)
+    transaction.on_commit(_run_pending)
+
+
+def _run_pending():
+    changes = _pending.__dict__.pop('changes', None)
+    if not changes:
+        return
+    try:
+        _refresh(changes)
+    except Exception:
+        # The data is committed; the manifest endpoint and
+        # `manage.py build_manifests` can catch up later
+        logger.exception('Failed to refresh the chapter manifests of series %s', sorted(changes))
+
+
+def rebuild(batch_size=100):
+    """
+    Rebuild the manifests of every series.
+
+    Returns:
+        The number of chapters whose manifest changed
+    """
+    series_ids = list(Series.objects.order_by('pk').values_list('pk', flat=True))
+    return sum(
+        refresh_series_manifests(series_ids[start:start + batch_size])
+        for start in range(0, len(series_ids), batch_size)
+    )
@@ -0,0 +1,312 @@
+"""
+Streaming media responses with HTTP range and conditional request support.
+
+Media objects are never read into memory as a whole. Files on local storage
+are returned as a ``FileResponse``, which the WSGI server can hand to
+``sendfile`` so the kernel does the copy; objects in S3-compatible storage are
+served from the local media cache when it is enabled, or else proxied chunk
+by chunk from a single ``GetObject`` call, with ``Range`` and the conditional
+headers passed through to the bucket.
+"""
+
+import logging
+import mimetypes
+import os
+import stat
+from datetime import datetime, timezone
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CACHE_CONTROL = 'public, max-age=86400'  # 24 hours
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+def parse_range(header, size):
+    """
+    Parse a ``Range`` header against a file of ``size`` bytes.
+
+    Only single byte ranges are supported; the whole file is served for
+    malformed and multi-range requests, as RFC 9110 allows.
+
+    Returns:
+        An inclusive ``(start, end)`` pair, or None to serve the whole file
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    first, sep, last = spec.partition('-')
+    if not sep:
+        return None
+
+    try:
+        if first == '':
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def if_range_matches(header, etag, last_modified):
+    """Return True if a ``Range`` request may be honoured under the ``If-Range`` ``header``."""
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        # If-Range requires a strong comparison
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+
+def file_validators(st):
+    """Return the ``(etag, last_modified)`` of a local file from its ``os.stat()`` result."""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"', int(st.st_mtime)
+
+
+def iter_file_range(fileobj, start, length, chunk_size=CHUNK_SIZE):
+    """Yield ``length`` bytes of ``fileobj`` from ``start`` and close it."""
+    try:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def iter_body(body, chunk_size=CHUNK_SIZE):
+    """Yield the chunks of a botocore ``StreamingBody`` and close it."""
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+
+def partial_response(content, start, end, size, content_type):
+    """Return a 206 response streaming ``content`` for bytes ``start``-``end``."""
+    response = StreamingHttpResponse(content, status=206, content_type=content_type)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def range_not_satisfiable(size=None):
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{size if size is not None else "*"}'
+    return response
+
+
+def serve_media(request, name, storage=None):
+    """
+    Return a streaming response for the stored file ``name``.
+
+    Supports ``Range``/``If-Range`` (206 Partial Content), ``If-None-Match``
+    and ``If-Modified-Since``. Memory use is bounded by ``CHUNK_SIZE``
+    whatever the size of the file.
+
+    Raises:
+        Http404: If the file does not exist
+    """
+    storage = storage or default_storage
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    if isinstance(storage, S3Storage):
+        response = _serve_cached(request, storage, name, content_type)
+        if response is None:
+            response = _serve_s3(request, storage, name, content_type)
+    else:
+        try:
+            path = storage.path(name)
+        except NotImplementedError:
+            response = _serve_storage_file(request, storage, name, content_type)
+        except SuspiciousFileOperation:
+            raise Http404('File not found')
+        else:
+            response = _serve_local(request, path, content_type)
+
+    if response.status_code in (200, 206, 304):
+        response['Cache-Control'] = CACHE_CONTROL
+    if response.status_code in (200, 206):
+        response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _serve_local(request, path, content_type):
+    try:
+        fileobj = open(path, 'rb')
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        raise Http404('File not found')
+    return _serve_open_file(request, fileobj, content_type)
+
+
+def _serve_open_file(request, fileobj, content_type):
+    """Serve a local file that is already open; the response closes it."""
+    st = os.fstat(fileobj.fileno())
+    if not stat.S_ISREG(st.st_mode):
+        fileobj.close()
+        raise Http404('File not found')
+
+    size = st.st_size
+    etag, last_modified = file_validators(st)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(
+            request, lambda: fileobj, size, content_type, etag, last_modified
+        )
+    if not response.streaming:
+        # 304 or 416: the file isn't sent
+        fileobj.close()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _serve_storage_file(request, storage, name, content_type):
+    """Serve a file from a storage without local paths or an S3 client."""
+    if not storage.exists(name):
+        raise Http404('File not found')
+    return _file_response(request, lambda: storage.open(name, 'rb'), storage.size(name), content_type)
+
+
+def _file_response(request, open_file, size, content_type, etag=None, last_modified=None):
+    byte_range = None
+    if request.META.get('HTTP_RANGE') and if_range_matches(
+        request.META.get('HTTP_IF_RANGE'), etag, last_modified
+    ):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except RangeNotSatisfiable:
+            return range_not_satisfiable(size)
+
+    if byte_range is None:
+        # The WSGI server can send real files with sendfile()
+        return FileResponse(open_file(), content_type=content_type)
+
+    start, end = byte_range
+    return partial_response(
+        iter_file_range(open_file(), start, end - start + 1), start, end, size, content_type
+    )
+
+
+def _serve_cached(request, storage, name, content_type):
+    """Serve an S3 object from the local media cache, if the storage has one."""
+    if getattr(storage, 'media_cache', None) is None:
+        return None
+    try:
+        # A HEAD miss is answered by the bucket rather than by downloading the object
+        cached = storage.open_cached(name, fill=request.method != 'HEAD')
+    except FileNotFoundError:
+        raise Http404('File not found')
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f'Failed to cache media file {name}: {e}')
+        return None
+    if cached is None:
+        return None
+
+    fileobj, hit = cached
+    response = _serve_open_file(request, fileobj, content_type)
+    response['X-Media-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def _serve_s3(request, storage, name, content_type):
+    client = storage.connection.meta.client
+    params = {'Bucket': storage.bucket_name, 'Key': storage._normalize_name(clean_name(name))}
+
+    if request.META.get('HTTP_IF_NONE_MATCH'):
+        params['IfNoneMatch'] = request.META['HTTP_IF_NONE_MATCH']
+    elif request.META.get('HTTP_IF_MODIFIED_SINCE'):
+        modified_since = parse_http_date_safe(request.META['HTTP_IF_MODIFIED_SINCE'])
+        if modified_since is not None:
+            params['IfModifiedSince'] = datetime.fromtimestamp(modified_since, tz=timezone.utc)
+
+    range_params = {}
+    if request.META.get('HTTP_RANGE'):
+        range_params['Range'] = request.META['HTTP_RANGE']
+        # If-Range becomes a precondition on the ranged request; when it
+        # fails the whole object is fetched instead
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and if_range.startswith(('"', 'W/')):
+            range_params['IfMatch'] = if_range
+        elif if_range:
+            unmodified_since = parse_http_date_safe(if_range)
+            if unmodified_since is not None:
+                range_params['IfUnmodifiedSince'] = datetime.fromtimestamp(
+                    unmodified_since, tz=timezone.utc
+                )
+
+    fetch = client.head_object if request.method == 'HEAD' else client.get_object
+    try:
+        try:
+            obj = fetch(**params, **range_params)
+        except ClientError as e:
+            if range_params and _status_code(e) == 412:
+                obj = fetch(**params)
+            else:
+                raise
+    except ClientError as e:
+        status_code = _status_code(e)
+        if status_code == 304:
+            response = HttpResponseNotModified()
+            etag = e.response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('etag')
+            if etag:
+                response['ETag'] = etag
+            return response
+        if status_code == 416:
+            return range_not_satisfiable()
+        if status_code != 404:
+            logger.error(f'Failed to fetch media file {name}: {e}')
+        raise Http404('File not found')
+    except BotoCoreError as e:
+        logger.error(f'Failed to fetch media file {name}: {e}')
+        raise Http404('File not found')
+
+    status_code = 206 if obj.get('ContentRange') else 200
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status_code, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            iter_body(obj['Body']), status=status_code, content_type=content_type
+        )
+    response['Content-Length'] = obj['ContentLength']
+    if obj.get('ContentRange'):
+        response['Content-Range'] = obj['ContentRange']
+    if obj.get('ETag'):
+        response['ETag'] = obj['ETag']
+    if obj.get('LastModified'):
+        response['Last-Modified'] = http_date(obj['LastModified'].timestamp())
+    return response
+
+
+def _status_code(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
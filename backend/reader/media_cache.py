@@ -0,0 +1,304 @@
+"""
+Size-bounded on-disk cache for media objects fetched from remote storage.
+
+Page images are content-addressed (``{hash}{ext}``) and never change, so a
+local copy stays valid for as long as it exists. Only such names are cached:
+an object stored under a name that may be reused, like the covers uploaded
+before cover names included a hash, is always read from storage. Entries are written to a
+temporary file and moved into place with ``os.replace``, so readers never see
+partial files, and several processes (gunicorn workers) can share one cache
+directory. When the directory grows past its size limit the least recently
+used entries, by access time, are evicted by whichever process takes the
+eviction lock.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY_PREFIX = 'media_cache:'
+TEMP_PREFIX = '.tmp-'
+LOCK_NAME = '.evict.lock'
+# A content hash starting the file name, or following a dash (``cover-{hash}``)
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|-)[0-9a-f]{32}(?:[.-]|$)')
+
+
+class DiskCache:
+    """
+    A least-recently-used cache of files in ``directory``.
+
+    Args:
+        directory: Cache directory, created on demand
+        max_size: Total size in bytes above which entries are evicted
+        max_object_size: Larger objects are not cached
+        evict_to: Fraction of ``max_size`` an eviction pass shrinks the cache to
+    """
+    # Counters are kept per process and added to the shared Django cache
+    # every `stats_flush_every` events
+    stats_flush_every = 100
+
+    def __init__(self, directory, max_size, max_object_size=None, evict_to=0.9):
+        self.directory = str(directory)
+        self.max_size = max_size
+        self.max_object_size = max_object_size or max_size
+        self.evict_to = evict_to
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._written_since_evict = None
+
+    @classmethod
+    def from_settings(cls):
+        """Return the cache configured by ``MEDIA_CACHE_*``, or None if disabled."""
+        directory = getattr(settings, 'MEDIA_CACHE_DIR', '')
+        max_size = getattr(settings, 'MEDIA_CACHE_MAX_SIZE', 0)
+        if not directory or max_size <= 0:
+            return None
+        return cls(
+            directory, max_size,
+            max_object_size=getattr(settings, 'MEDIA_CACHE_MAX_OBJECT_SIZE', None),
+        )
+
+    @staticmethod
+    def accepts(name):
+        """Return True if ``name`` includes a hash of its content, so a cached copy can't go stale."""
+        return CONTENT_ADDRESSED_RE.search(os.path.basename(name)) is not None
+
+    def path_for(self, name):
+        """Return the cache path of the storage name ``name``."""
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        ext = os.path.splitext(name)[-1][:10]
+        return os.path.join(self.directory, digest[:2], f'{digest[2:]}{ext}')
+
+    def open(self, name):
+        """
+        Open the cached copy of ``name`` for reading.
+
+        Returns:
+            A binary file object, or None on a cache miss
+        """
+        path = self.path_for(name)
+        try:
+            fileobj = open(path, 'rb')
+        except FileNotFoundError:
+            self.record('misses')
+            return None
+
+        # Mark the entry as recently used. The modification time is left
+        # alone so it keeps describing when the copy was made.
+        try:
+            st = os.fstat(fileobj.fileno())
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+        self.record('hits')
+        return fileobj
+
+    def store(self, name, chunks):
+        """
+        Write ``chunks`` (an iterable of bytes) to the cache as ``name``.
+
+        Returns:
+            The stored copy, opened for reading
+        """
+        entry = self.begin(name)
+        try:
+            for chunk in chunks:
+                entry.write(chunk)
+        except BaseException:
+            entry.discard()
+            raise
+        return entry.commit()
+
+    def begin(self, name):
+        """Start writing ``name`` to the cache, for callers receiving it in pieces."""
+        return CacheEntry(self, name)
+
+    def _note_written(self, size):
+        with self._lock:
+            # Scan on the first write of the process, then whenever another
+            # 5% of the limit has been written
+            first = self._written_since_evict is None
+            self._written_since_evict = (self._written_since_evict or 0) + size
+            due = first or self._written_since_evict >= self.max_size * 0.05
+            if due:
+                self._written_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits its limit.
+
+        Only one process evicts at a time; others skip the pass.
+
+        Returns:
+            The number of entries removed
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_NAME), 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0
+
+            entries, total = self._scan()
+            if total <= self.max_size:
+                return 0
+
+            target = self.max_size * self.evict_to
+            evicted = 0
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+
+        self.record('evictions', evicted)
+        logger.info(f'Evicted {evicted} media cache entries')
+        return evicted
+
+    def _scan(self):
+        """Return ``(atime, size, path)`` for every entry, and their total size."""
+        entries, total = [], 0
+        stale_before = time.time() - 3600
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith(TEMP_PREFIX):
+                    # Left behind by a crashed writer
+                    if st.st_mtime < stale_before:
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+                    continue
+                entries.append((st.st_atime_ns, st.st_size, entry.path))
+                total += st.st_size
+        return entries, total
+
+    def clear(self):
+        """Remove every entry."""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def usage(self):
+        """Return the number of entries and their total size in bytes."""
+        if not os.path.isdir(self.directory):
+            return 0, 0
+        entries, total = self._scan()
+        return len(entries), total
+
+    def record(self, counter, amount=1):
+        """Count a cache event (``hits``, ``misses``, ``evictions`` or ``bypasses``)."""
+        if not amount:
+            return
+        with self._lock:
+            self._pending[counter] += amount
+            due = sum(self._pending.values()) >= self.stats_flush_every
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Add this process's pending counters to the shared totals."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        for counter, amount in pending.items():
+            key = STATS_KEY_PREFIX + counter
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, amount, timeout=None)
+
+    def stats(self):
+        """Return the hit, miss, eviction and bypass counters of all processes."""
+        self.flush_stats()
+        names = ('hits', 'misses', 'evictions', 'bypasses')
+        totals = cache.get_many([STATS_KEY_PREFIX + name for name in names])
+        return {name: totals.get(STATS_KEY_PREFIX + name, 0) for name in names}
+
+    def reset_stats(self):
+        with self._lock:
+            self._pending.clear()
+        cache.delete_many([
+            STATS_KEY_PREFIX + name for name in ('hits', 'misses', 'evictions', 'bypasses')
+        ])
+
+
+class CacheEntry:
+    """
+    A cache entry being written to a temporary file.
+
+    The entry only becomes visible to readers once ``commit`` moves it into
+    place; ``discard`` removes the partial file.
+    """
+
+    def __init__(self, cache, name):
+        self.cache = cache
+        self.path = cache.path_for(name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(self.path))
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def commit(self):
+        """
+        Move the entry into place.
+
+        Returns:
+            The stored copy, opened for reading
+        """
+        try:
+            self.file.close()
+            # Open before the rename, so a concurrent eviction can't remove
+            # the file from under the caller
+            fileobj = open(self.temp_path, 'rb')
+            os.replace(self.temp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+
+        self.cache._note_written(os.fstat(fileobj.fileno()).st_size)
+        return fileobj
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
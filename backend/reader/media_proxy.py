@@ -0,0 +1,410 @@
+"""
+Asynchronous proxying of media objects from S3-compatible storage.
+
+Under WSGI every media request holds a worker thread for as long as the
+bucket takes to send the object, so a couple of sync workers stream a couple
+of images at a time. ``MediaProxy`` wraps the ASGI application (see
+``mangakg/asgi.py``) and answers ``serve-media`` requests on the event loop:
+objects are fetched with presigned requests on an ``httpx.AsyncClient``
+shared by every request of the process, and streamed to the client chunk by
+chunk, so one process serves hundreds of downloads while they wait on the
+bucket.
+
+Responses match ``reader.media``: ``Range`` and ``If-Range``,
+``If-None-Match`` and ``If-Modified-Since`` are passed through to the bucket,
+with the same caching headers. When the local media cache is enabled, hits
+are served from disk here too, read chunk by chunk on worker threads (under
+ASGI, Django drains a file response on a thread into memory before sending
+it), and misses are written to the cache while they stream. Other storages
+are left to Django. Proxied requests skip the Django middleware, some of
+which would move every request onto a thread; the headers of the
+middleware that only adds headers (CORS, security and framing) are computed
+by that middleware and added to the proxied responses, so they match the
+ones Django sends.
+
+Every other request goes to Django, which runs each one on its own thread
+with its own database connection. At most ``ASGI_DJANGO_CONCURRENCY`` of
+them run at once per process, and the rest wait their turn on the event
+loop, as they would for a thread of a ``gthread`` WSGI worker, so a burst of
+requests can't open more database connections than the limit.
+"""
+
+import asyncio
+import logging
+import mimetypes
+import os
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import parse_etags
+from django.utils.functional import cached_property
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from reader.media import (
+    CACHE_CONTROL, CHUNK_SIZE, RangeNotSatisfiable, file_validators, if_range_matches, parse_range
+)
+
+logger = logging.getLogger(__name__)
+
+# Presigned requests are sent straight away
+PRESIGN_EXPIRY = 60
+
+# Response headers passed on from the bucket
+PASSED_HEADERS = ('content-length', 'content-range', 'etag', 'last-modified')
+
+# Middleware in MIDDLEWARE that only adds response headers, and the method
+# adding them; the proxy adds their headers to its responses
+HEADER_MIDDLEWARE = {
+    'corsheaders.middleware.CorsMiddleware': 'add_response_headers',
+    'django.middleware.security.SecurityMiddleware': 'process_response',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware': 'process_response',
+}
+
+_clients = weakref.WeakKeyDictionary()
+_django_slots = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the ``httpx.AsyncClient`` shared by the requests of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        max_connections = getattr(settings, 'MEDIA_PROXY_MAX_CONNECTIONS', 100)
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(getattr(settings, 'MEDIA_PROXY_TIMEOUT', 30)),
+        )
+    return client
+
+
+def django_slots():
+    """Return the semaphore limiting the Django requests of the running event loop."""
+    loop = asyncio.get_running_loop()
+    slots = _django_slots.get(loop)
+    if slots is None:
+        slots = _django_slots[loop] = asyncio.Semaphore(getattr(settings, 'ASGI_DJANGO_CONCURRENCY', 8))
+    return slots
+
+
+async def close_client():
+    """Close the client of the running event loop, if one was opened."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class MediaProxy:
+    """
+    ASGI middleware serving media objects asynchronously.
+
+    Args:
+        app: ASGI application handling every other request
+        storage: Storage to serve from (default: ``default_storage``)
+        client: ``httpx.AsyncClient`` to use instead of the shared one
+    """
+
+    def __init__(self, app, storage=None, client=None):
+        self.app = app
+        self._storage = storage
+        self._client = client
+
+    @property
+    def storage(self):
+        return self._storage or default_storage
+
+    @cached_property
+    def prefix(self):
+        return reverse('reader:serve-media', kwargs={'file_path': 'x'})[:-1]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif self.proxies(scope):
+            send = self._with_headers(send, self.middleware_headers(scope))
+            await self.serve(scope, send, scope['path'][len(self.prefix):])
+        elif scope['type'] == 'http':
+            async with django_slots():
+                await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Close the shared client on shutdown; Django doesn't handle lifespan events."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_client()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @cached_property
+    def header_middleware(self):
+        """The response methods of the configured ``HEADER_MIDDLEWARE``, in response order."""
+        methods = []
+        for path in reversed(settings.MIDDLEWARE):
+            if path in HEADER_MIDDLEWARE:
+                middleware = import_string(path)(lambda request: None)
+                methods.append(getattr(middleware, HEADER_MIDDLEWARE[path]))
+        return methods
+
+    def middleware_headers(self, scope):
+        """Return the headers ``HEADER_MIDDLEWARE`` adds to a response to the request ``scope``."""
+        request = ASGIRequest(scope, None)
+        response = HttpResponse()
+        del response['Content-Type']
+        for process_response in self.header_middleware:
+            process_response(request, response)
+        return [(key.lower(), value) for key, value in response.items()]
+
+    @staticmethod
+    def _with_headers(send, headers):
+        """Wrap ``send`` to add ``headers`` the response doesn't set itself."""
+        encoded = [(key.encode('latin-1'), value.encode('latin-1')) for key, value in headers]
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                names = {key for key, _ in message['headers']}
+                message = {
+                    **message, 'headers': [*message['headers'], *(h for h in encoded if h[0] not in names)]
+                }
+            await send(message)
+        return send_with_headers
+
+    def proxies(self, scope):
+        """Return True if the request is for a media object this proxy serves."""
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            return False
+        if not scope['path'].startswith(self.prefix) or len(scope['path']) == len(self.prefix):
+            return False
+        return isinstance(self.storage, S3Storage)
+
+    async def serve(self, scope, send, name):
+        """Stream the object ``name`` to the client."""
+        storage = self.storage
+        client = self._client or get_client()
+        headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        method = scope['method']
+        try:
+            key = storage._normalize_name(clean_name(name))
+        except SuspiciousOperation:
+            await _send_status(send, 404)
+            return
+
+        media_cache = getattr(storage, 'media_cache', None)
+        if media_cache is not None and media_cache.accepts(name):
+            # Counts the hit or miss, which may flush the stats to the Django cache
+            fileobj = await sync_to_async(media_cache.open)(name)
+            if fileobj is not None:
+                await self._serve_cached(send, fileobj, name, method, headers)
+                return
+
+        url = storage.connection.meta.client.generate_presigned_url(
+            'head_object' if method == 'HEAD' else 'get_object',
+            Params={'Bucket': storage.bucket_name, 'Key': key},
+            ExpiresIn=PRESIGN_EXPIRY,
+        )
+
+        request_headers = {}
+        if headers.get('if-none-match'):
+            request_headers['If-None-Match'] = headers['if-none-match']
+        elif parse_http_date_safe(headers.get('if-modified-since', '')) is not None:
+            request_headers['If-Modified-Since'] = headers['if-modified-since']
+
+        range_headers = {}
+        if headers.get('range'):
+            range_headers['Range'] = headers['range']
+            # If-Range becomes a precondition on the ranged request; when it
+            # fails the whole object is fetched instead
+            if_range = headers.get('if-range')
+            if if_range and if_range.startswith(('"', 'W/')):
+                range_headers['If-Match'] = if_range
+            elif if_range and parse_http_date_safe(if_range) is not None:
+                range_headers['If-Unmodified-Since'] = if_range
+
+        try:
+            upstream = await client.send(
+                client.build_request(method, url, headers={**request_headers, **range_headers}),
+                stream=True,
+            )
+            if range_headers and upstream.status_code == 412:
+                await upstream.aclose()
+                upstream = await client.send(
+                    client.build_request(method, url, headers=request_headers), stream=True
+                )
+        except httpx.HTTPError as e:
+            logger.error(f'Failed to fetch media file {name}: {e!r}')
+            await _send_status(send, 404)
+            return
+
+        try:
+            await self._respond(send, upstream, name, method)
+        finally:
+            await upstream.aclose()
+
+    async def _respond(self, send, upstream, name, method):
+        status = upstream.status_code
+        if status == 304:
+            etag = upstream.headers.get('etag')
+            await _send_status(send, 304, [
+                ('cache-control', CACHE_CONTROL), *([('etag', etag)] if etag else [])
+            ])
+            return
+        if status == 416:
+            await _send_status(send, 416, [('content-range', 'bytes */*')])
+            return
+        if status not in (200, 206):
+            if status != 404:
+                logger.error(f'Failed to fetch media file {name}: HTTP {status}')
+            await _send_status(send, 404)
+            return
+
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response_headers = [
+            ('content-type', content_type),
+            *((header, upstream.headers[header]) for header in PASSED_HEADERS if header in upstream.headers),
+            ('cache-control', CACHE_CONTROL),
+            ('accept-ranges', 'bytes'),
+            ('x-content-type-options', 'nosniff'),
+        ]
+        entry = None
+        if method == 'GET' and status == 200:
+            entry = await self._begin_cache_entry(name, upstream)
+            if entry is not None:
+                response_headers.append(('x-media-cache', 'MISS'))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(key.encode('latin-1'), value.encode('latin-1')) for key, value in response_headers],
+        })
+        if method == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        received = 0
+        try:
+            async for chunk in upstream.aiter_raw(CHUNK_SIZE):
+                if entry is not None:
+                    entry.write(chunk)
+                received += len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except BaseException:
+            if entry is not None:
+                entry.discard()
+            raise
+        if entry is not None:
+            if received == int(upstream.headers.get('content-length', -1)):
+                # Committing may start an eviction pass over the cache
+                # directory and record the stats in the Django cache
+                fileobj = await sync_to_async(entry.commit)()
+                fileobj.close()
+            else:
+                entry.discard()
+
+    async def _serve_cached(self, send, fileobj, name, method, headers):
+        """Stream the cached copy of ``name``, which is closed afterwards."""
+        try:
+            st = os.fstat(fileobj.fileno())
+            size = st.st_size
+            etag, last_modified = file_validators(st)
+            validators = [
+                ('cache-control', CACHE_CONTROL), ('etag', etag), ('last-modified', http_date(last_modified))
+            ]
+            if _not_modified(headers, etag, last_modified):
+                await _send_status(send, 304, validators)
+                return
+
+            status, start, end = 200, 0, size - 1
+            if headers.get('range') and if_range_matches(headers.get('if-range'), etag, last_modified):
+                try:
+                    byte_range = parse_range(headers['range'], size)
+                except RangeNotSatisfiable:
+                    await _send_status(send, 416, [('content-range', f'bytes */{size}')])
+                    return
+                if byte_range is not None:
+                    status, (start, end) = 206, byte_range
+
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            remaining = end - start + 1
+            response_headers = [
+                ('content-type', content_type),
+                ('content-length', str(remaining)),
+                *([('content-range', f'bytes {start}-{end}/{size}')] if status == 206 else []),
+                *validators,
+                ('accept-ranges', 'bytes'),
+                ('x-content-type-options', 'nosniff'),
+                ('x-media-cache', 'HIT'),
+            ]
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [
+                    (key.encode('latin-1'), value.encode('latin-1')) for key, value in response_headers
+                ],
+            })
+            if method == 'HEAD':
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+
+            # Disk reads block, so only one chunk at a time is read, off the loop
+            await asyncio.to_thread(fileobj.seek, start)
+            while remaining > 0:
+                chunk = await asyncio.to_thread(fileobj.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            fileobj.close()
+
+    async def _begin_cache_entry(self, name, upstream):
+        """Start caching a full object as it streams, if the media cache is enabled."""
+        media_cache = getattr(self.storage, 'media_cache', None)
+        if media_cache is None or not media_cache.accepts(name):
+            return None
+        # The miss was counted when the cache was looked up
+        size = int(upstream.headers.get('content-length', -1))
+        if not 0 <= size <= media_cache.max_object_size:
+            await sync_to_async(media_cache.record)('bypasses')
+            return None
+        try:
+            return media_cache.begin(name)
+        except OSError as e:
+            logger.error(f'Failed to cache media file {name}: {e}')
+            return None
+
+
+def _not_modified(headers, etag, last_modified):
+    """Return True if the request's conditional headers make a 304 the answer."""
+    if headers.get('if-none-match'):
+        # Weak comparison, as for Django's responses
+        tags = parse_etags(headers['if-none-match'])
+        return '*' in tags or etag in [tag.removeprefix('W/') for tag in tags]
+    since = parse_http_date_safe(headers.get('if-modified-since', ''))
+    return since is not None and last_modified <= since
+
+
+async def _send_status(send, status, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.encode('latin-1'), value.encode('latin-1')) for key, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,99 @@
+"""
+URLs of stored page images and covers, as given out by the API.
+
+``MEDIA_URL_STRATEGY`` picks how clients reach the files:
+
+- ``proxy`` (default): through ``reader:serve-media``, so every byte passes
+  through an app server and its media cache
+- ``direct``: the storage's public URL, on ``AWS_S3_CUSTOM_DOMAIN`` when one
+  is set, which takes media traffic off the app servers entirely. Needs
+  publicly readable objects.
+- ``presigned``: short-lived signed URLs of the bucket, for private buckets
+
+Presigned URLs are signed locally, without a request to the bucket, and
+valid for ``MEDIA_URL_PRESIGN_EXPIRY`` seconds. Each object is signed once
+per *signing period* of half that, so a URL handed out during a period,
+even from a cached API response, is good for at least half the expiry
+after the period ends. Cached API responses are keyed on the period (see
+``response_stamps``), so clients get fresh URLs when it rolls over.
+"""
+
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+STRATEGIES = ('proxy', 'direct', 'presigned')
+
+# Presigned URLs kept per process
+PRESIGNED_CACHE_SIZE = 20_000
+
+
+def strategy():
+    """Return the configured ``MEDIA_URL_STRATEGY``."""
+    value = getattr(settings, 'MEDIA_URL_STRATEGY', 'proxy')
+    if value not in STRATEGIES:
+        raise ImproperlyConfigured(
+            f"MEDIA_URL_STRATEGY must be one of {', '.join(STRATEGIES)}, not {value!r}"
+        )
+    return value
+
+
+def media_url(name, request=None, storage=None, signed=True):
+    """
+    Return the URL clients should fetch the stored file ``name`` from.
+
+    Pass ``signed=False`` for URLs kept longer than a presigned URL lasts,
+    such as in chapter manifests; they go through the proxy instead.
+    """
+    storage = storage or default_storage
+    mode = strategy()
+    if mode == 'direct':
+        url = storage.url(name)
+    elif mode == 'presigned' and signed and isinstance(storage, S3Storage):
+        return presigned_url(name, storage)
+    else:
+        url = reverse('reader:serve-media', kwargs={'file_path': name})
+    # Local storage URLs are relative
+    return request.build_absolute_uri(url) if request and url.startswith('/') else url
+
+
+def presign_expiry():
+    return max(2, getattr(settings, 'MEDIA_URL_PRESIGN_EXPIRY', 3600))
+
+
+def signing_period(now=None):
+    """Return the start of the current signing period, in Unix seconds."""
+    length = presign_expiry() // 2
+    now = time.time() if now is None else now
+    return int(now // length * length)
+
+
+def presigned_url(name, storage=None, now=None):
+    """Return a presigned ``GetObject`` URL, reused for the rest of the signing period."""
+    return _presign(storage or default_storage, name, signing_period(now), presign_expiry())
+
+
+@lru_cache(maxsize=PRESIGNED_CACHE_SIZE)
+def _presign(storage, name, period, expiry):
+    return storage.connection.meta.client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': storage.bucket_name, 'Key': storage._normalize_name(clean_name(name))},
+        ExpiresIn=expiry,
+    )
+
+
+def response_stamps():
+    """
+    Return extra stamps for cached API responses (see ``reader.cache``).
+
+    Responses with presigned URLs must not outlive their signing period.
+    """
+    if strategy() != 'presigned':
+        return {}
+    return {'media_urls': signing_period() * 1_000_000_000}
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reader', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='pages_processed',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='pages_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='process_after',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Earliest time the next processing attempt may start', null=True),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='processing_error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='processing_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='done', editable=False, help_text='State of the uploaded archive in the processing queue', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['processing_status', 'process_after'], name='reader_chap_process_a5996a_idx'),
+        ),
+    ]
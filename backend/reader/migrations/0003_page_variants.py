@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reader', '0002_chapter_processing_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Downscaled copies of the image (name, width, height, mime_type), widest first'),
+        ),
+    ]
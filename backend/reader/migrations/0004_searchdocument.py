@@ -0,0 +1,144 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:59
+
+import unicodedata
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalize(text):
+    """Return ``text`` case-folded, with ``ё`` folded into ``е`` (as in ``reader.search``)."""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return text.replace('ё', 'е')
+
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE reader_searchdocument_fts USING fts5(
+        title, aliases, people, description,
+        content='reader_searchdocument', content_rowid='series_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER reader_searchdocument_ai AFTER INSERT ON reader_searchdocument BEGIN
+        INSERT INTO reader_searchdocument_fts(rowid, title, aliases, people, description)
+        VALUES (new.series_id, new.title, new.aliases, new.people, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER reader_searchdocument_ad AFTER DELETE ON reader_searchdocument BEGIN
+        INSERT INTO reader_searchdocument_fts(reader_searchdocument_fts, rowid, title, aliases, people, description)
+        VALUES ('delete', old.series_id, old.title, old.aliases, old.people, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER reader_searchdocument_au AFTER UPDATE ON reader_searchdocument BEGIN
+        INSERT INTO reader_searchdocument_fts(reader_searchdocument_fts, rowid, title, aliases, people, description)
+        VALUES ('delete', old.series_id, old.title, old.aliases, old.people, old.description);
+        INSERT INTO reader_searchdocument_fts(rowid, title, aliases, people, description)
+        VALUES (new.series_id, new.title, new.aliases, new.people, new.description);
+    END
+    """,
+]
+
+SQLITE_REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS reader_searchdocument_au',
+    'DROP TRIGGER IF EXISTS reader_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS reader_searchdocument_ai',
+    'DROP TABLE IF EXISTS reader_searchdocument_fts',
+]
+
+POSTGRESQL_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX reader_searchdocument_vector ON reader_searchdocument USING gin ((
+        setweight(to_tsvector('simple', title), 'A') ||
+        setweight(to_tsvector('simple', aliases), 'A') ||
+        setweight(to_tsvector('simple', people), 'B') ||
+        setweight(to_tsvector('simple', description), 'C')
+    ))
+    """,
+    """
+    CREATE INDEX reader_searchdocument_names_trgm ON reader_searchdocument
+    USING gin ((title || ' ' || aliases) gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_REVERSE_SQL = [
+    'DROP INDEX IF EXISTS reader_searchdocument_names_trgm',
+    'DROP INDEX IF EXISTS reader_searchdocument_vector',
+]
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def index_existing_series(apps, schema_editor):
+    """Create the search documents of the series that already exist."""
+    db = schema_editor.connection.alias
+    Alias = apps.get_model('reader', 'Alias')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    SearchDocument = apps.get_model('reader', 'SearchDocument')
+    Series = apps.get_model('reader', 'Series')
+
+    aliases = defaultdict(list)
+    content_types = ContentType.objects.using(db).filter(
+        app_label='reader', model__in=['series', 'author', 'artist']
+    )
+    for content_type in content_types:
+        names = Alias.objects.using(db).filter(content_type=content_type)
+        for object_id, name in names.values_list('object_id', 'name'):
+            aliases[content_type.model, object_id].append(name)
+
+    people = defaultdict(list)
+    for kind, field in (('author', 'authors'), ('artist', 'artists')):
+        through = getattr(Series, field).through
+        rows = through.objects.using(db).values_list('series_id', f'{kind}__id', f'{kind}__name')
+        for series_id, person_id, name in rows:
+            people[series_id].extend([name, *aliases[kind, person_id]])
+
+    documents = [
+        SearchDocument(
+            series_id=series.pk,
+            title=normalize(series.title),
+            aliases=normalize(' '.join(aliases['series', series.pk])),
+            people=normalize(' '.join(people[series.pk])),
+            description=normalize(series.description),
+        )
+        for series in Series.objects.using(db).only('title', 'description').iterator()
+    ]
+    SearchDocument.objects.using(db).bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reader', '0003_page_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('series', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='reader.series')),
+                ('title', models.TextField()),
+                ('aliases', models.TextField(blank=True, help_text='Alternative titles of the series')),
+                ('people', models.TextField(blank=True, help_text='Names and aliases of the authors and artists')),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        # Schema changes that rebuild reader_searchdocument on SQLite drop
+        # its triggers, and nothing recreates them: a migration making such a
+        # change must run the trigger statements of SQLITE_SQL again
+        migrations.RunPython(
+            run_vendor_sql({'sqlite': SQLITE_SQL, 'postgresql': POSTGRESQL_SQL}),
+            run_vendor_sql({'sqlite': SQLITE_REVERSE_SQL, 'postgresql': POSTGRESQL_REVERSE_SQL}),
+        ),
+        migrations.RunPython(index_existing_series, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+APPROVED = 'approved'
+
+
+def compute_existing_stats(apps, schema_editor):
+    """Create the stats of the series that already exist."""
+    Series = apps.get_model('reader', 'Series')
+    Chapter = apps.get_model('reader', 'Chapter')
+    Page = apps.get_model('reader', 'Page')
+    SeriesStats = apps.get_model('reader', 'SeriesStats')
+
+    approved = Chapter.objects.filter(series=OuterRef('pk'), approval_status=APPROVED).order_by()
+    pages = Page.objects.filter(
+        chapter__series=OuterRef('pk'), chapter__approval_status=APPROVED
+    ).order_by()
+
+    def total(queryset, group, expression):
+        return Coalesce(Subquery(
+            queryset.values(group).annotate(total=expression).values('total')
+        ), 0)
+
+    latest = approved.order_by('-published_at', '-pk')[:1]
+    rows = Series.objects.order_by('pk').annotate(
+        chapter_count=total(approved, 'series', Count('pk')),
+        page_count=total(pages, 'chapter__series', Count('pk')),
+        views=total(approved, 'series', Sum('views')),
+        latest_chapter_id=Subquery(latest.values('pk')),
+        chapters_updated_at=Coalesce(Subquery(latest.values('published_at')), F('created_at')),
+    ).values_list(
+        'pk', 'chapter_count', 'page_count', 'views', 'latest_chapter_id', 'chapters_updated_at'
+    )
+    SeriesStats.objects.bulk_create(
+        (
+            SeriesStats(
+                series_id=pk,
+                chapter_count=chapter_count,
+                page_count=page_count,
+                views=views,
+                latest_chapter_id=latest_chapter_id,
+                chapters_updated_at=chapters_updated_at,
+            )
+            for pk, chapter_count, page_count, views, latest_chapter_id, chapters_updated_at
+            in rows.iterator(chunk_size=500)
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reader', '0004_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeriesStats',
+            fields=[
+                ('series', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='reader.series')),
+                ('chapter_count', models.PositiveIntegerField(default=0)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('chapters_updated_at', models.DateTimeField(help_text='Publication date of the latest approved chapter, or creation date of series without any')),
+                ('latest_chapter', models.ForeignKey(blank=True, help_text='The most recently published approved chapter', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reader.chapter')),
+            ],
+            options={
+                'verbose_name_plural': 'Series stats',
+                'indexes': [models.Index(fields=['chapters_updated_at', 'series'], name='reader_seri_chapter_83820e_idx'), models.Index(fields=['views', 'series'], name='reader_seri_views_216e07_idx')],
+            },
+        ),
+        migrations.RunPython(compute_existing_stats, migrations.RunPython.noop),
+    ]
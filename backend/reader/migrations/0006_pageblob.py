@@ -0,0 +1,61 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:05
+
+import re
+from itertools import groupby
+
+from django.db import migrations, models
+
+# Pages ingested from archives are stored as ``<digest><ext>``
+DIGEST_RE = re.compile(r'^([0-9a-f]{32})\.')
+
+
+def create_existing_blobs(apps, schema_editor):
+    """Record the images of existing pages as blobs, counting their pages."""
+    Page = apps.get_model('reader', 'Page')
+    PageBlob = apps.get_model('reader', 'PageBlob')
+
+    rows = Page.objects.order_by('image').values_list(
+        'image', 'width', 'height', 'mime_type', 'variants'
+    ).iterator(chunk_size=2000)
+    batch, seen = [], set()
+    for name, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        match = DIGEST_RE.match(name.rsplit('/', 1)[-1])
+        # Copies of the same content stored under another name stay untracked
+        if match is None or match.group(1) in seen:
+            continue
+        seen.add(match.group(1))
+        _, width, height, mime_type, variants = group[0]
+        batch.append(PageBlob(
+            digest=match.group(1), name=name, width=width, height=height,
+            mime_type=mime_type, variants=variants, ref_count=len(group),
+        ))
+        if len(batch) >= 500:
+            PageBlob.objects.bulk_create(batch)
+            batch = []
+    PageBlob.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reader', '0005_seriesstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageBlob',
+            fields=[
+                ('digest', models.CharField(help_text='BLAKE2b (128-bit) hex digest of the image', max_length=32, primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text='Name of the image in the media storage', max_length=255, unique=True)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Image size in bytes')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('mime_type', models.CharField(max_length=50)),
+                ('variants', models.JSONField(blank=True, default=list, help_text='Downscaled copies of the image, as in Page.variants')),
+                ('ref_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_existing_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reader', '0006_pageblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='manifest',
+            field=models.CharField(blank=True, editable=False, help_text='Storage name of the current page manifest (see reader.manifests)', max_length=100),
+        ),
+    ]
@@ -2,29 +2,23 @@
 Database models for the MangaKG reader app.
 """
 
-import io
-import os
 from hashlib import blake2b
-from pathlib import Path
-from shutil import rmtree
-from zipfile import ZipFile, BadZipfile
+from zipfile import BadZipfile
 
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.timezone import now
 from django.conf import settings
 
-from PIL import Image
-
+from reader import blobs, cache
+from reader.ingestion import ChapterIngestor, retain_pages
 from reader.validators import validate_zip_file, validate_file_size
 
 
@@ -57,6 +51,14 @@ class ApprovalStatus(models.TextChoices):
     REJECTED = 'rejected', 'Rejected'
 
 
+class ProcessingStatus(models.TextChoices):
+    """The possible processing states of an uploaded chapter archive."""
+    QUEUED = 'queued', 'Queued'
+    PROCESSING = 'processing', 'Processing'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
 class AliasManager(models.Manager):
     """A Manager for aliases."""
 
@@ -160,9 +162,18 @@ class Category(models.Model):
 
 
 def series_cover_upload_path(instance, filename):
-    """Generate upload path for series cover images."""
+    """
+    Generate upload path for series cover images.
+
+    The name includes a hash of the image, so a replaced cover gets a new
+    name and its cached copies and thumbnails are never served for the new
+    one.
+    """
     ext = filename.split('.')[-1]
-    return f'series/{instance.slug}/cover.{ext}'
+    digest = blake2b(digest_size=16)
+    for chunk in instance.cover.chunks():
+        digest.update(chunk)
+    return f'series/{instance.slug}/cover-{digest.hexdigest()}.{ext}'
 
 
 class Series(models.Model):
@@ -302,6 +313,20 @@ class Chapter(models.Model):
         validators=[validate_zip_file, validate_file_size],
         help_text='Upload a ZIP file containing chapter pages (max 500MB)'
     )
+    processing_status = models.CharField(
+        max_length=10, choices=ProcessingStatus.choices,
+        default=ProcessingStatus.DONE, editable=False,
+        help_text='State of the uploaded archive in the processing queue'
+    )
+    processing_attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    processing_error = models.TextField(blank=True, editable=False)
+    process_after = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text='Earliest time the next processing attempt may start'
+    )
+    processing_started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    pages_total = models.PositiveIntegerField(default=0, editable=False)
+    pages_processed = models.PositiveIntegerField(default=0, editable=False)
     
     # Approval workflow
     approval_status = models.CharField(
@@ -319,6 +344,10 @@ class Chapter(models.Model):
         help_text='User who approved this chapter'
     )
     approved_at = models.DateTimeField(null=True, blank=True)
+    manifest = models.CharField(
+        max_length=100, blank=True, editable=False,
+        help_text='Storage name of the current page manifest (see reader.manifests)'
+    )
     
     # Metadata
     is_final = models.BooleanField(
@@ -355,14 +384,22 @@ class Chapter(models.Model):
             models.Index(fields=['series', 'approval_status']),
             models.Index(fields=['published_at', 'approval_status']),
             models.Index(fields=['uploaded_by', 'approval_status']),
+            models.Index(fields=['processing_status', 'process_after']),
         ]
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        process_async = getattr(settings, 'CHAPTER_PROCESSING_ASYNC', True)
+        
+        # Hand new uploads to the processing queue (see reader.jobs)
+        if self.file and is_new and process_async:
+            self.processing_status = ProcessingStatus.QUEUED
+            self.process_after = now()
+        
         super().save(*args, **kwargs)
         
         # Process uploaded file if it exists and this is a new chapter
-        if self.file and is_new:
+        if self.file and is_new and not process_async:
             try:
                 self.process_uploaded_file()
             except Exception:
@@ -373,8 +410,16 @@ class Chapter(models.Model):
                     self.save(update_fields=['file'])
                 raise
 
-    def process_uploaded_file(self):
-        """Process the uploaded ZIP file and extract pages."""
+    def process_uploaded_file(self, progress=None):
+        """
+        Process the uploaded ZIP file and extract pages.
+        
+        Args:
+            progress: Optional ``callable(done, total)`` reporting extracted pages
+        
+        The uploaded file is kept when processing fails, so the caller can
+        retry or clean it up.
+        """
         if not self.file:
             return
             
@@ -383,65 +428,39 @@ class Chapter(models.Model):
             vol_num = self.volume.number if self.volume else 0
             base_path = f'series/{self.series.slug}/vol{vol_num}/ch{self.number}'
             
-            # Delete existing pages first (they will be recreated)
-            self.pages.all().delete()
-            
-            # Extract and validate ZIP file
-            pages = []
-            
-            # Handle file access for both local and S3 storage
+            # Stream pages out of the archive, probing and uploading them
+            # concurrently
             self.file.seek(0)
-            # For S3 storage, we always work with the file object directly
-            file_obj = self.file
-            
-            with ZipFile(file_obj) as zf:
-                namelist = sorted(zf.namelist())
-                page_number = 1
-
-                for name in namelist:
-                    if zf.getinfo(name).is_dir():
-                        continue
-
-                    # Skip macOS metadata files
-                    filename = os.path.basename(name)
-                    if (name.startswith('__MACOSX/') or
-                        filename.startswith('._') or
-                        filename == '.DS_Store'):
-                        continue
-
-                    # Read and validate image
-                    data = zf.read(name)
-                    try:
-                        img = Image.open(io.BytesIO(data))
-                        img.verify()
-                    except Exception as e:
-                        raise ValidationError(f'Invalid image file: {name}') from e
-                    
-                    # Generate hash-based filename
-                    file_hash = blake2b(data, digest_size=16).hexdigest()
-                    ext = os.path.splitext(name)[-1]
-                    filename = f'{file_hash}{ext}'
-                    
-                    # Save file using Django's default storage
-                    relative_path = f'{base_path}/{filename}'
-                    
-                    # Use Django's default storage to save the file (works with both local and S3)
-                    saved_path = default_storage.save(relative_path, ContentFile(data))
-                    
-                    # Re-open image to get dimensions
-                    img = Image.open(io.BytesIO(data))
-                    pages.append(Page(
-                        chapter=self,
-                        number=page_number,
-                        image=saved_path,
-                        width=img.width,
-                        height=img.height,
-                        mime_type=img.get_format_mimetype() or 'image/jpeg'
-                    ))
-                    page_number += 1
+            ingested = ChapterIngestor(base_path, progress=progress).ingest_archive(self.file)
+            retain_pages(ingested)
+            pages = [
+                Page(
+                    chapter=self,
+                    number=page.number,
+                    image=page.name,
+                    width=page.width,
+                    height=page.height,
+                    mime_type=page.mime_type,
+                    variants=page.variants
+                )
+                for page in ingested
+            ]
             
-            # Create new pages (old ones were already deleted)
-            Page.objects.bulk_create(pages)
+            # The ingested pages already hold references to their images,
+            # which the new rows take over
+            try:
+                with transaction.atomic():
+                    self.pages.all().delete()
+                    Page.objects.bulk_create(pages)
+            except BaseException:
+                blobs.release(page.name for page in ingested)
+                raise
+            # bulk_create doesn't send post_save
+            cache.invalidate(cache.PAGES)
+            from reader.stats import refresh_series_stats
+            refresh_series_stats([self.series_id])
+            from reader.manifests import schedule_chapter_refresh
+            schedule_chapter_refresh(self.series_id, [self.pk])
             
             # Clean up uploaded file and clear the field
             self.file.delete(save=False)
@@ -451,9 +470,6 @@ class Chapter(models.Model):
         except BadZipfile:
             raise ValidationError('Invalid ZIP file format')
         except Exception as e:
-            # Clean up on error
-            if hasattr(self, 'file') and self.file:
-                self.file.delete(save=False)
             raise ValidationError(f'Error processing file: {str(e)}') from e
 
     def get_absolute_url(self):
@@ -485,6 +501,12 @@ class Page(models.Model):
     width = models.PositiveIntegerField(editable=False)
     height = models.PositiveIntegerField(editable=False)
     mime_type = models.CharField(max_length=50, editable=False)
+    variants = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        help_text='Downscaled copies of the image (name, width, height, mime_type), widest first'
+    )
     
     # Page positioning and layout
     position = models.CharField(
@@ -524,4 +546,88 @@ class Page(models.Model):
         })
 
     def __str__(self):
-        return f'{self.chapter} - Page {self.number}'
\ No newline at end of file
+        return f'{self.chapter} - Page {self.number}'
+
+
+class PageBlob(models.Model):
+    """
+    A stored page image, identified by the hash of its content.
+
+    Pages with the same content share one blob; ``reader.blobs`` keeps
+    ``ref_count`` equal to the number of pages using it and deletes the
+    files of blobs no page uses anymore.
+    """
+    digest = models.CharField(
+        max_length=32, primary_key=True,
+        help_text='BLAKE2b (128-bit) hex digest of the image'
+    )
+    name = models.CharField(
+        max_length=255, unique=True,
+        help_text='Name of the image in the media storage'
+    )
+    size = models.PositiveIntegerField(default=0, help_text='Image size in bytes')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    mime_type = models.CharField(max_length=50)
+    variants = models.JSONField(
+        default=list, blank=True,
+        help_text='Downscaled copies of the image, as in Page.variants'
+    )
+    ref_count = models.PositiveIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of a series, kept up to date by ``reader.signals``.
+
+    Text is normalized (see ``reader.search.normalize``) before it is stored,
+    and indexed by an FTS5 table on SQLite or by ``tsvector`` and trigram
+    GIN indexes on PostgreSQL.
+    """
+    series = models.OneToOneField(
+        Series, on_delete=models.CASCADE, primary_key=True, related_name='search_document'
+    )
+    title = models.TextField()
+    aliases = models.TextField(blank=True, help_text='Alternative titles of the series')
+    people = models.TextField(blank=True, help_text='Names and aliases of the authors and artists')
+    description = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.title
+
+
+class SeriesStats(models.Model):
+    """
+    Catalogue statistics of a series, counting approved chapters only.
+
+    Kept up to date by ``reader.stats``; rebuild with
+    ``manage.py rebuild_series_stats``.
+    """
+    series = models.OneToOneField(
+        Series, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    chapter_count = models.PositiveIntegerField(default=0)
+    page_count = models.PositiveIntegerField(default=0)
+    views = models.PositiveBigIntegerField(default=0)
+    latest_chapter = models.ForeignKey(
+        Chapter, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text='The most recently published approved chapter'
+    )
+    chapters_updated_at = models.DateTimeField(
+        help_text='Publication date of the latest approved chapter, '
+                  'or creation date of series without any'
+    )
+
+    class Meta:
+        verbose_name_plural = 'Series stats'
+        indexes = [
+            models.Index(fields=['chapters_updated_at', 'series']),
+            models.Index(fields=['views', 'series']),
+        ]
+
+    def __str__(self):
+        return f'Stats of {self.series_id}'
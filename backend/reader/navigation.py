@@ -0,0 +1,81 @@
+"""
+Previous/next navigation between chapters and pages.
+
+The approved chapters of a series are read once, in reading order, into a
+list kept in the cache. Its key includes the ``CHAPTERS`` stamp of
+``reader.cache``, so any committed change to chapters or volumes (see
+``reader.signals`` and the admin actions) starts a new list, and finding a
+chapter's neighbours costs one cache lookup however long the series is.
+Pages are numbered densely within a chapter, so their neighbours are found
+with queries on the ``(chapter, number)`` index instead.
+"""
+
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import F
+
+from reader.cache import CHAPTERS, get_stamps
+
+KEY_PREFIX = 'navigation:chapters:'
+TIMEOUT = 60 * 60 * 24
+
+ChapterLink = namedtuple('ChapterLink', ['id', 'title', 'number', 'volume_number'])
+
+
+def chapter_sequence(series_id, cached=True):
+    """
+    Return the approved chapters of a series in reading order.
+
+    Args:
+        cached: Use the cached list; code running as a change commits, before
+            the stamps are replaced, passes False to read the new one
+
+    Returns:
+        A ``(ids, links)`` pair of tuples: the chapter IDs, and a
+        ``ChapterLink`` for each of them
+    """
+    from reader.models import ApprovalStatus, Chapter
+
+    stamp = get_stamps([CHAPTERS])[CHAPTERS]
+    key = f'{KEY_PREFIX}{series_id}:{stamp}'
+    sequence = cache.get(key) if cached else None
+    if sequence is None:
+        rows = Chapter.objects.filter(
+            series_id=series_id, approval_status=ApprovalStatus.APPROVED
+        ).order_by(
+            F('volume__number').asc(nulls_last=True), 'number', 'pk'
+        ).values_list('id', 'title', 'number', 'volume__number')
+        links = tuple(ChapterLink(*row) for row in rows)
+        sequence = (tuple(link.id for link in links), links)
+        if cached:
+            cache.set(key, sequence, TIMEOUT)
+    return sequence
+
+
+def chapter_neighbours(chapter):
+    """
+    Return the chapters before and after ``chapter`` in its series.
+
+    Returns:
+        A ``(previous, next)`` pair of ``ChapterLink`` tuples; either is None
+        at the ends of the series, and both are None for unapproved chapters
+    """
+    ids, links = chapter_sequence(chapter.series_id)
+    try:
+        index = ids.index(chapter.pk)
+    except ValueError:
+        return None, None
+    previous = links[index - 1] if index > 0 else None
+    following = links[index + 1] if index + 1 < len(links) else None
+    return previous, following
+
+
+def page_neighbours(page):
+    """Return the pages before and after ``page`` in its chapter, or None."""
+    from reader.models import Page
+
+    pages = Page.objects.filter(chapter_id=page.chapter_id)
+    previous = pages.filter(number__lt=page.number).order_by('-number').first()
+    following = pages.filter(number__gt=page.number).order_by('number').first()
+    return previous, following
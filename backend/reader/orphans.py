@@ -0,0 +1,181 @@
+"""
+Garbage collection of page images and chapter manifests no longer
+referenced by the database.
+
+Pages left behind by failed or repeated chapter processing stay in storage
+forever unless something removes them. ``collect`` lists the objects under a
+prefix (see ``reader.inventory``), compares them against every file the
+database references (``Page.image`` and its variants, ``Series.cover``,
+``Chapter.manifest``, the ``PageBlob`` files still in use and the
+thumbnails of pages and covers) and deletes the rest in batches.
+
+The references are loaded into a set, or into a Bloom filter for very large
+catalogues: a false positive only keeps an orphan, never deletes a
+referenced image. Objects modified within the grace period are left alone,
+since their pages may still be being saved.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import timedelta
+from hashlib import blake2b
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from reader import blobs
+from reader.inventory import MAX_DELETE_BATCH, delete_objects, list_objects
+from reader.models import Chapter, Page, PageBlob, Series
+from reader.thumbnails import THUMBNAIL_PREFIX, allowed_widths, thumbnail_name
+
+
+class BloomFilter:
+    """
+    A fixed-size set of strings with no false negatives.
+
+    Args:
+        capacity: Expected number of items
+        error_rate: Acceptable false positive rate at that capacity
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+@dataclass
+class CollectionResult:
+    """What a collection found and deleted."""
+    scanned: int = 0
+    recent: int = 0
+    orphans: int = 0
+    orphan_bytes: int = 0
+    deleted: int = 0
+    failed: int = 0
+    stale_blobs: int = 0
+
+
+def stale_blobs(cutoff):
+    """Blobs without references recorded before ``cutoff``."""
+    return PageBlob.objects.filter(ref_count=0, created_at__lt=cutoff)
+
+
+def iter_references(cutoff, chunk_size=2000, thumbnails=False):
+    """
+    Yield the storage name of every file the database references.
+
+    Args:
+        thumbnails: Also yield the names the thumbnails of pages and covers
+            would have
+    """
+    widths = allowed_widths() if thumbnails else []
+    for name, variants in Page.objects.values_list('image', 'variants').iterator(chunk_size):
+        yield name
+        for variant in variants:
+            yield variant['name']
+        for width in widths:
+            yield thumbnail_name(name, width)
+    for name in Series.objects.exclude(cover='').exclude(cover__isnull=True).values_list(
+        'cover', flat=True
+    ).iterator(chunk_size):
+        yield name
+        for width in widths:
+            yield thumbnail_name(name, width)
+    yield from Chapter.objects.exclude(manifest='').values_list('manifest', flat=True).iterator(chunk_size)
+    # Unreferenced blobs inside the grace period may be about to get pages
+    recorded = PageBlob.objects.exclude(pk__in=stale_blobs(cutoff).values('pk'))
+    for name, variants in recorded.values_list('name', 'variants').iterator(chunk_size):
+        yield name
+        for variant in variants:
+            yield variant['name']
+
+
+def load_references(cutoff, bloom=False, error_rate=0.001, thumbnails=False):
+    """Return the referenced names as a set, or as a ``BloomFilter``."""
+    if not bloom:
+        return set(iter_references(cutoff, thumbnails=thumbnails))
+    # Room for the configured variants of every page and blob, and thumbnails
+    per_image = len(allowed_widths()) + 1 if thumbnails else 1
+    capacity = (
+        Page.objects.count() * (3 + per_image) + PageBlob.objects.count() * 4
+        + Series.objects.count() * per_image + Chapter.objects.count()
+    )
+    references = BloomFilter(capacity, error_rate)
+    for name in iter_references(cutoff, thumbnails=thumbnails):
+        references.add(name)
+    return references
+
+
+def collect(storage=None, prefix='series/', grace=timedelta(hours=24), dry_run=False,
+            concurrency=8, batch_size=MAX_DELETE_BATCH, bloom=False, on_orphan=None):
+    """
+    Delete the unreferenced objects under ``prefix``.
+
+    Args:
+        grace: Objects modified more recently than this are kept
+        dry_run: Only count the orphans
+        concurrency: Concurrent listing requests
+        batch_size: Objects deleted per request
+        bloom: Hold the references in a Bloom filter instead of a set
+        on_orphan: Optional ``callable(stored_object)`` invoked per orphan
+
+    Returns:
+        A ``CollectionResult``
+    """
+    storage = storage or default_storage
+    cutoff = timezone.now() - grace
+    result = CollectionResult()
+
+    stale = stale_blobs(cutoff)
+    if dry_run:
+        result.stale_blobs = stale.count()
+    else:
+        # Forget the blobs first, so ingestion stops reusing the files
+        # about to be deleted
+        result.stale_blobs = blobs.delete_rows(stale)
+    # Thumbnail names are only needed when thumbnails are listed
+    thumbnails = f'{THUMBNAIL_PREFIX}/'.startswith(prefix) or prefix.startswith(THUMBNAIL_PREFIX)
+    references = load_references(cutoff, bloom=bloom, thumbnails=thumbnails)
+
+    batch = []
+    for stored in list_objects(storage, prefix, concurrency=concurrency):
+        result.scanned += 1
+        if stored.name in references:
+            continue
+        if stored.modified >= cutoff:
+            result.recent += 1
+            continue
+        result.orphans += 1
+        result.orphan_bytes += stored.size
+        if on_orphan:
+            on_orphan(stored)
+        if dry_run:
+            continue
+        batch.append(stored.name)
+        if len(batch) >= batch_size:
+            _delete(storage, batch, batch_size, result)
+            batch = []
+    if batch:
+        _delete(storage, batch, batch_size, result)
+    return result
+
+
+def _delete(storage, names, batch_size, result):
+    failed = delete_objects(storage, names, batch_size=batch_size)
+    result.deleted += len(names) - len(failed)
+    result.failed += len(failed)
@@ -0,0 +1,60 @@
+"""
+Pagination classes for the MangaKG API.
+"""
+
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class HybridPagination(BasePagination):
+    """
+    Page-number pagination by default, keyset (cursor) pagination on request.
+
+    Page-number responses include ``count`` but cost a ``COUNT(*)`` and an
+    ``OFFSET`` that grows with the page number. Requests with
+    ``?pagination=cursor``, or following a ``next``/``previous`` link that
+    carries a ``cursor``, are paginated by the view's ordering instead, so
+    any page costs the same as the first. Cursor responses have no
+    ``count``.
+
+    The view's ordering should start with an indexed column and end with a
+    unique one, e.g. ``['-updated_at', '-id']``.
+    """
+    mode_query_param = 'pagination'
+
+    class Cursor(CursorPagination):
+        # Ordering comes from the view's OrderingFilter
+        ordering = '-pk'
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.cursor = self.Cursor()
+        self.active = self.page_number
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.cursor if self.use_cursor(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number.get_schema_operation_parameters(view),
+            *self.cursor.get_schema_operation_parameters(view),
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Set to 'cursor' for keyset pagination.",
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+        ]
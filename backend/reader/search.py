@@ -0,0 +1,169 @@
+"""
+Full-text search over series titles, aliases, authors, artists and descriptions.
+
+Each series has a ``SearchDocument`` holding its searchable text. The text
+is case-folded in Python before it is stored or queried, so Cyrillic and
+Kyrgyz letters (ө, ү, ң) match the same way on every database. Documents
+are indexed by:
+
+* SQLite: an external-content FTS5 table, ``reader_searchdocument_fts``,
+  kept in sync with the documents by triggers and ranked with ``bm25``.
+* PostgreSQL: a GIN index over a weighted ``simple`` ``tsvector``, ranked
+  with ``ts_rank_cd``, plus a trigram index over the titles and aliases so
+  misspelled titles still match.
+
+Both are created by migration ``0004_searchdocument``. Query terms are
+matched as prefixes and must all appear in a document.
+"""
+
+import re
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TOKEN_RE = re.compile(r'\w+')
+
+FTS_TABLE = 'reader_searchdocument_fts'
+# bm25 weights of the title, aliases, people and description columns
+FTS_WEIGHTS = (10.0, 8.0, 4.0, 1.0)
+
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', aliases), 'A') || "
+    "setweight(to_tsvector('simple', people), 'B') || "
+    "setweight(to_tsvector('simple', description), 'C')"
+)
+PG_NAMES = "(title || ' ' || aliases)"
+
+
+def normalize(text):
+    """Return ``text`` case-folded, with ``ё`` folded into ``е``."""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return text.replace('ё', 'е')
+
+
+def tokens(query):
+    """Split a search query into normalized terms."""
+    return TOKEN_RE.findall(normalize(query))
+
+
+def document_fields(series):
+    """Return the ``SearchDocument`` field values of ``series``."""
+    people = []
+    for person in (*series.authors.all(), *series.artists.all()):
+        people.append(person.name)
+        people.extend(alias.name for alias in person.aliases.all())
+    return {
+        'title': normalize(series.title),
+        'aliases': normalize(' '.join(alias.name for alias in series.aliases.all())),
+        'people': normalize(' '.join(people)),
+        'description': normalize(series.description),
+    }
+
+
+def index_series(series_ids):
+    """Create or refresh the search documents of the given series."""
+    from reader.models import SearchDocument, Series
+
+    series_ids = list(series_ids)
+    if not series_ids:
+        return
+    series_list = Series.objects.filter(pk__in=series_ids).prefetch_related(
+        'aliases', 'authors__aliases', 'artists__aliases'
+    )
+    documents = [SearchDocument(series=series, **document_fields(series)) for series in series_list]
+    with transaction.atomic():
+        # Replaced rather than updated, so the FTS triggers see plain
+        # deletes and inserts
+        SearchDocument.objects.filter(series_id__in=series_ids).delete()
+        SearchDocument.objects.bulk_create(documents)
+
+
+def rebuild(batch_size=500):
+    """
+    Rebuild every search document.
+
+    Documents are replaced a batch at a time, so search keeps working while
+    the rebuild runs.
+
+    Returns:
+        The number of series indexed
+    """
+    from reader.models import SearchDocument, Series
+
+    series_ids = list(Series.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(series_ids), batch_size):
+        index_series(series_ids[start:start + batch_size])
+    SearchDocument.objects.exclude(series_id__in=Series.objects.values('pk')).delete()
+
+    connection = connections[SearchDocument.objects.db]
+    if connection.vendor == 'sqlite':
+        # Merge the index segments left by the inserts
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return len(series_ids)
+
+
+def search(queryset, query):
+    """
+    Filter a ``Series`` queryset to the series matching ``query``.
+
+    Matches are annotated with ``search_rank``; higher ranks are better.
+    Queries without any terms leave the queryset unchanged.
+    """
+    terms = tokens(query)
+    if not terms:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, terms)
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, terms, ' '.join(terms))
+    return _search_fallback(queryset, terms)
+
+
+def _search_sqlite(queryset, terms):
+    # Terms are word characters only, so quoting them is enough to keep
+    # them from being read as FTS5 syntax
+    expression = ' '.join(f'"{term}"*' for term in terms)
+    series_id = f'"{queryset.model._meta.db_table}"."id"'
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+    # bm25() is lower for better matches
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {series_id}',
+        [expression], output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def _search_postgresql(queryset, terms, text):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    series_id = f'"{queryset.model._meta.db_table}"."id"'
+    matches = RawSQL(
+        f"SELECT series_id FROM reader_searchdocument "
+        f"WHERE ({PG_VECTOR}) @@ to_tsquery('simple', %s) OR {PG_NAMES} %% %s",
+        [tsquery, text],
+    )
+    rank = RawSQL(
+        f"SELECT ts_rank_cd({PG_VECTOR}, to_tsquery('simple', %s)) + similarity({PG_NAMES}, %s) "
+        f"FROM reader_searchdocument WHERE series_id = {series_id}",
+        [tsquery, text], output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def _search_fallback(queryset, terms):
+    from reader.models import SearchDocument
+
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(aliases__icontains=term)
+            | Q(people__icontains=term) | Q(description__icontains=term)
+        )
+    matches = SearchDocument.objects.filter(condition).values('series_id')
+    return queryset.filter(pk__in=matches).annotate(search_rank=Value(0.0, output_field=FloatField()))
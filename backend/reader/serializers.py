@@ -3,7 +3,11 @@ Django REST Framework serializers for the MangaKG reader app.
 """
 
 from rest_framework import serializers
-from .models import Series, Chapter, Page, Volume, Author, Artist, Category, Alias
+from .manifests import manifest_url
+from .media_urls import media_url
+from .models import Series, Chapter, Page, Volume, Author, Artist, Category, Alias, ApprovalStatus
+from .navigation import chapter_neighbours
+from .thumbnails import thumbnail_url
 
 
 class AliasSerializer(serializers.ModelSerializer):
@@ -50,38 +54,66 @@ class VolumeSerializer(serializers.ModelSerializer):
 class PageSerializer(serializers.ModelSerializer):
     """Serializer for Page model."""
     image_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Page
         fields = [
             'id', 'number', 'image_url', 'width', 'height', 
-            'position', 'is_spread'
+            'position', 'is_spread', 'variants', 'srcset'
         ]
     
+    def get_media_url(self, name):
+        """Get the full URL of a stored file, following ``MEDIA_URL_STRATEGY``."""
+        return media_url(name, self.context.get('request'))
+    
     def get_image_url(self, obj):
         """Get the full URL for the page image."""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                # Use Django media serving endpoint instead of direct S3 URLs
-                from django.urls import reverse
-                media_url = reverse('reader:serve-media', kwargs={'file_path': obj.image.name})
-                return request.build_absolute_uri(media_url)
-            return f'/media/{obj.image.name}'
+            return self.get_media_url(obj.image.name)
         return None
+    
+    def get_variants(self, obj):
+        """Get the downscaled copies of the page image, widest first."""
+        return [
+            {
+                'url': self.get_media_url(variant['name']),
+                'width': variant['width'],
+                'height': variant['height'],
+                'mime_type': variant['mime_type'],
+            }
+            for variant in obj.variants
+        ]
+    
+    def get_srcset(self, obj):
+        """Get an HTML ``srcset`` of the variants and the original image."""
+        if not obj.image:
+            return ''
+        candidates = [
+            f"{self.get_media_url(variant['name'])} {variant['width']}w"
+            for variant in reversed(obj.variants)
+        ]
+        candidates.append(f'{self.get_media_url(obj.image.name)} {obj.width}w')
+        return ', '.join(candidates)
 
 
 class ChapterListSerializer(serializers.ModelSerializer):
     """Simplified serializer for chapter lists."""
     volume_number = serializers.IntegerField(source='volume.number', read_only=True)
     page_count = serializers.IntegerField(source='pages.count', read_only=True)
+    manifest_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Chapter
         fields = [
             'id', 'title', 'number', 'volume_number', 'page_count',
-            'published_at', 'views', 'approval_status'
+            'published_at', 'views', 'approval_status', 'manifest_url'
         ]
+    
+    def get_manifest_url(self, obj):
+        """Get the URL of the chapter's page manifest."""
+        return manifest_url(obj, self.context.get('request'))
 
 
 class ChapterDetailSerializer(serializers.ModelSerializer):
@@ -90,13 +122,38 @@ class ChapterDetailSerializer(serializers.ModelSerializer):
     pages = PageSerializer(many=True, read_only=True)
     series_title = serializers.CharField(source='series.title', read_only=True)
     series_slug = serializers.CharField(source='series.slug', read_only=True)
+    prev_chapter = serializers.SerializerMethodField()
+    next_chapter = serializers.SerializerMethodField()
+    manifest_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Chapter
         fields = [
             'id', 'title', 'number', 'volume', 'series_title', 'series_slug',
-            'pages', 'published_at', 'views', 'approval_status', 'is_final'
+            'pages', 'published_at', 'views', 'approval_status', 'is_final',
+            'prev_chapter', 'next_chapter', 'manifest_url'
         ]
+    
+    def get_manifest_url(self, obj):
+        """Get the URL of the chapter's page manifest."""
+        return manifest_url(obj, self.context.get('request'))
+    
+    def get_neighbours(self, obj):
+        """Get the previous and next chapters, looked up once per chapter."""
+        if getattr(self, '_neighbours_of', None) != obj.pk:
+            self._neighbours = chapter_neighbours(obj)
+            self._neighbours_of = obj.pk
+        return self._neighbours
+    
+    def get_prev_chapter(self, obj):
+        """Get the previous approved chapter of the series."""
+        link = self.get_neighbours(obj)[0]
+        return link._asdict() if link else None
+    
+    def get_next_chapter(self, obj):
+        """Get the next approved chapter of the series."""
+        link = self.get_neighbours(obj)[1]
+        return link._asdict() if link else None
 
 
 class SeriesListSerializer(serializers.ModelSerializer):
@@ -105,32 +162,62 @@ class SeriesListSerializer(serializers.ModelSerializer):
     artists = ArtistSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
     cover_url = serializers.SerializerMethodField()
-    chapter_count = serializers.IntegerField(source='chapters.count', read_only=True)
+    cover_thumbnail_url = serializers.SerializerMethodField()
+    chapter_count = serializers.SerializerMethodField()
+    page_count = serializers.SerializerMethodField()
+    views = serializers.SerializerMethodField()
     latest_chapter = serializers.SerializerMethodField()
     
     class Meta:
         model = Series
         fields = [
-            'id', 'title', 'slug', 'description', 'cover_url', 'status', 'kind', 
+            'id', 'title', 'slug', 'description', 'cover_url', 'cover_thumbnail_url', 'status', 'kind', 
             'rating', 'licensed', 'authors', 'artists', 'categories',
-            'chapter_count', 'latest_chapter', 'updated_at'
+            'chapter_count', 'page_count', 'views', 'latest_chapter', 'updated_at'
         ]
     
     def get_cover_url(self, obj):
         """Get the full URL for the series cover."""
         if obj.cover:
-            request = self.context.get('request')
-            if request:
-                # Use Django media serving endpoint instead of direct S3 URLs
-                from django.urls import reverse
-                media_url = reverse('reader:serve-media', kwargs={'file_path': obj.cover.name})
-                return request.build_absolute_uri(media_url)
-            return f'/media/{obj.cover.name}'
+            return media_url(obj.cover.name, self.context.get('request'))
+        return None
+    
+    def get_cover_thumbnail_url(self, obj):
+        """Get the URL of a list-sized thumbnail of the series cover."""
+        if obj.cover:
+            return thumbnail_url(obj.cover.name, 320, self.context.get('request'))
         return None
     
+    def get_stats(self, obj):
+        """Get the series stats, or None if they have not been computed."""
+        return getattr(obj, 'stats', None)
+    
+    def get_chapter_count(self, obj):
+        """Get the number of approved chapters."""
+        stats = self.get_stats(obj)
+        if stats:
+            return stats.chapter_count
+        return obj.chapters.filter(approval_status=ApprovalStatus.APPROVED).count()
+    
+    def get_page_count(self, obj):
+        """Get the number of pages in approved chapters."""
+        stats = self.get_stats(obj)
+        return stats.page_count if stats else 0
+    
+    def get_views(self, obj):
+        """Get the total views of approved chapters."""
+        stats = self.get_stats(obj)
+        return stats.views if stats else 0
+    
     def get_latest_chapter(self, obj):
         """Get the latest approved chapter."""
-        latest = obj.chapters.filter(approval_status='approved').order_by('-published_at').first()
+        stats = self.get_stats(obj)
+        if stats:
+            latest = stats.latest_chapter
+        else:
+            latest = obj.chapters.filter(
+                approval_status=ApprovalStatus.APPROVED
+            ).select_related('volume').order_by('-published_at', '-pk').first()
         if latest:
             return {
                 'id': latest.id,
@@ -163,11 +250,5 @@ class SeriesDetailSerializer(serializers.ModelSerializer):
     def get_cover_url(self, obj):
         """Get the full URL for the series cover."""
         if obj.cover:
-            request = self.context.get('request')
-            if request:
-                # Use Django media serving endpoint instead of direct S3 URLs
-                from django.urls import reverse
-                media_url = reverse('reader:serve-media', kwargs={'file_path': obj.cover.name})
-                return request.build_absolute_uri(media_url)
-            return f'/media/{obj.cover.name}'
+            return media_url(obj.cover.name, self.context.get('request'))
         return None
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Signal handlers keeping the API response cache, the search index, the
+typeahead index, the series stats, the chapter manifests and the page blob
+references in sync with the catalogue.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from reader import blobs, cache, manifests, search, stats, suggest
+from reader.models import Alias, ApprovalStatus, Artist, Author, Category, Chapter, Page, Series, Volume
+
+# Cache namespaces whose responses include each model's data
+MODEL_NAMESPACES = {
+    Series: (cache.SERIES,),
+    Volume: (cache.CHAPTERS,),
+    Chapter: (cache.CHAPTERS,),
+    Page: (cache.PAGES,),
+    Author: (cache.PEOPLE,),
+    Artist: (cache.PEOPLE,),
+    Category: (cache.CATEGORIES,),
+}
+
+
+def namespaces_for(instance):
+    """Return the cache namespaces affected by a change to ``instance``."""
+    if isinstance(instance, Alias):
+        # Aliases belong to a series, an author or an artist
+        return MODEL_NAMESPACES.get(instance.content_type.model_class(), ())
+    return MODEL_NAMESPACES.get(type(instance), ())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_model_cache(sender, instance, **kwargs):
+    """Invalidate cached responses built from a saved or deleted object."""
+    if kwargs.get('raw'):
+        return
+    namespaces = namespaces_for(instance)
+    if namespaces:
+        cache.invalidate(*namespaces)
+
+
+@receiver(m2m_changed, sender=Series.authors.through)
+@receiver(m2m_changed, sender=Series.artists.through)
+@receiver(m2m_changed, sender=Series.categories.through)
+def invalidate_series_relations_cache(sender, action, **kwargs):
+    """Invalidate cached series when their authors, artists or categories change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache.invalidate(cache.SERIES)
+
+
+def series_ids_for_alias(alias):
+    """Return the IDs of the series whose search documents include ``alias``."""
+    model = alias.content_type.model_class()
+    if model is Series:
+        return [alias.object_id]
+    if model in (Author, Artist):
+        return Series.objects.filter(
+            **{f'{model._meta.model_name}s': alias.object_id}
+        ).values_list('pk', flat=True)
+    return []
+
+
+@receiver(post_save, sender=Series)
+def index_saved_series(sender, instance, raw=False, **kwargs):
+    """Refresh the search document of a saved series."""
+    if not raw:
+        search.index_series([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Artist)
+def index_person_series(sender, instance, raw=False, **kwargs):
+    """Refresh the search documents of a renamed author's or artist's series."""
+    if not raw:
+        search.index_series(instance.series.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Artist)
+def remember_person_series(sender, instance, **kwargs):
+    # The relations are gone by the time post_delete is sent
+    instance._search_series_ids = list(instance.series.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Artist)
+def index_deleted_person_series(sender, instance, **kwargs):
+    """Drop a deleted author or artist from their series' search documents."""
+    search.index_series(getattr(instance, '_search_series_ids', []))
+
+
+@receiver(post_save, sender=Alias)
+def index_saved_alias_series(sender, instance, raw=False, **kwargs):
+    """Refresh the search documents that include a saved alias."""
+    if not raw:
+        search.index_series(series_ids_for_alias(instance))
+
+
+@receiver(post_delete, sender=Alias)
+def index_deleted_alias_series(sender, instance, origin=None, **kwargs):
+    """Refresh the search documents that included a deleted alias."""
+    # Aliases deleted along with their series, author or artist are handled
+    # by the cascade and the person handlers above
+    if getattr(origin, 'model', type(origin)) is Alias:
+        search.index_series(series_ids_for_alias(instance))
+
+
+@receiver(m2m_changed, sender=Series.authors.through)
+@receiver(m2m_changed, sender=Series.artists.through)
+def index_series_people(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh search documents when series' authors or artists change."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_series([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_series_ids = list(instance.series.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_series(getattr(instance, '_search_series_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        search.index_series(pk_set)
+
+
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+def refresh_series_suggestions(sender, instance, raw=False, **kwargs):
+    """Update the typeahead index for a saved or deleted series."""
+    if not raw:
+        suggest.refresh_series([instance.pk])
+
+
+@receiver(post_save, sender=Alias)
+@receiver(post_delete, sender=Alias)
+def refresh_alias_suggestions(sender, instance, raw=False, origin=None, **kwargs):
+    """Update the typeahead index for a saved or deleted series alias."""
+    if raw or instance.content_type.model_class() is not Series:
+        return
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Alias:
+        # Deleted along with its series
+        return
+    suggest.refresh_series([instance.object_id])
+
+
+def deleted_with(origin, *models):
+    """Return whether a deletion started at ``origin`` is a cascade from one of ``models``."""
+    return getattr(origin, 'model', type(origin)) in models
+
+
+@receiver(post_save, sender=Series)
+def create_series_stats(sender, instance, created, raw=False, **kwargs):
+    """Create the stats of a new series."""
+    if created and not raw:
+        stats.refresh_series_stats([instance.pk])
+
+
+@receiver(post_save, sender=Chapter)
+def refresh_chapter_series_stats(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Refresh the stats of a saved chapter's series."""
+    if raw or (update_fields and not stats.CHAPTER_FIELDS.intersection(update_fields)):
+        return
+    stats.refresh_series_stats([instance.series_id])
+
+
+@receiver(post_delete, sender=Chapter)
+def refresh_deleted_chapter_series_stats(sender, instance, origin=None, **kwargs):
+    """Refresh the stats of a deleted chapter's series, unless it was deleted too."""
+    if not deleted_with(origin, Series):
+        stats.refresh_series_stats([instance.series_id])
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def refresh_page_series_stats(sender, instance, raw=False, origin=None, **kwargs):
+    """Refresh the page count of a page's series."""
+    # Pages deleted with their chapter are counted by the chapter handler
+    if raw or deleted_with(origin, Chapter, Volume, Series):
+        return
+    series_ids = Chapter.objects.filter(pk=instance.chapter_id).values_list('series_id', flat=True)
+    stats.refresh_series_stats(series_ids)
+
+
+def _affects_manifests(raw, update_fields):
+    return not raw and not (update_fields and not manifests.CHAPTER_FIELDS.intersection(update_fields))
+
+
+@receiver(pre_save, sender=Chapter)
+def refresh_previous_neighbour_manifests(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Refresh the manifests next to a chapter's current place before it is saved."""
+    if instance.pk is not None and _affects_manifests(raw, update_fields):
+        manifests.schedule_neighbour_refresh(instance)
+
+
+@receiver(post_save, sender=Chapter)
+def refresh_chapter_manifests(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Refresh the manifests of a saved chapter and its new neighbours."""
+    # Also restores the manifest name a save from a stale instance overwrote
+    if _affects_manifests(raw, update_fields):
+        manifests.schedule_chapter_refresh(instance.series_id, [instance.pk])
+
+
+@receiver(pre_delete, sender=Chapter)
+def refresh_deleted_chapter_manifests(sender, instance, origin=None, **kwargs):
+    """Refresh the manifests linking to a chapter about to be deleted, unless its series is deleted too."""
+    if deleted_with(origin, Volume):
+        # The whole volume goes, so it's one refresh instead of one per chapter
+        manifests.schedule_refresh([instance.series_id])
+    elif not deleted_with(origin, Series):
+        manifests.schedule_neighbour_refresh(instance)
+
+
+@receiver(post_save, sender=Volume)
+def refresh_volume_manifests(sender, instance, raw=False, **kwargs):
+    """Refresh the manifests of a saved volume's series, which show volume numbers."""
+    if not raw:
+        manifests.schedule_refresh([instance.series_id])
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def refresh_page_manifests(sender, instance, raw=False, origin=None, **kwargs):
+    """Refresh the manifests of a page's chapter and its neighbours when the chapter is approved."""
+    # Pages deleted with their chapter are handled by the chapter handler
+    if raw or deleted_with(origin, Chapter, Volume, Series):
+        return
+    for series_id in Chapter.objects.filter(
+        pk=instance.chapter_id, approval_status=ApprovalStatus.APPROVED
+    ).values_list('series_id', flat=True):
+        manifests.schedule_chapter_refresh(series_id, [instance.chapter_id])
+
+
+@receiver(pre_delete, sender=Chapter)
+def release_chapter_blobs(sender, instance, **kwargs):
+    """Release the page images of a chapter about to be deleted, in one go."""
+    blobs.release(Page.objects.filter(chapter=instance).values_list('image', flat=True))
+
+
+@receiver(post_delete, sender=Page)
+def release_page_blob(sender, instance, origin=None, **kwargs):
+    """Release the image of a deleted page."""
+    # Pages deleted with their chapter are released by the chapter handler
+    if not deleted_with(origin, Chapter, Volume, Series):
+        blobs.release([instance.image.name])
@@ -0,0 +1,125 @@
+"""
+Denormalized catalogue statistics of series.
+
+``SeriesStats`` holds each series' approved chapter count, page count, total
+views and latest chapter, so catalogue listings read them with a join and can
+be ordered by them through an index. ``reader.signals`` refreshes the stats
+of a series when one of its chapters is saved or deleted and when pages are
+added or removed one at a time; code that changes chapters or pages in bulk
+(admin actions, archive processing) calls ``refresh_series_stats`` itself.
+Views are added incrementally by ``reader.tracking``.
+"""
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from reader.models import ApprovalStatus
+
+# Chapter fields the stats depend on; saves of other fields skip the refresh
+CHAPTER_FIELDS = frozenset({'series', 'approval_status', 'published_at', 'views'})
+
+
+def compute_stats(series_ids, apps=global_apps):
+    """
+    Return unsaved ``SeriesStats`` of the given series, computed in one query.
+
+    Pass the ``apps`` of a migration to compute them with historical models.
+    """
+    Series = apps.get_model('reader', 'Series')
+    Chapter = apps.get_model('reader', 'Chapter')
+    Page = apps.get_model('reader', 'Page')
+    SeriesStats = apps.get_model('reader', 'SeriesStats')
+
+    approved = Chapter.objects.filter(
+        series=OuterRef('pk'), approval_status=ApprovalStatus.APPROVED
+    ).order_by()
+    pages = Page.objects.filter(
+        chapter__series=OuterRef('pk'), chapter__approval_status=ApprovalStatus.APPROVED
+    ).order_by()
+
+    def total(queryset, group, expression):
+        return Coalesce(Subquery(
+            queryset.values(group).annotate(total=expression).values('total')
+        ), 0)
+
+    latest = approved.order_by('-published_at', '-pk')[:1]
+    rows = Series.objects.filter(pk__in=list(series_ids)).order_by().annotate(
+        chapter_count=total(approved, 'series', Count('pk')),
+        page_count=total(pages, 'chapter__series', Count('pk')),
+        views=total(approved, 'series', Sum('views')),
+        latest_chapter_id=Subquery(latest.values('pk')),
+        chapters_updated_at=Coalesce(Subquery(latest.values('published_at')), F('created_at')),
+    ).values_list(
+        'pk', 'chapter_count', 'page_count', 'views', 'latest_chapter_id', 'chapters_updated_at'
+    )
+    return [
+        SeriesStats(
+            series_id=pk,
+            chapter_count=chapter_count,
+            page_count=page_count,
+            views=views,
+            latest_chapter_id=latest_chapter_id,
+            chapters_updated_at=chapters_updated_at,
+        )
+        for pk, chapter_count, page_count, views, latest_chapter_id, chapters_updated_at in rows
+    ]
+
+
+def refresh_series_stats(series_ids, apps=global_apps):
+    """Recompute the stats of the given series."""
+    SeriesStats = apps.get_model('reader', 'SeriesStats')
+
+    series_ids = set(series_ids)
+    if not series_ids:
+        return
+    with transaction.atomic():
+        # Views written meanwhile (see reader.tracking.write_views) wait for
+        # the locks, so they are added to the recomputed counts, not lost
+        list(SeriesStats.objects.select_for_update().filter(
+            series_id__in=series_ids
+        ).order_by('pk').values_list('pk', flat=True))
+        # An upsert, so concurrent refreshes of a new series don't collide
+        SeriesStats.objects.bulk_create(
+            compute_stats(series_ids, apps=apps),
+            update_conflicts=True,
+            unique_fields=['series'],
+            update_fields=[
+                'chapter_count', 'page_count', 'views', 'latest_chapter', 'chapters_updated_at'
+            ],
+        )
+
+
+def add_views(counts):
+    """Add ``{chapter ID: views}`` of approved chapters to their series' stats."""
+    from reader.models import Chapter, SeriesStats
+
+    series_views = {}
+    chapters = Chapter.objects.filter(
+        pk__in=list(counts), approval_status=ApprovalStatus.APPROVED
+    ).values_list('pk', 'series_id')
+    for chapter_id, series_id in chapters:
+        series_views[series_id] = series_views.get(series_id, 0) + counts[chapter_id]
+    if not series_views:
+        return
+    increment = Case(
+        *(When(pk=series_id, then=Value(count)) for series_id, count in series_views.items()),
+        default=Value(0),
+    )
+    SeriesStats.objects.filter(pk__in=list(series_views)).update(views=F('views') + increment)
+
+
+def rebuild(batch_size=500):
+    """
+    Recompute the stats of every series.
+
+    Returns:
+        The number of series
+    """
+    from reader.models import Series
+
+    series_ids = list(Series.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(series_ids), batch_size):
+        refresh_series_stats(series_ids[start:start + batch_size])
+    return len(series_ids)
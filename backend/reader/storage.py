@@ -4,18 +4,42 @@ Custom storage backends for the MangaKG reader app.
 
 import logging
 import os
-from botocore.exceptions import ClientError, NoCredentialsError
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.utils.functional import cached_property
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from reader.media_cache import DiskCache
 
 logger = logging.getLogger(__name__)
 
+# The most keys S3 accepts in one DeleteObjects request
+MAX_DELETE_BATCH = 1000
+
+# DeleteObjects per-key error codes worth retrying
+RETRYABLE_DELETE_ERRORS = {'InternalError', 'ServiceUnavailable', 'SlowDown', 'RequestTimeout'}
+
 
 class TigrisMediaStorage(S3Boto3Storage):
     """
     Custom storage backend for Fly.io Tigris S3-compatible storage.
     Used for manga pages and cover images.
+    
+    Besides the single-file storage API, ``save_many``, ``exists_many`` and
+    ``delete_many`` work on many objects at once through one shared client,
+    whose connection pool, keep-alive and retries are set by the
+    ``AWS_S3_MAX_POOL_CONNECTIONS``, ``AWS_S3_TCP_KEEPALIVE``,
+    ``AWS_S3_MAX_ATTEMPTS`` and ``AWS_S3_RETRY_MODE`` settings. Objects
+    larger than ``AWS_S3_MULTIPART_THRESHOLD`` are uploaded in parts.
     """
     # Set defaults to avoid import-time errors
     bucket_name = None
@@ -47,6 +71,218 @@ class TigrisMediaStorage(S3Boto3Storage):
         # Set access credentials
         self.access_key = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
         self.secret_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
+        
+        # Size the connection pool for the batch operations and retry with
+        # exponential backoff and jitter; AWS_S3_CLIENT_CONFIG takes precedence
+        self.batch_concurrency = max(1, getattr(settings, 'AWS_S3_BATCH_CONCURRENCY', 16))
+        self.max_attempts = max(1, getattr(settings, 'AWS_S3_MAX_ATTEMPTS', 5))
+        self.client_config = Config(
+            max_pool_connections=max(
+                getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 50), self.batch_concurrency
+            ),
+            tcp_keepalive=getattr(settings, 'AWS_S3_TCP_KEEPALIVE', True),
+            retries={
+                'mode': getattr(settings, 'AWS_S3_RETRY_MODE', 'standard'),
+                'max_attempts': self.max_attempts,
+            },
+        ).merge(self.client_config)
+        if getattr(settings, 'AWS_S3_TRANSFER_CONFIG', None) is None:
+            self.transfer_config = TransferConfig(
+                multipart_threshold=getattr(settings, 'AWS_S3_MULTIPART_THRESHOLD', 16 * 1024 ** 2),
+                multipart_chunksize=getattr(settings, 'AWS_S3_MULTIPART_CHUNKSIZE', 8 * 1024 ** 2),
+                use_threads=self.use_threads,
+            )
+    
+    @cached_property
+    def shared_client(self):
+        """
+        The S3 client used by the batch operations.
+        
+        ``connection`` creates a session and client per thread; boto3 clients
+        are thread-safe, so the batch operations share this one and its
+        connection pool instead.
+        """
+        return self.connection.meta.client
+    
+    def save_many(self, items, overwrite=False):
+        """
+        Save many files concurrently.
+        
+        Args:
+            items: ``(name, content)`` pairs, ``content`` being a ``File``
+            overwrite: Write to the given names even if objects exist there,
+                skipping the existence check of every name. Only safe for
+                content-addressed names.
+        
+        Returns:
+            The names the files were saved as, in order
+        """
+        items = list(items)
+        if not items:
+            return []
+        client = self.shared_client
+        
+        def save(item):
+            name, content = item
+            name = clean_name(name) if overwrite else self.get_available_name(name)
+            self._put(client, name, content)
+            return name
+        
+        try:
+            with ThreadPoolExecutor(
+                min(self.batch_concurrency, len(items)), thread_name_prefix='s3-save'
+            ) as pool:
+                return list(pool.map(save, items))
+        except (ClientError, NoCredentialsError) as e:
+            logger.error(f"Failed to save {len(items)} files to Tigris storage: {e}")
+            raise ImproperlyConfigured(
+                "Tigris storage is not properly configured or unavailable. "
+                "Please check your AWS credentials and endpoint settings."
+            ) from e
+    
+    def _put(self, client, name, content):
+        key = self._normalize_name(clean_name(name))
+        params = self._get_write_parameters(key, content)
+        content.seek(0)
+        if content.size >= self.transfer_config.multipart_threshold:
+            client.upload_fileobj(
+                content, self.bucket_name, key, ExtraArgs=params, Config=self.transfer_config
+            )
+        else:
+            client.put_object(Bucket=self.bucket_name, Key=key, Body=content.read(), **params)
+    
+    def exists_many(self, names):
+        """
+        Return the subset of ``names`` that exist, checked concurrently.
+        
+        Unlike ``exists``, errors other than a missing object are raised.
+        """
+        names = list(names)
+        if not names:
+            return set()
+        client = self.shared_client
+        
+        def exists(name):
+            try:
+                client.head_object(
+                    Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name))
+                )
+            except ClientError as e:
+                if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 404:
+                    return False
+                raise
+            return True
+        
+        with ThreadPoolExecutor(
+            min(self.batch_concurrency, len(names)), thread_name_prefix='s3-head'
+        ) as pool:
+            return {name for name, found in zip(names, pool.map(exists, names)) if found}
+    
+    def delete_many(self, names, batch_size=MAX_DELETE_BATCH):
+        """
+        Delete many objects with ``DeleteObjects`` requests.
+        
+        Keys failing with a transient error are retried with exponential
+        backoff and jitter, up to ``AWS_S3_MAX_ATTEMPTS`` times.
+        
+        Returns:
+            The names that could not be deleted
+        """
+        batch_size = max(1, min(batch_size, MAX_DELETE_BATCH))
+        keys = {self._normalize_name(clean_name(name)): name for name in names}
+        pending = list(keys)
+        failed = []
+        client = self.shared_client
+        
+        for attempt in range(self.max_attempts):
+            retry = []
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                try:
+                    response = client.delete_objects(Bucket=self.bucket_name, Delete={
+                        'Objects': [{'Key': key} for key in batch],
+                        'Quiet': True,
+                    })
+                except (ClientError, BotoCoreError) as e:
+                    # The client already retried the request itself
+                    logger.error(f"Failed to delete {len(batch)} files from Tigris storage: {e}")
+                    failed.extend(keys[key] for key in batch)
+                    continue
+                for error in response.get('Errors', []):
+                    if error.get('Code') in RETRYABLE_DELETE_ERRORS:
+                        retry.append(error['Key'])
+                    else:
+                        logger.error(f"Failed to delete {error['Key']}: {error.get('Message')}")
+                        failed.append(keys.get(error['Key'], error['Key']))
+            if not retry:
+                break
+            pending = retry
+            if attempt + 1 < self.max_attempts:
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+        else:
+            failed.extend(keys[key] for key in pending)
+        return failed
+    
+    @cached_property
+    def media_cache(self):
+        """The local read-through cache, or None if ``MEDIA_CACHE_DIR`` is unset."""
+        return DiskCache.from_settings()
+    
+    def open_cached(self, name, fill=True):
+        """
+        Open a file through the local media cache, downloading it on a miss.
+        
+        Args:
+            fill: Download the object on a miss; when False a miss returns None
+        
+        Returns:
+            A ``(file, hit)`` pair, or None if the cache is disabled, the
+            object is too large to cache or its name is not content-addressed
+            (see ``DiskCache.accepts``)
+        
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        if self.media_cache is None or not self.media_cache.accepts(name):
+            return None
+        
+        fileobj = self.media_cache.open(name)
+        if fileobj is not None:
+            return fileobj, True
+        if not fill:
+            return None
+        
+        try:
+            obj = self.connection.meta.client.get_object(
+                Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name))
+            )
+        except ClientError as e:
+            if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 404:
+                raise FileNotFoundError(name) from e
+            raise
+        
+        body = obj['Body']
+        try:
+            if obj['ContentLength'] > self.media_cache.max_object_size:
+                self.media_cache.record('bypasses')
+                return None
+            return self.media_cache.store(name, body.iter_chunks(64 * 1024)), False
+        finally:
+            body.close()
+    
+    def _open(self, name, mode='rb'):
+        """
+        Open files for reading through the local media cache when enabled.
+        """
+        if self.media_cache is not None and mode == 'rb':
+            try:
+                cached = self.open_cached(name)
+            except (BotoCoreError, ClientError) as e:
+                logger.error(f"Failed to cache file {name} from Tigris storage: {e}")
+                cached = None
+            if cached is not None:
+                return File(cached[0], name)
+        return super()._open(name, mode)
     
     def _save(self, name, content):
         """
@@ -0,0 +1,357 @@
+"""
+In-process typeahead index over series titles and aliases.
+
+Titles and aliases are transliterated to a common Latin form (so "Ашуу",
+"ashuu" and "Āshuu" are the same key) and split into trigrams. A query
+matches a name when they share at least ``MIN_SCORE`` of the query's
+trigrams, which tolerates typos and missing letters; names that start with
+the query rank first. Candidates are found with set operations on the
+postings of the query's rarest trigrams, so a lookup scores a bounded number
+of names however large the catalogue is.
+
+Each worker process loads the index on first use. Changes made by the
+process itself are applied incrementally by ``reader.signals`` once they
+commit; changes made by other processes bump a version counter in the shared
+``stamps`` cache, and the index is rebuilt in a background thread when a
+newer version is seen.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from itertools import combinations
+from math import ceil
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from reader.cache import STAMPS_CACHE
+from reader.search import normalize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'suggest:version'
+# Seconds between checks for changes made by other processes
+CHECK_INTERVAL = 10
+# Fraction of the query's trigrams a name must contain
+MIN_SCORE = 0.5
+MIN_QUERY_LENGTH = 2
+# Postings entries read per lookup to find candidate names
+CANDIDATE_BUDGET = 2000
+MAX_RESULTS = 20
+
+CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # Kyrgyz
+    'ң': 'ng', 'ө': 'o', 'ү': 'u',
+})
+SEPARATOR_RE = re.compile(r'[\W_]+')
+
+
+def transliterate(text):
+    """Return the Latin, diacritic-free, lowercase key of ``text``."""
+    text = normalize(text).translate(CYRILLIC_TO_LATIN)
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char)
+    )
+    return SEPARATOR_RE.sub(' ', text).strip()
+
+
+def trigrams(key):
+    """Return the trigrams of each word of ``key``, padded like pg_trgm."""
+    grams = set()
+    for word in key.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SuggestIndex:
+    """A trigram index of series titles and aliases."""
+
+    def __init__(self):
+        # series ID -> (title, slug, name IDs)
+        self.series = {}
+        # name ID -> (series ID, name, key, trigrams)
+        self.names = {}
+        # trigram -> name IDs
+        self.postings = defaultdict(set)
+        # (key, name ID), sorted, for prefix lookups
+        self.keys = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.series)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from ``{series ID: (title, slug, aliases)}``."""
+        index = cls()
+        for series_id, (title, slug, aliases) in rows.items():
+            index._add(series_id, title, slug, aliases, keep_sorted=False)
+        index.keys.sort()
+        return index
+
+    def add(self, series_id, title, slug, aliases=()):
+        """Add a series, replacing any previous entry for it."""
+        with self._lock:
+            self._remove(series_id)
+            self._add(series_id, title, slug, aliases)
+
+    def _add(self, series_id, title, slug, aliases, keep_sorted=True):
+        name_ids = []
+        for name in (title, *aliases):
+            key = transliterate(name)
+            if not key:
+                continue
+            grams = frozenset(trigrams(key))
+            name_id = self._next_id
+            self._next_id += 1
+            self.names[name_id] = (series_id, name, key, grams)
+            for gram in grams:
+                self.postings[gram].add(name_id)
+            if keep_sorted:
+                bisect.insort(self.keys, (key, name_id))
+            else:
+                self.keys.append((key, name_id))
+            name_ids.append(name_id)
+        self.series[series_id] = (title, slug, name_ids)
+
+    def remove(self, series_id):
+        """Remove a series from the index."""
+        with self._lock:
+            self._remove(series_id)
+
+    def _remove(self, series_id):
+        entry = self.series.pop(series_id, None)
+        if entry is None:
+            return
+        for name_id in entry[2]:
+            _, _, key, grams = self.names.pop(name_id)
+            del self.keys[bisect.bisect_left(self.keys, (key, name_id))]
+            for gram in grams:
+                postings = self.postings[gram]
+                postings.discard(name_id)
+                if not postings:
+                    del self.postings[gram]
+
+    def suggest(self, query, limit=10):
+        """
+        Return up to ``limit`` series whose title or an alias resembles ``query``.
+
+        Returns:
+            A list of dicts with the series ``id``, ``title``, ``slug``, the
+            ``match``-ing name and its ``score``, best first
+        """
+        key = transliterate(query)
+        if len(key) < MIN_QUERY_LENGTH:
+            return []
+        grams = trigrams(key)
+        needed = max(1, ceil(len(grams) * MIN_SCORE))
+
+        with self._lock:
+            best = {}
+            # Short queries match too many names by trigrams to score them
+            # all; when enough names start with the query, those rank first
+            # anyway
+            prefixed = self._prefixed(key, limit * 5)
+            self._score(prefixed, key, grams, needed, best)
+            if len(best) < limit:
+                self._score(self._candidates(grams, needed), key, grams, needed, best)
+
+            ranked = heapq.nlargest(limit, best.items(), key=lambda item: item[1][0])
+            return [
+                {
+                    'id': series_id,
+                    'title': self.series[series_id][0],
+                    'slug': self.series[series_id][1],
+                    'match': name,
+                    'score': round(score, 3),
+                }
+                for series_id, (score, name) in ranked
+            ]
+
+    def _prefixed(self, key, count):
+        """Return the IDs of up to ``count`` names starting with ``key``."""
+        start = bisect.bisect_left(self.keys, (key,))
+        name_ids = []
+        for name_key, name_id in self.keys[start:start + count]:
+            if not name_key.startswith(key):
+                break
+            name_ids.append(name_id)
+        return name_ids
+
+    def _candidates(self, grams, needed):
+        """
+        Return the IDs of the names likely to share ``needed`` of ``grams``.
+
+        Such a name contains at least two of the query's ``len(grams) - needed
+        + 2`` rarest trigrams, so the candidates are the pairwise intersections
+        of their postings, computed in C by set operations. To bound the cost
+        of queries made of common trigrams, postings are only read up to
+        ``CANDIDATE_BUDGET`` entries, which may miss a few weak matches.
+        """
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        rarest, total = [], 0
+        for names in postings[:len(grams) - needed + 2]:
+            if len(rarest) >= 2 and total + len(names) > CANDIDATE_BUDGET:
+                break
+            rarest.append(names)
+            total += len(names)
+        if needed < 2 or len(rarest) < 2:
+            return set().union(*rarest)
+        return set().union(*(a & b for a, b in combinations(rarest, 2)))
+
+    def _score(self, name_ids, key, grams, needed, best):
+        """Score names against the query, keeping each series' best match in ``best``."""
+        for name_id in name_ids:
+            series_id, name, name_key, name_grams = self.names[name_id]
+            shared = len(grams & name_grams)
+            if shared < needed:
+                continue
+            score = shared / len(grams)
+            if name_key.startswith(key):
+                score += 0.5
+            elif f' {key}' in f' {name_key}':
+                score += 0.25
+            # Prefer names without much besides the query
+            score += 0.1 * shared / (len(grams) + len(name_grams) - shared)
+            if series_id not in best or score > best[series_id][0]:
+                best[series_id] = (score, name)
+
+
+def load_series(series_ids=None):
+    """Return ``{series ID: (title, slug, aliases)}`` from the database."""
+    from django.contrib.contenttypes.models import ContentType
+    from reader.models import Alias, Series
+
+    series = Series.objects.order_by()
+    aliases = Alias.objects.filter(content_type=ContentType.objects.get_for_model(Series))
+    if series_ids is not None:
+        series = series.filter(pk__in=series_ids)
+        aliases = aliases.filter(object_id__in=series_ids)
+
+    rows = {pk: (title, slug, []) for pk, title, slug in series.values_list('pk', 'title', 'slug')}
+    for object_id, name in aliases.values_list('object_id', 'name'):
+        if object_id in rows:
+            rows[object_id][2].append(name)
+    return rows
+
+
+def build_index():
+    """Build an index of every series."""
+    return SuggestIndex.from_rows(load_series())
+
+
+_index = None
+_version = None
+_checked_at = 0.0
+_rebuilding = False
+_state_lock = threading.Lock()
+
+
+def current_version():
+    return caches[STAMPS_CACHE].get(VERSION_KEY, 0)
+
+
+def get_index():
+    """Return this process's index, loading it on first use."""
+    global _index, _version, _checked_at
+    if _index is None:
+        with _state_lock:
+            if _index is None:
+                version = current_version()
+                _index = build_index()
+                _version, _checked_at = version, time.monotonic()
+        return _index
+
+    if time.monotonic() - _checked_at >= CHECK_INTERVAL:
+        _checked_at = time.monotonic()
+        if current_version() != _version:
+            _start_rebuild()
+    return _index
+
+
+def _start_rebuild():
+    global _rebuilding
+    with _state_lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    # The stale index keeps serving requests until the new one is ready
+    threading.Thread(target=_rebuild, name='suggest-rebuild', daemon=True).start()
+
+
+def _rebuild():
+    global _index, _version, _rebuilding
+    try:
+        version = current_version()
+        index = build_index()
+        with _state_lock:
+            _index, _version = index, version
+    except Exception:
+        logger.exception('Failed to rebuild the suggestion index')
+    finally:
+        _rebuilding = False
+        connection.close()
+
+
+def refresh_series(series_ids):
+    """
+    Re-read the given series into this process's index and notify other
+    processes, once the current transaction commits.
+
+    Bumped before the commit, the version could make another process rebuild
+    from the old rows and then consider its index current.
+    """
+    series_ids = list(series_ids)
+    transaction.on_commit(lambda: _refresh(series_ids))
+
+
+def _refresh(series_ids):
+    global _version
+    versions = caches[STAMPS_CACHE]
+    versions.add(VERSION_KEY, 0, timeout=None)
+    try:
+        version = versions.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        version = None
+
+    index = _index
+    if index is None:
+        return
+    rows = load_series(series_ids)
+    for series_id in series_ids:
+        if series_id in rows:
+            title, slug, aliases = rows[series_id]
+            index.add(series_id, title, slug, aliases)
+        else:
+            index.remove(series_id)
+
+    with _state_lock:
+        # Skip the rebuild unless another process changed something too
+        if version is not None and _version is not None and version == _version + 1:
+            _version = version
+
+
+def suggest_series(query, limit=10):
+    """Return typeahead suggestions for ``query``; see ``SuggestIndex.suggest``."""
+    return get_index().suggest(query, limit=min(limit, MAX_RESULTS))
+
+
+def reset():
+    """Drop this process's index; the next lookup reloads it."""
+    global _index, _version
+    with _state_lock:
+        _index, _version = None, None
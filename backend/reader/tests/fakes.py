@@ -0,0 +1,212 @@
+"""
+In-memory stand-ins for S3-compatible object storage used by the tests.
+"""
+
+import hashlib
+import io
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from types import SimpleNamespace
+from urllib.parse import quote, unquote, urlsplit
+
+import httpx
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+from reader.storage import TigrisMediaStorage
+
+
+def client_error(status_code, code, operation):
+    """Build a ``ClientError`` like botocore raises for an HTTP error status."""
+    return ClientError({
+        'Error': {'Code': code, 'Message': code},
+        'ResponseMetadata': {'HTTPStatusCode': status_code, 'HTTPHeaders': {}},
+    }, operation)
+
+
+class FakeS3Client:
+    """
+    A minimal boto3 S3 client keeping objects in memory.
+
+    Supports the ``Range``, ``IfMatch`` and ``IfNoneMatch`` parameters of
+    ``GetObject``/``HeadObject``, paginated ``ListObjectsV2`` and
+    ``DeleteObjects``, and records every call in ``calls``. Keys in
+    ``delete_errors`` fail to be deleted with the given error codes, one per
+    attempt.
+    """
+
+    page_size = 1000
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+        self.delete_errors = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append(('put_object', Key))
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self.objects[Key] = {
+            'data': data,
+            'etag': f'"{hashlib.md5(data).hexdigest()}"',
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+        }
+        return {'ETag': self.objects[Key]['etag']}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        """Store the file, recording the number of parts it would be sent in."""
+        data = Fileobj.read()
+        parts = -(-len(data) // Config.multipart_chunksize) if Config else 1
+        self.calls.append(('upload_fileobj', Key, parts))
+        self.put_object(Bucket=Bucket, Key=Key, Body=data)
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, ContinuationToken=None, **kwargs):
+        """List keys in pages of ``page_size``, grouping by ``Delimiter``."""
+        self.calls.append(('list_objects_v2', Prefix))
+        entries = {}
+        for key in sorted(self.objects):
+            if not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter, 1)[0] + Delimiter
+                entries[common] = None
+            else:
+                entries[key] = self.objects[key]
+        entries = list(entries.items())
+        start = int(ContinuationToken or 0)
+        page = entries[start:start + self.page_size]
+        response = {
+            'Contents': [
+                {'Key': key, 'Size': len(obj['data']), 'LastModified': obj['last_modified']}
+                for key, obj in page if obj is not None
+            ],
+            'CommonPrefixes': [{'Prefix': key} for key, obj in page if obj is None],
+            'IsTruncated': start + self.page_size < len(entries),
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + self.page_size)
+        return response
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [item['Key'] for item in Delete['Objects']]
+        self.calls.append(('delete_objects', len(keys)))
+        errors = []
+        for key in keys:
+            if self.delete_errors.get(key):
+                code = self.delete_errors[key].pop(0)
+                errors.append({'Key': key, 'Code': code, 'Message': code})
+            else:
+                self.objects.pop(key, None)
+        deleted = [{'Key': key} for key in keys if key not in {e['Key'] for e in errors}]
+        response = {} if Delete.get('Quiet') else {'Deleted': deleted}
+        if errors:
+            response['Errors'] = errors
+        return response
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        self.calls.append(('generate_presigned_url', Params['Key']))
+        return f"https://s3.test/{Params['Bucket']}/{quote(Params['Key'])}?X-Amz-Expires={ExpiresIn}"
+
+    def head_object(self, **kwargs):
+        return self._get('head_object', **kwargs)
+
+    def get_object(self, **kwargs):
+        return self._get('get_object', **kwargs)
+
+    def _get(self, operation, Bucket, Key, Range=None, IfMatch=None, IfNoneMatch=None,
+             IfModifiedSince=None, IfUnmodifiedSince=None, **kwargs):
+        self.calls.append((operation, Key))
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise client_error(404, 'NoSuchKey', operation)
+        if IfMatch is not None and IfMatch != obj['etag']:
+            raise client_error(412, 'PreconditionFailed', operation)
+        if IfUnmodifiedSince is not None and obj['last_modified'] > IfUnmodifiedSince:
+            raise client_error(412, 'PreconditionFailed', operation)
+        if (IfNoneMatch is not None and IfNoneMatch == obj['etag']
+                or IfModifiedSince is not None and obj['last_modified'] <= IfModifiedSince):
+            error = client_error(304, '304', operation)
+            error.response['ResponseMetadata']['HTTPHeaders']['etag'] = obj['etag']
+            raise error
+
+        data, size = obj['data'], len(obj['data'])
+        result = {'ETag': obj['etag'], 'LastModified': obj['last_modified']}
+        if Range:
+            first, _, last = Range[len('bytes='):].partition('-')
+            start = size - int(last) if first == '' else int(first)
+            end = size - 1 if first == '' or last == '' else min(int(last), size - 1)
+            if start >= size:
+                raise client_error(416, 'InvalidRange', operation)
+            data = data[start:end + 1]
+            result['ContentRange'] = f'bytes {start}-{end}/{size}'
+        result['ContentLength'] = len(data)
+        if operation == 'get_object':
+            result['Body'] = StreamingBody(io.BytesIO(data), len(data))
+        return result
+
+
+class _Stream(httpx.AsyncByteStream):
+    """A response body sent in 16 KiB chunks, like a network response."""
+
+    def __init__(self, data):
+        self.data = data
+
+    async def __aiter__(self):
+        for start in range(0, len(self.data), 16 * 1024):
+            yield self.data[start:start + 16 * 1024]
+
+
+def s3_transport(client):
+    """
+    An ``httpx`` transport answering presigned requests of ``client`` over HTTP.
+
+    Request headers are mapped to ``GetObject``/``HeadObject`` parameters and
+    error statuses returned as S3 would.
+    """
+    parameters = {
+        'range': 'Range', 'if-match': 'IfMatch', 'if-none-match': 'IfNoneMatch',
+        'if-modified-since': 'IfModifiedSince', 'if-unmodified-since': 'IfUnmodifiedSince',
+    }
+
+    def handle(request):
+        bucket, _, key = unquote(urlsplit(str(request.url)).path).lstrip('/').partition('/')
+        params = {}
+        for header, param in parameters.items():
+            if header in request.headers:
+                value = request.headers[header]
+                params[param] = parsedate_to_datetime(value) if header.endswith('since') else value
+        fetch = client.head_object if request.method == 'HEAD' else client.get_object
+        try:
+            obj = fetch(Bucket=bucket, Key=key, **params)
+        except ClientError as e:
+            return httpx.Response(
+                e.response['ResponseMetadata']['HTTPStatusCode'],
+                headers=e.response['ResponseMetadata']['HTTPHeaders'],
+            )
+        headers = {
+            'Content-Length': str(obj['ContentLength']),
+            'ETag': obj['ETag'],
+            'Last-Modified': format_datetime(obj['LastModified'], usegmt=True),
+        }
+        if obj.get('ContentRange'):
+            headers['Content-Range'] = obj['ContentRange']
+        body = obj['Body'].read() if 'Body' in obj else b''
+        return httpx.Response(206 if obj.get('ContentRange') else 200, headers=headers, stream=_Stream(body))
+
+    return httpx.MockTransport(handle)
+
+
+class FakeS3Storage(TigrisMediaStorage):
+    """``TigrisMediaStorage`` backed by a ``FakeS3Client``."""
+
+    def __init__(self, client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client or FakeS3Client()
+
+    @property
+    def connection(self):
+        return SimpleNamespace(meta=SimpleNamespace(client=self.client))
+
+    def put(self, name, data):
+        """Store ``data`` under the storage name ``name``."""
+        self.client.put_object(Bucket=self.bucket_name, Key=self._normalize_name(name), Body=data)
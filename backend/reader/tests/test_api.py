@@ -2,14 +2,16 @@
 Unit tests for MangaKG reader API endpoints.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
 from reader.models import (
-    Series, Chapter, Author, Artist, Category, Volume,
+    Series, Chapter, Page, Author, Artist, Category, Volume,
     Status as SeriesStatus, ApprovalStatus
 )
 
@@ -116,6 +118,125 @@ class SeriesAPITest(TestCase):
         self.skipTest("Skipping due to Django test URL resolution issue")
 
 
+@override_settings(API_CACHE_TIMEOUT=0)
+class SeriesListQueryCountTest(TestCase):
+    """Test that the series list runs a constant number of queries."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = APIClient()
+        self.author = Author.objects.create(name="Shared Author")
+        self.category = Category.objects.create(name="Drama", description="Drama manga")
+    
+    def create_series(self, index):
+        """Create a series with volumes, approved and pending chapters."""
+        series = Series.objects.create(title=f"Series {index}")
+        series.authors.add(self.author)
+        series.categories.add(self.category)
+        volume = Volume.objects.create(series=series, number=1)
+        for number in range(1, 4):
+            Chapter.objects.create(
+                title=f"Chapter {number}",
+                number=number,
+                series=series,
+                volume=volume,
+                approval_status=ApprovalStatus.APPROVED
+            )
+        Chapter.objects.create(
+            title="Pending Chapter",
+            number=4,
+            series=series,
+            approval_status=ApprovalStatus.PENDING
+        )
+        return series
+    
+    def get_list(self):
+        response = self.client.get(reverse('reader:series-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+    
+    def test_query_count_is_constant(self):
+        """Test that the query count does not grow with the page size."""
+        self.create_series(0)
+        with CaptureQueriesContext(connection) as small_page:
+            self.get_list()
+        
+        for index in range(1, 10):
+            self.create_series(index)
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.get_list()
+        
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(large_page), len(small_page))
+    
+    def test_counts_only_approved_chapters(self):
+        """Test chapter_count and latest_chapter ignore unapproved chapters."""
+        self.create_series(0)
+        
+        series_data = self.get_list().data['results'][0]
+        self.assertEqual(series_data['chapter_count'], 3)
+        self.assertEqual(series_data['latest_chapter']['number'], 3)
+        self.assertEqual(series_data['latest_chapter']['volume_number'], 1)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class CursorPaginationTest(TestCase):
+    """Test cursor pagination of the series and chapter lists."""
+    
+    def setUp(self):
+        """Set up 25 series with one approved chapter each."""
+        self.client = APIClient()
+        for index in range(25):
+            series = Series.objects.create(title=f"Series {index:02}")
+            Chapter.objects.create(
+                title="Chapter 1",
+                number=1,
+                series=series,
+                approval_status=ApprovalStatus.APPROVED
+            )
+    
+    def walk(self, url):
+        """Follow next links from ``url``, returning the ids of every page."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data['next']
+        return pages
+    
+    def test_series_cursor_pages(self):
+        """Test that cursor pages cover every series once, newest first."""
+        pages = self.walk(reverse('reader:series-list') + '?pagination=cursor')
+        
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        ids = [pk for page in pages for pk in page]
+        expected = list(Series.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+    
+    def test_chapter_cursor_pages(self):
+        """Test that chapters are paginated by publication date."""
+        pages = self.walk(reverse('reader:chapter-list') + '?pagination=cursor')
+        ids = [pk for page in pages for pk in page]
+        expected = list(Chapter.objects.order_by('-published_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+    
+    def test_cursor_mode_skips_count(self):
+        """Test that cursor pages don't count the whole table."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('reader:chapter-list') + '?pagination=cursor')
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT COUNT(*)') for query in queries.captured_queries
+        ))
+    
+    def test_page_number_mode_is_default(self):
+        """Test that page-number pagination is still used without the parameter."""
+        response = self.client.get(reverse('reader:series-list'), {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+
 class ChapterAPITest(TestCase):
     """Test cases for Chapter API endpoints."""
     
@@ -180,6 +301,32 @@ class ChapterAPITest(TestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_page_variants_and_srcset(self):
+        """Test that pages list their downscaled variants and a srcset."""
+        Page.objects.create(
+            chapter=self.approved_chapter,
+            number=1,
+            image='series/test/ch1/abc.png',
+            width=1200,
+            height=1800,
+            mime_type='image/png',
+            variants=[
+                {'name': 'series/test/ch1/abc-960w.webp', 'width': 960, 'height': 1440, 'mime_type': 'image/webp'},
+                {'name': 'series/test/ch1/abc-480w.webp', 'width': 480, 'height': 720, 'mime_type': 'image/webp'},
+            ]
+        )
+        url = reverse('reader:chapter-pages', kwargs={'chapter_id': self.approved_chapter.id})
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page_data = response.data[0]
+        self.assertEqual([v['width'] for v in page_data['variants']], [960, 480])
+        self.assertTrue(page_data['variants'][0]['url'].endswith('/media/series/test/ch1/abc-960w.webp'))
+        self.assertEqual(
+            [candidate.split()[-1] for candidate in page_data['srcset'].split(', ')],
+            ['480w', '960w', '1200w']
+        )
 
 
 class AuthorAPITest(TestCase):
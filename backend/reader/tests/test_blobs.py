@@ -0,0 +1,159 @@
+"""
+Tests for the content-addressed page blobs.
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from reader import blobs
+from reader.ingestion import ChapterIngestor
+from reader.models import Chapter, PageBlob, Series
+from reader.orphans import stale_blobs
+from reader.tests.test_ingestion import make_archive, make_image
+
+
+def make_upload(colors):
+    """Return an uploaded chapter archive with one page per colour."""
+    return SimpleUploadedFile(
+        'chapter.zip',
+        make_archive({f'{i:02}.png': make_image(color=color) for i, color in enumerate(colors, 1)}),
+        content_type='application/zip'
+    )
+
+
+class PageBlobTest(TestCase):
+    """Test cases for deduplicating and reference counting page images."""
+
+    def setUp(self):
+        """Set up a temporary media root."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root, PAGE_DERIVATIVE_WIDTHS=[], CHAPTER_RENDER_PROCESSES=0,
+            CHAPTER_PROCESSING_ASYNC=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.series = Series.objects.create(title='Blob Series')
+
+    def create_chapter(self, number, colors):
+        return Chapter.objects.create(
+            title=f'Chapter {number}', number=number, series=self.series, file=make_upload(colors)
+        )
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(os.path.join(self.media_root, 'series'))
+            for name in names
+        )
+
+    def test_ingest_reuses_stored_images(self):
+        """Test that an image with known content is not uploaded again."""
+        data = make_image()
+        first = ChapterIngestor('a').ingest([('1.png', lambda: data), ('2.png', lambda: data)])
+        second = ChapterIngestor('b').ingest([('1.png', lambda: data)])
+
+        self.assertEqual(first[0].name, first[1].name)
+        self.assertTrue(second[0].reused)
+        self.assertEqual(second[0].name, first[0].name)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'a')), [os.path.basename(first[0].name)])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'b')))
+        # Each ingested page holds a reference until it is saved or released
+        blob = PageBlob.objects.get()
+        self.assertEqual((blob.name, blob.size, blob.ref_count), (first[0].name, len(data), 3))
+
+    def test_ingest_without_deduplication_skips_blobs(self):
+        """Test that ingestion without deduplication doesn't touch the database."""
+        with self.assertNumQueries(0):
+            [page] = ChapterIngestor('a', deduplicate=False).ingest([('1.png', make_image)])
+        self.assertFalse(page.retained)
+
+    def test_failed_ingestion_releases_references(self):
+        """Test that the references taken by a failed ingestion are dropped."""
+        data = make_image()
+        ChapterIngestor('a').ingest([('1.png', lambda: data)])
+
+        def fail():
+            raise OSError('unreadable')
+
+        with self.assertRaises(OSError):
+            ChapterIngestor('b').ingest([('1.png', lambda: data), ('2.png', fail)])
+        self.assertEqual(PageBlob.objects.get().ref_count, 1)
+
+    def test_deleted_blob_is_not_reused(self):
+        """Test that a blob deleted after it was looked up is uploaded again."""
+        data = make_image()
+        [first] = ChapterIngestor('a').ingest([('1.png', lambda: data)])
+        blob = PageBlob.objects.get()
+        PageBlob.objects.all().delete()
+
+        with mock.patch('reader.blobs.find', return_value=blob):
+            [second] = ChapterIngestor('b').ingest([('1.png', lambda: data)])
+
+        self.assertFalse(second.reused)
+        self.assertTrue(second.name.startswith('b/'))
+        self.assertEqual(PageBlob.objects.get().name, second.name)
+
+    def test_stale_purge_skips_reused_blobs(self):
+        """Test that an unreferenced blob reused after it was found stale is kept."""
+        data = make_image()
+        [page] = ChapterIngestor('a').ingest([('1.png', lambda: data)])
+        PageBlob.objects.update(ref_count=0, created_at=timezone.now() - timedelta(days=2))
+        stale = stale_blobs(timezone.now() - timedelta(days=1))
+        self.assertEqual(stale.count(), 1)
+
+        self.assertIsNotNone(blobs.reuse(page.digest))
+        self.assertEqual(blobs.delete_rows(stale), 0)
+        self.assertEqual(PageBlob.objects.get().ref_count, 1)
+
+    def test_shared_pages_are_counted(self):
+        """Test that chapters sharing pages store them once and count their references."""
+        self.create_chapter(1, [(255, 0, 0), (0, 255, 0)])
+        self.create_chapter(2, [(255, 0, 0), (0, 0, 255)])
+
+        self.assertEqual(len(self.stored_files()), 3)
+        self.assertEqual(
+            sorted(PageBlob.objects.values_list('ref_count', flat=True)), [1, 1, 2]
+        )
+
+    def test_reprocessing_reuses_images(self):
+        """Test that reprocessing a chapter keeps its stored images."""
+        chapter = self.create_chapter(1, [(255, 0, 0), (0, 255, 0)])
+        names = list(chapter.pages.values_list('image', flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.file = make_upload([(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+            chapter.save(update_fields=['file'])
+            chapter.process_uploaded_file()
+
+        self.assertEqual(list(chapter.pages.values_list('image', flat=True))[:2], names)
+        self.assertEqual(len(self.stored_files()), 3)
+        self.assertEqual(list(PageBlob.objects.values_list('ref_count', flat=True)), [1, 1, 1])
+
+    def test_unreferenced_blobs_are_deleted(self):
+        """Test that an image is deleted with the last page using it."""
+        first = self.create_chapter(1, [(255, 0, 0), (0, 255, 0)])
+        second = self.create_chapter(2, [(255, 0, 0)])
+        shared = second.pages.get().image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+
+        self.assertEqual(self.stored_files(), [shared])
+        self.assertEqual(PageBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.pages.all().delete()
+
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(PageBlob.objects.exists())
+        self.assertFalse(default_storage.exists(shared))
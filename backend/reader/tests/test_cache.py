@@ -0,0 +1,223 @@
+"""
+Unit tests for the API response cache.
+"""
+
+from django.conf import settings
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader.admin import ChapterAdmin
+from reader.cache import CHAPTERS, SERIES, get_stamps, response_cache_key
+from reader.models import Alias, ApprovalStatus, Author, Category, Chapter, Page, Series
+
+
+@override_settings(API_CACHE_TIMEOUT=300)
+class ResponseCacheTest(TestCase):
+    """Test caching and invalidation of API responses."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.client = APIClient()
+        self.series = Series.objects.create(title='Cached Series')
+        self.chapter = Chapter.objects.create(
+            title='Chapter 1',
+            number=1,
+            series=self.series,
+            approval_status=ApprovalStatus.APPROVED
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_repeated_request_is_served_from_cache(self):
+        """Test that a second identical request runs no queries."""
+        url = reverse('reader:series-list')
+        first = self.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+    def test_query_parameters_are_normalized(self):
+        """Test that parameter order and empty parameters share a cache entry."""
+        url = reverse('reader:series-list')
+        self.get(url, status='ongoing', ordering='title')
+        response = self.client.get(f'{url}?ordering=title&search=&status=ongoing')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        response = self.get(url, ordering='-title')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_model_change_invalidates(self):
+        """Test that saving a series invalidates the cached list."""
+        url = reverse('reader:series-list')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.series.title = 'Renamed Series'
+            self.series.save()
+
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed Series')
+
+    def test_unrelated_change_keeps_cache(self):
+        """Test that a change outside a view's namespaces keeps its entries."""
+        url = reverse('reader:category-list')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.series.title = 'Renamed Series'
+            self.series.save()
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+    def test_page_and_alias_changes_invalidate(self):
+        """Test that page and alias changes invalidate dependent responses."""
+        pages_url = reverse('reader:chapter-pages', args=[self.chapter.pk])
+        self.get(pages_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(
+                chapter=self.chapter, number=1, image='series/p1.jpg', width=800, height=1200
+            )
+        self.assertEqual(len(self.get(pages_url).data), 1)
+
+        authors_url = reverse('reader:author-list')
+        author = Author.objects.create(name='Author')
+        self.get(authors_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Alias.objects.create(name='Pen Name', content_object=author)
+        response = self.get(authors_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['aliases'][0]['name'], 'Pen Name')
+
+    def test_m2m_change_invalidates(self):
+        """Test that adding a category to a series invalidates the series list."""
+        url = reverse('reader:series-list')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.series.categories.add(Category.objects.create(name='Drama'))
+        response = self.get(url)
+        self.assertEqual(response.data['results'][0]['categories'][0]['name'], 'Drama')
+
+    def test_admin_approval_invalidates(self):
+        """Test that the bulk approve admin action invalidates cached chapters."""
+        pending = Chapter.objects.create(
+            title='Chapter 2',
+            number=2,
+            series=self.series,
+            approval_status=ApprovalStatus.PENDING
+        )
+        url = reverse('reader:chapter-list')
+        self.assertEqual(self.get(url).data['count'], 1)
+
+        request = RequestFactory().post('/admin/')
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        chapter_admin = ChapterAdmin(Chapter, AdminSite())
+        chapter_admin.message_user = lambda *args, **kwargs: None
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter_admin.approve_chapters(request, Chapter.objects.filter(pk=pending.pk))
+
+        self.assertEqual(self.get(url).data['count'], 2)
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_cache_key_includes_host(self):
+        """Test that responses for different hosts are cached separately."""
+        factory = RequestFactory()
+        key = response_cache_key(factory.get('/api/series/'), ['series'])
+        other = response_cache_key(factory.get('/api/series/', HTTP_HOST='example.com'), ['series'])
+        self.assertNotEqual(key, other)
+
+    def test_stamps_survive_culling(self):
+        """Test that filling up the default cache does not replace the stamps."""
+        stamps = get_stamps([SERIES, CHAPTERS])
+        cache.set_many({f'filler:{i}': i for i in range(settings.CACHE_MAX_ENTRIES + 10)})
+        cache.clear()
+        self.assertEqual(get_stamps([SERIES, CHAPTERS]), stamps)
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """Test that a zero timeout disables the cache."""
+        url = reverse('reader:series-list')
+        self.get(url)
+        self.assertNotIn('X-Cache', self.get(url))
+
+
+class ConditionalRequestTest(TestCase):
+    """Test ETag and Last-Modified handling of API responses."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.client = APIClient()
+        self.series = Series.objects.create(title='Conditional Series')
+        self.url = reverse('reader:series-list')
+
+    def test_validators_are_set(self):
+        """Test that responses carry an ETag and Last-Modified."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_if_none_match_returns_not_modified(self):
+        """Test that a matching ETag is answered without querying the database."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_returns_not_modified(self):
+        """Test that an up-to-date If-Modified-Since is answered with a 304."""
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_change_updates_etag(self):
+        """Test that a model change produces a new ETag."""
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.series.title = 'Renamed'
+            self.series.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_request_during_transaction_is_not_cached_as_current(self):
+        """Test that a response built before a change commits is not served after it."""
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.series.title = 'Renamed'
+            self.series.save()
+            # The stamps, and so the ETag, are unchanged until the commit
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+    def test_etag_depends_on_query(self):
+        """Test that different query parameters get different ETags."""
+        first = self.client.get(self.url)['ETag']
+        second = self.client.get(self.url, {'ordering': 'title'})['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_errors_have_no_validators(self):
+        """Test that error responses are not given validators."""
+        response = self.client.get(reverse('reader:chapter-pages', args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,102 @@
+"""
+Tests for cleaning up dangling chapter file references.
+"""
+
+import io
+import shutil
+import tempfile
+from unittest.mock import Mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from reader.inventory import find_existing
+from reader.models import Chapter, Series
+from reader.tests.fakes import FakeS3Storage, client_error
+
+
+class FindExistingTest(TestCase):
+    """Test cases for checking many names at once."""
+
+    def setUp(self):
+        """Set up stored uploads."""
+        self.storage = FakeS3Storage()
+        self.storage.client.page_size = 2
+        for name in ['uploads/chapters/a/1.zip', 'uploads/chapters/b/2.zip', 'legacy/3.zip']:
+            self.storage.put(name, b'zip')
+        self.names = {
+            'uploads/chapters/a/1.zip', 'uploads/chapters/a/missing.zip',
+            'uploads/chapters/b/2.zip', 'legacy/3.zip', 'legacy/missing.zip',
+        }
+
+    def test_listing(self):
+        """Test that names under the prefix are found by listing, the rest by HEAD."""
+        existing = find_existing(self.storage, self.names, prefix='uploads/chapters/')
+
+        self.assertEqual(existing, {'uploads/chapters/a/1.zip', 'uploads/chapters/b/2.zip', 'legacy/3.zip'})
+        heads = sorted(key for call, key in self.storage.client.calls if call == 'head_object')
+        self.assertEqual(heads, ['media/legacy/3.zip', 'media/legacy/missing.zip'])
+
+    def test_listing_denied(self):
+        """Test that every name is checked individually when listing is not allowed."""
+        self.storage.client.list_objects_v2 = Mock(
+            side_effect=client_error(403, 'AccessDenied', 'ListObjectsV2')
+        )
+
+        existing = find_existing(self.storage, self.names, prefix='uploads/chapters/')
+
+        self.assertEqual(existing, {'uploads/chapters/a/1.zip', 'uploads/chapters/b/2.zip', 'legacy/3.zip'})
+        heads = [call for call, _ in self.storage.client.calls if call == 'head_object']
+        self.assertEqual(len(heads), 5)
+
+
+class CleanupChapterFilesTest(TestCase):
+    """Test the cleanup_chapter_files command."""
+
+    def setUp(self):
+        """Set up chapters with existing and missing files."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        series = Series.objects.create(title='Cleanup')
+        default_storage.save('uploads/chapters/cleanup/vol0/ch1/a.zip', ContentFile(b'zip'))
+        Chapter.objects.bulk_create([
+            Chapter(title='Chapter 1', number=1, series=series,
+                    file='uploads/chapters/cleanup/vol0/ch1/a.zip'),
+            Chapter(title='Chapter 2', number=2, series=series,
+                    file='uploads/chapters/cleanup/vol0/ch2/b.zip'),
+            Chapter(title='Chapter 3', number=3, series=series, file='elsewhere/c.zip'),
+            Chapter(title='Chapter 4', number=4, series=series),
+        ])
+
+    def files(self):
+        return list(Chapter.objects.order_by('number').values_list('file', flat=True))
+
+    def test_dry_run(self):
+        """Test that a dry run reports dangling references without clearing them."""
+        out = io.StringIO()
+        call_command('cleanup_chapter_files', dry_run=True, stdout=out)
+
+        self.assertIn('Found 2 chapters with dangling file references.', out.getvalue())
+        self.assertIn('Timing:', out.getvalue())
+        self.assertEqual(self.files()[:3], [
+            'uploads/chapters/cleanup/vol0/ch1/a.zip',
+            'uploads/chapters/cleanup/vol0/ch2/b.zip',
+            'elsewhere/c.zip',
+        ])
+
+    def test_cleanup(self):
+        """Test that dangling references are cleared in batches."""
+        out = io.StringIO()
+        call_command('cleanup_chapter_files', batch_size=1, stdout=out)
+
+        self.assertIn('Successfully cleaned 2 chapters.', out.getvalue())
+        files = self.files()
+        self.assertEqual(files[0], 'uploads/chapters/cleanup/vol0/ch1/a.zip')
+        self.assertFalse(files[1])
+        self.assertFalse(files[2])
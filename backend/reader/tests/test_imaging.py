@@ -0,0 +1,70 @@
+"""
+Tests for image probing and the image validators.
+"""
+
+import io
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from reader.imaging import probe_image
+from reader.tests.test_ingestion import make_image
+from reader.validators import validate_cover_image, validate_image_file
+
+
+class ProbeImageTest(SimpleTestCase):
+    """Test cases for probe_image."""
+
+    def test_probe_formats(self):
+        """Test that format, MIME type, size and mode are reported."""
+        for fmt, mime_type in [('JPEG', 'image/jpeg'), ('PNG', 'image/png'), ('WEBP', 'image/webp')]:
+            with self.subTest(fmt=fmt):
+                info = probe_image(make_image(320, 480, fmt=fmt))
+                self.assertEqual(info.format, fmt)
+                self.assertEqual(info.mime_type, mime_type)
+                self.assertEqual(info.size, (320, 480))
+                self.assertEqual(info.mode, 'RGB')
+
+    def test_probe_restores_file_position(self):
+        """Test that probing a file object leaves its position unchanged."""
+        fileobj = io.BytesIO(make_image())
+        probe_image(fileobj, verify=True)
+        self.assertEqual(fileobj.tell(), 0)
+
+    def test_probe_rejects_non_images(self):
+        """Test that unreadable data raises ValidationError."""
+        with self.assertRaises(ValidationError):
+            probe_image(b'definitely not an image')
+
+    def test_verify_detects_corruption(self):
+        """Test that verification catches damage the header parse does not."""
+        data = bytearray(make_image(fmt='PNG'))
+        data[-20] ^= 0xFF  # Corrupt the last chunk's data
+
+        probe_image(bytes(data))
+        with self.assertRaises(ValidationError):
+            probe_image(bytes(data), verify=True)
+
+
+class ImageValidatorTest(SimpleTestCase):
+    """Test cases for the cover image validators."""
+
+    def test_valid_cover(self):
+        """Test that a portrait cover passes validation."""
+        validate_cover_image(SimpleUploadedFile('cover.jpg', make_image(300, 450, fmt='JPEG')))
+
+    def test_cover_too_wide(self):
+        """Test that landscape covers are rejected."""
+        with self.assertRaisesMessage(ValidationError, 'portrait'):
+            validate_cover_image(SimpleUploadedFile('cover.png', make_image(900, 300)))
+
+    def test_image_too_small(self):
+        """Test the minimum dimension check."""
+        with self.assertRaisesMessage(ValidationError, 'too small'):
+            validate_image_file(SimpleUploadedFile('page.png', make_image(50, 50)))
+
+    def test_invalid_image(self):
+        """Test that non-image content is rejected."""
+        with self.assertRaisesMessage(ValidationError, 'not a valid image'):
+            validate_image_file(SimpleUploadedFile('page.png', b'garbage'))
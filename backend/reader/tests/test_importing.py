@@ -0,0 +1,144 @@
+"""
+Tests for the bulk series import.
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from reader.importing import parse_chapter_path, scan
+from reader.models import ApprovalStatus, Chapter, Page, Series, Volume
+from reader.tests.test_ingestion import make_archive, make_image
+
+
+class ParseChapterPathTest(TestCase):
+    """Test cases for inferring volume and chapter numbers from names."""
+
+    def test_names(self):
+        """Test the supported naming schemes."""
+        cases = {
+            ('Vol 02', 'Ch 011 - The Return'): (2, 11, 'The Return'),
+            ('v2 c11.5.cbz',): (2, 11.5, 'Chapter 11.5'),
+            ('Том 1', 'Глава 3'): (1, 3, 'Chapter 3'),
+            ('Series', '012'): (0, 12, 'Chapter 12'),
+            ('Volume 3 Chapter 20 Finale',): (3, 20, 'Finale'),
+        }
+        for parts, expected in cases.items():
+            with self.subTest(parts=parts):
+                self.assertEqual(parse_chapter_path(list(parts)), expected)
+
+    def test_no_number(self):
+        """Test that names without a number are not chapters."""
+        self.assertIsNone(parse_chapter_path(['extras']))
+
+
+class ImportSeriesTest(TestCase):
+    """Test cases for the import_series command."""
+
+    def setUp(self):
+        """Set up a series and a directory of chapters."""
+        self.media_root = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root, PAGE_DERIVATIVE_WIDTHS=[], CHAPTER_RENDER_PROCESSES=0
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.series = Series.objects.create(title='Bulk Series')
+
+        for chapter, color in (('Ch 1', (255, 0, 0)), ('Ch 2', (0, 255, 0))):
+            directory = os.path.join(self.source, 'Vol 1', chapter)
+            os.makedirs(directory)
+            for i in (1, 2, 10):
+                self.write(os.path.join(directory, f'{i}.png'), make_image(color=(*color[:2], i)))
+        # A nested archive holding a chapter of its own
+        with open(os.path.join(self.source, 'Vol 1', 'Ch 3 - Finale.cbz'), 'wb') as fileobj:
+            fileobj.write(make_archive({'1.png': make_image(), '2.png': make_image(color=(1, 2, 3))}))
+
+    def write(self, path, data):
+        with open(path, 'wb') as fileobj:
+            fileobj.write(data)
+
+    def call(self, *args, **kwargs):
+        out = io.StringIO()
+        call_command('import_series', 'bulk-series', self.source, *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_scan(self):
+        """Test that chapters are found in reading order with naturally sorted pages."""
+        chapters = scan(self.source)
+
+        self.assertEqual(
+            [(c.volume, c.number, c.title) for c in chapters],
+            [(1, 1, 'Chapter 1'), (1, 2, 'Chapter 2'), (1, 3, 'Finale')]
+        )
+        self.assertEqual([name for name, _ in chapters[0].pages], ['1.png', '2.png', '10.png'])
+
+    def test_import(self):
+        """Test that volumes, chapters and pages are created."""
+        out = self.call(approve=True, workers=2, upload_concurrency=2)
+
+        self.assertIn('uploaded 8 page(s)', out)
+        self.assertIn('pages/sec', out)
+        volume = Volume.objects.get(series=self.series)
+        self.assertEqual(volume.number, 1)
+        chapters = Chapter.objects.filter(series=self.series).order_by('number')
+        self.assertEqual([c.title for c in chapters], ['Chapter 1', 'Chapter 2', 'Finale'])
+        self.assertTrue(all(c.volume == volume for c in chapters))
+        self.assertTrue(all(c.approval_status == ApprovalStatus.APPROVED for c in chapters))
+        self.assertEqual(
+            list(chapters[0].pages.values_list('number', 'width')), [(1, 120), (2, 120), (3, 120)]
+        )
+        self.assertTrue(all(
+            name.startswith('series/bulk-series/vol1/ch1.0/')
+            for name in chapters[0].pages.values_list('image', flat=True)
+        ))
+        self.assertEqual(self.series.stats.page_count, 8)
+
+    def test_import_refreshes_manifests(self):
+        """Test that imported chapters get manifests listing their pages."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.call(approve=True)
+
+        for chapter in Chapter.objects.filter(series=self.series):
+            with default_storage.open(chapter.manifest) as stored:
+                self.assertEqual(len(json.load(stored)['pages']), chapter.pages.count())
+
+    def test_resume(self):
+        """Test that a re-run only uploads missing and changed pages."""
+        self.call()
+        chapter = Chapter.objects.get(series=self.series, number=2)
+        kept = chapter.pages.get(number=1).pk
+        chapter.pages.filter(number=3).delete()
+        self.write(os.path.join(self.source, 'Vol 1', 'Ch 2', '2.png'), make_image(color=(9, 9, 9)))
+
+        out = self.call()
+
+        # The deleted page's image is still stored
+        self.assertIn('Created 0 chapter(s); uploaded 1 page(s), reused 1 stored image(s) '
+                      'and skipped 6', out)
+        self.assertEqual(Chapter.objects.filter(series=self.series).count(), 3)
+        self.assertEqual(list(chapter.pages.values_list('number', flat=True)), [1, 2, 3])
+        self.assertEqual(chapter.pages.get(number=1).pk, kept)
+        self.assertEqual(Page.objects.filter(chapter__series=self.series).count(), 8)
+
+    def test_dry_run(self):
+        """Test that a dry run lists the chapters without importing them."""
+        out = self.call(dry_run=True)
+
+        self.assertIn('Volume 1, chapter 3: Finale (2 pages)', out)
+        self.assertFalse(Chapter.objects.exists())
+
+    def test_unknown_series(self):
+        """Test that the series must exist."""
+        with self.assertRaises(CommandError):
+            call_command('import_series', 'missing', self.source, stdout=io.StringIO())
@@ -0,0 +1,199 @@
+"""
+Tests for the chapter ingestion pipeline.
+"""
+
+import io
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from reader.imaging import probe_image
+from reader.ingestion import ChapterIngestor
+from reader.models import Series, Chapter, Page
+
+
+def make_image(width=120, height=180, fmt='PNG', color=(200, 30, 30)):
+    """Return the encoded bytes of a solid-colour test image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_archive(members):
+    """Return the bytes of a ZIP archive built from a {name: data} mapping."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+class ChapterIngestorTest(TestCase):
+    """Test cases for ChapterIngestor."""
+
+    def setUp(self):
+        """Set up a temporary storage."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.media_root)
+
+    def test_ingest_archive_in_page_order(self):
+        """Test that pages are numbered by sorted member name and stored."""
+        archive = make_archive({
+            '002.png': make_image(color=(0, 0, 255)),
+            '001.png': make_image(width=300, height=400),
+            '003.jpg': make_image(fmt='JPEG', color=(0, 255, 0)),
+            '__MACOSX/._001.png': b'junk',
+            'info.txt': b'credits',
+        })
+
+        pages = ChapterIngestor(
+            'series/test/vol0/ch1', storage=self.storage, workers=2, upload_concurrency=2
+        ).ingest_archive(io.BytesIO(archive))
+
+        self.assertEqual([p.number for p in pages], [1, 2, 3])
+        self.assertEqual([p.source for p in pages], ['001.png', '002.png', '003.jpg'])
+        self.assertEqual((pages[0].width, pages[0].height), (300, 400))
+        self.assertEqual(pages[0].mime_type, 'image/png')
+        self.assertEqual(pages[2].mime_type, 'image/jpeg')
+        for page in pages:
+            self.assertTrue(page.name.startswith('series/test/vol0/ch1/'))
+            self.assertTrue(page.name.endswith(page.digest + page.source[-4:]))
+            self.assertTrue(self.storage.exists(page.name))
+            self.assertEqual(page.data, b'')
+
+    def test_invalid_image_raises(self):
+        """Test that a corrupt page aborts ingestion."""
+        archive = make_archive({
+            '001.png': make_image(),
+            '002.png': b'not an image',
+        })
+
+        with self.assertRaises(ValidationError):
+            ChapterIngestor('base', storage=self.storage).ingest_archive(io.BytesIO(archive))
+
+    def test_in_flight_pages_are_bounded(self):
+        """Test that no more than workers + upload_concurrency pages are read at once."""
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'peak': 0}
+        data = make_image()
+
+        class CountingStorage(FileSystemStorage):
+            def _save(self, name, content):
+                result = super()._save(name, content)
+                with lock:
+                    state['in_flight'] -= 1
+                return result
+
+        def read():
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            return data
+
+        progress = []
+        pages = ChapterIngestor(
+            'base', storage=CountingStorage(location=self.media_root),
+            workers=2, upload_concurrency=3, render_processes=0,
+            progress=lambda done, total: progress.append((done, total))
+        ).ingest([(f'{i:03}.png', read) for i in range(40)])
+
+        self.assertEqual(len(pages), 40)
+        self.assertLessEqual(state['peak'], 5)
+        self.assertEqual(progress[-1], (40, 40))
+
+    def test_derivatives(self):
+        """Test that downscaled WebP copies are rendered and stored next to the original."""
+        archive = make_archive({
+            '001.png': make_image(width=1200, height=1800),
+            '002.png': make_image(width=600, height=900),
+        })
+
+        pages = ChapterIngestor(
+            'base', storage=self.storage, derivative_widths=[480, 960, 1600], render_processes=1
+        ).ingest_archive(io.BytesIO(archive))
+
+        self.assertEqual(
+            [(v['width'], v['height'], v['mime_type']) for v in pages[0].variants],
+            [(960, 1440, 'image/webp'), (480, 720, 'image/webp')]
+        )
+        # Never upscaled
+        self.assertEqual([v['width'] for v in pages[1].variants], [480])
+        for variant in pages[0].variants:
+            self.assertEqual(variant['name'], f"base/{pages[0].digest}-{variant['width']}w.webp")
+            with self.storage.open(variant['name']) as fileobj:
+                self.assertEqual(probe_image(fileobj).size, (variant['width'], variant['height']))
+
+
+class ChapterProcessingTest(TestCase):
+    """Test cases for processing an uploaded chapter archive."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.series = Series.objects.create(title='Ingest Series')
+
+    def test_upload_creates_pages(self):
+        """Test that saving a chapter with an archive extracts its pages."""
+        upload = SimpleUploadedFile(
+            'chapter.zip',
+            make_archive({f'{i:02}.png': make_image() for i in range(1, 6)}),
+            content_type='application/zip'
+        )
+
+        with override_settings(MEDIA_ROOT=self.media_root, CHAPTER_PROCESSING_ASYNC=False):
+            chapter = Chapter.objects.create(
+                title='Chapter 1', number=1, series=self.series, file=upload
+            )
+
+        chapter.refresh_from_db()
+        self.assertFalse(chapter.file)
+        self.assertEqual(
+            list(chapter.pages.values_list('number', flat=True)), [1, 2, 3, 4, 5]
+        )
+        self.assertTrue(all(
+            name.startswith('series/ingest-series/vol0/ch1/')
+            for name in chapter.pages.values_list('image', flat=True)
+        ))
+
+
+class GeneratePageVariantsTest(TestCase):
+    """Test the generate_page_variants backfill command."""
+
+    def setUp(self):
+        """Set up a page without variants."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, PAGE_DERIVATIVE_WIDTHS=[480])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        chapter = Chapter.objects.create(
+            title='Chapter 1', number=1, series=Series.objects.create(title='Backfill')
+        )
+        name = default_storage.save('series/backfill/ch1/abc.png', ContentFile(make_image(960, 1440)))
+        self.page = Page.objects.create(
+            chapter=chapter, number=1, image=name, width=960, height=1440, mime_type='image/png'
+        )
+
+    def test_backfill(self):
+        """Test that missing variants are generated and recorded."""
+        call_command('generate_page_variants', processes=1, stdout=io.StringIO())
+
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.variants, [{
+            'name': 'series/backfill/ch1/abc-480w.webp',
+            'width': 480, 'height': 720, 'mime_type': 'image/webp',
+        }])
+        self.assertTrue(default_storage.exists('series/backfill/ch1/abc-480w.webp'))
@@ -0,0 +1,101 @@
+"""
+Tests for the chapter processing queue.
+"""
+
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from reader.jobs import claim_next_chapter, requeue_stale_chapters, run_chapter_job
+from reader.models import Series, Chapter, ProcessingStatus
+from reader.tests.test_ingestion import make_archive, make_image
+
+
+class ChapterQueueTest(TestCase):
+    """Test cases for queued chapter processing."""
+
+    def setUp(self):
+        """Set up test data."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, CHAPTER_PROCESSING_ASYNC=True
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.series = Series.objects.create(title='Queue Series')
+
+    def create_chapter(self, members, number=1):
+        upload = SimpleUploadedFile(
+            'chapter.zip', make_archive(members), content_type='application/zip'
+        )
+        return Chapter.objects.create(
+            title=f'Chapter {number}', number=number, series=self.series, file=upload
+        )
+
+    def test_upload_is_queued(self):
+        """Test that saving a chapter queues it instead of processing it."""
+        chapter = self.create_chapter({'01.png': make_image()})
+
+        self.assertEqual(chapter.processing_status, ProcessingStatus.QUEUED)
+        self.assertEqual(chapter.pages.count(), 0)
+        self.assertTrue(chapter.file)
+
+    def test_worker_processes_queue(self):
+        """Test that the worker command extracts pages of queued chapters."""
+        chapter = self.create_chapter({f'{i:02}.png': make_image() for i in range(1, 4)})
+
+        call_command('process_chapters', '--once', stdout=StringIO())
+
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.processing_status, ProcessingStatus.DONE)
+        self.assertEqual(chapter.processing_attempts, 1)
+        self.assertEqual((chapter.pages_processed, chapter.pages_total), (3, 3))
+        self.assertEqual(chapter.pages.count(), 3)
+        self.assertFalse(chapter.file)
+
+    def test_claim_is_exclusive(self):
+        """Test that a claimed chapter cannot be claimed again."""
+        chapter = self.create_chapter({'01.png': make_image()})
+
+        self.assertEqual(claim_next_chapter().pk, chapter.pk)
+        self.assertIsNone(claim_next_chapter())
+
+    def test_failure_is_retried_then_failed(self):
+        """Test retry with backoff and the final failed state."""
+        chapter = self.create_chapter({'01.png': b'not an image'})
+
+        claimed = claim_next_chapter()
+        self.assertEqual(run_chapter_job(claimed, max_attempts=2, retry_delay=60), ProcessingStatus.QUEUED)
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.processing_attempts, 1)
+        self.assertGreater(chapter.process_after, now() + timedelta(seconds=30))
+        self.assertIn('Invalid image file', chapter.processing_error)
+
+        # Not due yet
+        self.assertIsNone(claim_next_chapter())
+
+        Chapter.objects.filter(pk=chapter.pk).update(process_after=now())
+        claimed = claim_next_chapter()
+        self.assertEqual(run_chapter_job(claimed, max_attempts=2), ProcessingStatus.FAILED)
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.processing_status, ProcessingStatus.FAILED)
+        self.assertTrue(chapter.file)  # Kept for a manual retry
+
+    def test_stale_jobs_are_requeued(self):
+        """Test that jobs abandoned by a dead worker return to the queue."""
+        chapter = self.create_chapter({'01.png': make_image()})
+        claim_next_chapter()
+        Chapter.objects.filter(pk=chapter.pk).update(
+            processing_started_at=now() - timedelta(hours=2)
+        )
+
+        self.assertEqual(requeue_stale_chapters(timedelta(minutes=30)), 1)
+        self.assertEqual(claim_next_chapter().pk, chapter.pk)
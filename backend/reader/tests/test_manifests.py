@@ -0,0 +1,233 @@
+"""
+Tests for the precomputed chapter page manifests.
+"""
+
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import manifests
+from reader.admin import ChapterAdmin
+from reader.models import ApprovalStatus, Chapter, Page, Series, Volume
+
+VARIANT = {'name': 'series/s/ch1/p1-480w.webp', 'width': 480, 'height': 720, 'mime_type': 'image/webp'}
+
+
+class ManifestTest(TestCase):
+    """Test building, storing and serving chapter manifests."""
+
+    def setUp(self):
+        """Set up a series with two approved chapters in temporary storage."""
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL_STRATEGY='proxy')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.client = APIClient()
+        self.series = Series.objects.create(title='Manifest Series')
+        # Refreshes scheduled in a transaction share one callback
+        with self.captureOnCommitCallbacks(execute=True):
+            volume = Volume.objects.create(series=self.series, number=1)
+            self.ch1 = self.create_chapter(1, volume)
+            Page.objects.create(
+                chapter=self.ch1, number=1, image='series/s/ch1/p1.jpg', width=1200, height=1800,
+                mime_type='image/jpeg', variants=[VARIANT]
+            )
+            Page.objects.create(
+                chapter=self.ch1, number=2, image='series/s/ch1/p2.jpg', width=2400, height=1800,
+                mime_type='image/jpeg', is_spread=True
+            )
+            self.ch2 = self.create_chapter(2, volume)
+            Page.objects.create(
+                chapter=self.ch2, number=1, image='series/s/ch2/p1.jpg', width=1200, height=1800,
+                mime_type='image/jpeg'
+            )
+
+    def create_chapter(self, number, volume, approval_status=ApprovalStatus.APPROVED):
+        return Chapter.objects.create(
+            title=f'Chapter {number}', number=number, series=self.series, volume=volume,
+            approval_status=approval_status
+        )
+
+    def stored_manifest(self, chapter):
+        chapter.refresh_from_db()
+        with default_storage.open(chapter.manifest) as stored:
+            return json.load(stored)
+
+    def test_manifest_contents(self):
+        """Test that a manifest holds the pages and the next chapter's first page."""
+        manifest = self.stored_manifest(self.ch1)
+
+        self.assertEqual(manifest['chapter']['id'], self.ch1.pk)
+        first, spread = manifest['pages']
+        self.assertEqual(first['url'], '/media/series/s/ch1/p1.jpg')
+        self.assertEqual((first['width'], first['height'], first['is_spread']), (1200, 1800, False))
+        self.assertEqual(first['variants'], [{
+            'url': '/media/series/s/ch1/p1-480w.webp', 'width': 480, 'height': 720, 'mime_type': 'image/webp'
+        }])
+        self.assertTrue(spread['is_spread'])
+        self.assertIsNone(manifest['prev_chapter'])
+        self.assertEqual(manifest['next_chapter']['id'], self.ch2.pk)
+        self.assertEqual(manifest['next_chapter']['first_page']['url'], '/media/series/s/ch2/p1.jpg')
+        self.assertEqual(
+            manifest['next_chapter']['manifest_url'],
+            reverse('reader:chapter-manifest', kwargs={'pk': self.ch2.pk})
+        )
+
+    def test_names_follow_content(self):
+        """Test that changing a chapter stores a new manifest and leaves unchanged ones alone."""
+        self.ch1.refresh_from_db()
+        self.ch2.refresh_from_db()
+        old_ch1, old_ch2 = self.ch1.manifest, self.ch2.manifest
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.filter(chapter=self.ch1, number=2).get().delete()
+
+        self.ch1.refresh_from_db()
+        self.ch2.refresh_from_db()
+        self.assertNotEqual(self.ch1.manifest, old_ch1)
+        self.assertEqual(self.ch2.manifest, old_ch2)
+        self.assertEqual(len(self.stored_manifest(self.ch1)['pages']), 1)
+        self.assertEqual(manifests.refresh_series_manifests([self.series.pk]), 0)
+
+    def test_approval_updates_neighbours(self):
+        """Test that approving a chapter gives it a manifest and links it from the previous one."""
+        with self.captureOnCommitCallbacks(execute=True):
+            ch3 = self.create_chapter(3, None, ApprovalStatus.PENDING)
+        ch3.refresh_from_db()
+        self.assertEqual(ch3.manifest, '')
+
+        admin = ChapterAdmin(Chapter, AdminSite())
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        admin.message_user = lambda *args, **kwargs: None
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.approve_chapters(request, Chapter.objects.filter(pk=ch3.pk))
+
+        self.assertEqual(self.stored_manifest(ch3)['prev_chapter']['id'], self.ch2.pk)
+        next_chapter = self.stored_manifest(self.ch2)['next_chapter']
+        self.assertEqual(next_chapter['id'], ch3.pk)
+        self.assertIsNone(next_chapter['first_page'])
+
+    def test_unapproved_chapter_loses_manifest(self):
+        """Test that a chapter taken back to pending has no manifest."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ch2.approval_status = ApprovalStatus.PENDING
+            self.ch2.save()
+
+        self.ch2.refresh_from_db()
+        self.assertEqual(self.ch2.manifest, '')
+        self.assertIsNone(self.stored_manifest(self.ch1)['next_chapter'])
+
+    def test_refreshes_are_coalesced_per_transaction(self):
+        """Test that the pages saved in one transaction refresh their chapter once."""
+        with mock.patch.object(manifests, '_refresh', wraps=manifests._refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for number in (3, 4, 5):
+                    Page.objects.create(
+                        chapter=self.ch1, number=number, image=f'series/s/ch1/p{number}.jpg', width=1200,
+                        height=1800, mime_type='image/jpeg'
+                    )
+
+        refresh.assert_called_once_with({self.series.pk: {self.ch1.pk}})
+        self.assertEqual(len(self.stored_manifest(self.ch1)['pages']), 5)
+
+    def test_page_change_rebuilds_neighbours_only(self):
+        """Test that a page change rebuilds its chapter and the chapters next to it."""
+        with self.captureOnCommitCallbacks(execute=True):
+            ch3 = self.create_chapter(3, None)
+            ch4 = self.create_chapter(4, None)
+
+        with mock.patch.object(
+            manifests, 'build_series_manifests', wraps=manifests.build_series_manifests
+        ) as build, self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(
+                chapter=ch3, number=1, image='series/s/ch3/p1.jpg', width=1200, height=1800,
+                mime_type='image/jpeg'
+            )
+
+        [call] = build.call_args_list
+        self.assertEqual(call.args[1], {self.ch2.pk, ch3.pk, ch4.pk})
+        first_page = self.stored_manifest(self.ch2)['next_chapter']['first_page']
+        self.assertEqual(first_page['url'], '/media/series/s/ch3/p1.jpg')
+
+    def test_moved_chapter_refreshes_old_neighbours(self):
+        """Test that moving a chapter relinks the chapters it used to sit between."""
+        with self.captureOnCommitCallbacks(execute=True):
+            ch3 = self.create_chapter(3, self.ch1.volume)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ch2.number = 4
+            self.ch2.save()
+
+        self.assertEqual(self.stored_manifest(self.ch1)['next_chapter']['id'], ch3.pk)
+        self.assertEqual(self.stored_manifest(ch3)['prev_chapter']['id'], self.ch1.pk)
+        self.assertEqual(self.stored_manifest(self.ch2)['prev_chapter']['id'], ch3.pk)
+
+    def test_deleted_chapter_refreshes_neighbours(self):
+        """Test that deleting a chapter relinks the chapters around it."""
+        with self.captureOnCommitCallbacks(execute=True):
+            ch3 = self.create_chapter(3, self.ch1.volume)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ch2.delete()
+
+        self.assertEqual(self.stored_manifest(self.ch1)['next_chapter']['id'], ch3.pk)
+        self.assertEqual(self.stored_manifest(ch3)['prev_chapter']['id'], self.ch1.pk)
+
+    def test_refresh_after_rolled_back_savepoint(self):
+        """Test that series scheduled after a rolled back savepoint are still refreshed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.ch2.title = 'Renamed'
+                self.ch2.save()
+                raise ValueError
+            Page.objects.create(
+                chapter=self.ch2, number=2, image='series/s/ch2/p2.jpg', width=1200, height=1800,
+                mime_type='image/jpeg'
+            )
+
+        self.assertEqual(len(self.stored_manifest(self.ch2)['pages']), 2)
+
+    def test_serve_manifest(self):
+        """Test that chapters link their manifest, which is cached for a year."""
+        url = self.client.get(reverse('reader:chapter-detail', kwargs={'pk': self.ch1.pk})).data['manifest_url']
+        self.assertRegex(url, r'/api/manifests/[0-9a-f]{32}\.json$')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['chapter']['id'], self.ch1.pk)
+
+    def test_manifest_endpoint_builds_missing_manifest(self):
+        """Test that the chapter endpoint builds a missing manifest and redirects to it."""
+        Chapter.objects.filter(pk=self.ch1.pk).update(manifest='')
+
+        with mock.patch.object(
+            manifests, 'build_series_manifests', wraps=manifests.build_series_manifests
+        ) as build:
+            response = self.client.get(reverse('reader:chapter-manifest', kwargs={'pk': self.ch1.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(build.call_args.args[1], {self.ch1.pk})
+        self.ch1.refresh_from_db()
+        self.assertTrue(response['Location'].endswith(manifests.manifest_url(self.ch1)))
+
+    def test_presigned_strategy_stores_proxy_urls(self):
+        """Test that manifests never contain presigned URLs, which would expire."""
+        with override_settings(MEDIA_URL_STRATEGY='presigned'):
+            content = manifests.build_series_manifests(self.series.pk)[self.ch1.pk]
+        self.assertEqual(json.loads(content)['pages'][0]['url'], '/media/series/s/ch1/p1.jpg')
@@ -0,0 +1,160 @@
+"""
+Tests for streaming media responses.
+"""
+
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase
+
+from reader.media import RangeNotSatisfiable, parse_range, serve_media
+from reader.tests.fakes import FakeS3Storage
+
+DATA = bytes(range(256)) * 40
+
+
+def content_of(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class ParseRangeTest(SimpleTestCase):
+    """Test parsing of Range headers."""
+
+    def test_ranges(self):
+        """Test the supported range forms."""
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=500-5000', 1000), (500, 999))
+
+    def test_ignored_ranges(self):
+        """Test that malformed and multi-range headers serve the whole file."""
+        for header in ('', 'items=0-1', 'bytes=0-1,5-6', 'bytes=abc', 'bytes=9-1'):
+            self.assertIsNone(parse_range(header, 1000))
+
+    def test_unsatisfiable(self):
+        """Test that a range past the end of the file is rejected."""
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=-0', 1000)
+
+
+class LocalMediaTest(SimpleTestCase):
+    """Test serving media from the local filesystem."""
+
+    def setUp(self):
+        """Set up a temporary storage with one file."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = FileSystemStorage(location=self.root)
+        self.name = self.storage.save('series/page.jpg', ContentFile(DATA))
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        return serve_media(self.factory.get('/media/x', **headers), self.name, self.storage)
+
+    def test_full_file(self):
+        """Test that the whole file is returned as a FileResponse."""
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertEqual(content_of(response), DATA)
+        response.file_to_stream.close()
+
+    def test_range(self):
+        """Test that a Range request returns 206 with the requested bytes."""
+        response = self.serve(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(DATA)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(content_of(response), DATA[100:200])
+
+    def test_if_range(self):
+        """Test that a stale If-Range serves the whole file."""
+        etag = self.serve()['ETag']
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.file_to_stream.close()
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end returns 416."""
+        response = self.serve(HTTP_RANGE=f'bytes={len(DATA)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(DATA)}')
+
+    def test_if_none_match(self):
+        """Test that a matching ETag returns 304."""
+        etag = self.serve()['ETag']
+        response = self.serve(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_unsafe_paths(self):
+        """Test that missing files and paths outside the root return 404."""
+        factory_request = self.factory.get('/media/x')
+        for name in ('series/missing.jpg', '../outside.jpg', 'series'):
+            with self.assertRaises(Http404):
+                serve_media(factory_request, name, self.storage)
+
+
+class S3MediaTest(SimpleTestCase):
+    """Test proxying media from S3-compatible storage."""
+
+    def setUp(self):
+        """Set up a fake bucket with one object."""
+        self.storage = FakeS3Storage()
+        self.storage.put('series/page.png', DATA)
+        self.storage.client.calls.clear()
+        self.factory = RequestFactory()
+
+    def serve(self, method='get', **headers):
+        request = getattr(self.factory, method)('/media/x', **headers)
+        return serve_media(request, 'series/page.png', self.storage)
+
+    def test_streams_with_single_request(self):
+        """Test that the object is streamed from one GetObject call."""
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(DATA)))
+        self.assertEqual(content_of(response), DATA)
+        self.assertEqual(self.storage.client.calls, [('get_object', 'media/series/page.png')])
+
+    def test_range(self):
+        """Test that ranges are passed through to the bucket."""
+        response = self.serve(HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {len(DATA) - 10}-{len(DATA) - 1}/{len(DATA)}')
+        self.assertEqual(content_of(response), DATA[-10:])
+
+    def test_stale_if_range_fetches_whole_object(self):
+        """Test that a failed If-Range precondition serves the whole object."""
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content_of(response), DATA)
+
+    def test_if_none_match(self):
+        """Test that a matching ETag returns 304."""
+        etag = self.serve(method='head')['ETag']
+        response = self.serve(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_missing_object(self):
+        """Test that a missing object returns 404."""
+        with self.assertRaises(Http404):
+            serve_media(self.factory.get('/media/x'), 'series/missing.png', self.storage)
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end returns 416."""
+        response = self.serve(HTTP_RANGE=f'bytes={len(DATA)}-')
+        self.assertEqual(response.status_code, 416)
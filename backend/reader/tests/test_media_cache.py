@@ -0,0 +1,191 @@
+"""
+Tests for the local media cache in front of Tigris storage.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from reader.media import serve_media
+from reader.media_cache import DiskCache
+from reader.tests.fakes import FakeS3Storage
+
+# Content-addressed, so the cache accepts it
+PAGE = 'series/s/ch1/0123456789abcdef0123456789abcdef.jpg'
+
+
+class DiskCacheTest(SimpleTestCase):
+    """Test the size-bounded LRU disk cache."""
+
+    def setUp(self):
+        """Set up an empty cache directory."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cache.clear()
+
+    def test_store_and_open(self):
+        """Test that stored entries are read back and counted as hits."""
+        disk_cache = DiskCache(self.directory, max_size=1024)
+        self.assertIsNone(disk_cache.open('series/a.jpg'))
+        disk_cache.store('series/a.jpg', [b'abc', b'def']).close()
+
+        with disk_cache.open('series/a.jpg') as fileobj:
+            self.assertEqual(fileobj.read(), b'abcdef')
+        self.assertEqual(disk_cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'bypasses': 0})
+
+    def test_failed_write_leaves_no_entry(self):
+        """Test that an interrupted download is not visible in the cache."""
+        disk_cache = DiskCache(self.directory, max_size=1024)
+
+        def chunks():
+            yield b'partial'
+            raise OSError('connection reset')
+
+        with self.assertRaises(OSError):
+            disk_cache.store('series/a.jpg', chunks())
+        self.assertIsNone(disk_cache.open('series/a.jpg'))
+        self.assertEqual(disk_cache.usage(), (0, 0))
+
+    def test_evicts_least_recently_used(self):
+        """Test that eviction removes the entries used longest ago."""
+        disk_cache = DiskCache(self.directory, max_size=1000, evict_to=0.5)
+        for index in range(4):
+            disk_cache.store(f'page{index}.jpg', [b'x' * 200]).close()
+            # Distinct access times, oldest first
+            os.utime(disk_cache.path_for(f'page{index}.jpg'), (index, index))
+        disk_cache.open('page0.jpg').close()
+
+        disk_cache.store('page4.jpg', [b'x' * 200]).close()
+        disk_cache.store('page5.jpg', [b'x' * 200]).close()
+        disk_cache.evict()
+
+        entries, size = disk_cache.usage()
+        self.assertLessEqual(size, 500)
+        self.assertIsNone(disk_cache.open('page1.jpg'))
+        self.assertIsNotNone(disk_cache.open('page0.jpg'))
+        self.assertGreater(disk_cache.stats()['evictions'], 0)
+
+    def test_concurrent_writers(self):
+        """Test that concurrent stores of one entry leave a complete file."""
+        disk_cache = DiskCache(self.directory, max_size=10 * 1024 ** 2)
+        data = os.urandom(256 * 1024)
+
+        def store(_):
+            fileobj = disk_cache.store('series/page.jpg', [data[i:i + 4096] for i in range(0, len(data), 4096)])
+            with fileobj:
+                return fileobj.read()
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(store, range(16)))
+        self.assertTrue(all(result == data for result in results))
+        with disk_cache.open('series/page.jpg') as fileobj:
+            self.assertEqual(fileobj.read(), data)
+        self.assertEqual(disk_cache.usage(), (1, len(data)))
+
+
+class CachedTigrisStorageTest(SimpleTestCase):
+    """Test reading Tigris objects through the media cache."""
+
+    def setUp(self):
+        """Set up a fake bucket and a cache directory."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cache.clear()
+        overrides = override_settings(
+            MEDIA_CACHE_DIR=self.directory,
+            MEDIA_CACHE_MAX_SIZE=1024 ** 2,
+            MEDIA_CACHE_MAX_OBJECT_SIZE=64 * 1024,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.storage = FakeS3Storage()
+        self.storage.put(PAGE, b'page image')
+        self.storage.client.calls.clear()
+
+    def test_open_reads_through(self):
+        """Test that only the first open fetches the object from the bucket."""
+        for _ in range(3):
+            with self.storage.open(PAGE) as fileobj:
+                self.assertEqual(fileobj.read(), b'page image')
+        self.assertEqual(self.storage.client.calls, [('get_object', 'media/' + PAGE)])
+        self.assertEqual(self.storage.media_cache.stats()['hits'], 2)
+
+    def test_serve_media_uses_cache(self):
+        """Test that media requests are served from the cached copy."""
+        factory = RequestFactory()
+        first = serve_media(factory.get('/media/x'), PAGE, self.storage)
+        second = serve_media(factory.get('/media/x'), PAGE, self.storage)
+        self.assertEqual(first['X-Media-Cache'], 'MISS')
+        self.assertEqual(second['X-Media-Cache'], 'HIT')
+        self.assertEqual(b''.join(second.streaming_content), b'page image')
+        self.assertEqual(first['ETag'], second['ETag'])
+        for response in (first, second):
+            response.file_to_stream.close()
+
+        ranged = serve_media(factory.get('/media/x', HTTP_RANGE='bytes=0-3'), PAGE, self.storage)
+        self.assertEqual(ranged.status_code, 206)
+        self.assertEqual(b''.join(ranged.streaming_content), b'page')
+        self.assertEqual(len(self.storage.client.calls), 1)
+
+    def test_large_objects_bypass_cache(self):
+        """Test that objects above the size limit are streamed from the bucket."""
+        self.storage.put('series/s/ch1/fedcba9876543210fedcba9876543210.jpg', b'x' * (128 * 1024))
+        response = serve_media(RequestFactory().get('/media/x'), 'series/s/ch1/fedcba9876543210fedcba9876543210.jpg', self.storage)
+        self.assertNotIn('X-Media-Cache', response)
+        self.assertEqual(len(b''.join(response.streaming_content)), 128 * 1024)
+        self.assertEqual(self.storage.media_cache.stats()['bypasses'], 1)
+
+    def test_missing_object(self):
+        """Test that a missing object is not cached."""
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open_cached('series/s/ch1/00000000000000000000000000000000.jpg')
+
+    def test_reused_names_bypass_cache(self):
+        """Test that objects whose names don't follow their content are read from the bucket."""
+        self.storage.put('series/s/cover.jpg', b'old cover')
+        self.assertIsNone(self.storage.open_cached('series/s/cover.jpg'))
+
+        self.storage.put('series/s/cover.jpg', b'new cover')
+        response = serve_media(RequestFactory().get('/media/x'), 'series/s/cover.jpg', self.storage)
+        self.assertNotIn('X-Media-Cache', response)
+        self.assertEqual(b''.join(response.streaming_content), b'new cover')
+        self.assertFalse(os.path.exists(self.storage.media_cache.path_for('series/s/cover.jpg')))
+
+    def test_accepts_content_addressed_names(self):
+        """Test that pages, variants, covers, thumbnails and manifests are cached."""
+        digest = '0123456789abcdef0123456789abcdef'
+        for name in [
+            f'series/s/ch1/{digest}.png', f'series/s/ch1/{digest}-480w.webp', f'series/s/cover-{digest}.jpg',
+            f'thumbnails/100w/series/s/cover-{digest}.jpg.webp', f'manifests/{digest}.json',
+        ]:
+            with self.subTest(name=name):
+                self.assertTrue(DiskCache.accepts(name))
+        for name in ['series/s/cover.jpg', 'thumbnails/100w/series/s/cover.jpg.webp', f'series/s/{digest}0.png']:
+            with self.subTest(name=name):
+                self.assertFalse(DiskCache.accepts(name))
+
+    def test_head_miss_is_not_downloaded(self):
+        """Test that a HEAD request missing the cache asks the bucket for the headers only."""
+        response = serve_media(RequestFactory().head('/media/x'), PAGE, self.storage)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(b'page image')))
+        self.assertNotIn('X-Media-Cache', response)
+        self.assertEqual([call for call, _ in self.storage.client.calls], ['head_object'])
+        self.assertFalse(os.path.exists(self.storage.media_cache.path_for(PAGE)))
+
+    def test_stats_command(self):
+        """Test that the media_cache command reports the counters."""
+        self.storage.open(PAGE).close()
+        self.storage.media_cache.flush_stats()
+        out = StringIO()
+        call_command('media_cache', stdout=out)
+        self.assertIn('Misses:    1', out.getvalue())
+        self.assertIn('Entries:   1', out.getvalue())
@@ -0,0 +1,248 @@
+"""
+Tests for the asynchronous media proxy.
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from reader.media import CHUNK_SIZE
+from reader.media_proxy import MediaProxy
+from reader.tests.fakes import FakeS3Storage, s3_transport
+
+DATA = bytes(range(256)) * 1000
+# Content-addressed, so the media cache accepts it
+PAGE = 'series/s/ch1/0123456789abcdef0123456789abcdef.jpg'
+PAGE_URL = '/media/' + PAGE
+
+
+async def fallback_app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 299, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'django'})
+
+
+def call(app, path, method='GET', **headers):
+    """Send a request to an ASGI app; returns ``(status, headers, body, chunks)``."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'headers': [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, bodies = messages[0], messages[1:]
+    response_headers = {key.decode(): value.decode() for key, value in start['headers']}
+    chunks = [message['body'] for message in bodies if message['body']]
+    return start['status'], response_headers, b''.join(chunks), chunks
+
+
+class MediaProxyTest(SimpleTestCase):
+    """Test streaming media objects from S3 storage on the event loop."""
+
+    def setUp(self):
+        """Set up a proxy over storage holding one page image."""
+        self.storage = FakeS3Storage()
+        self.storage.put(PAGE, DATA)
+        self.s3 = self.storage.client
+        self.proxy = MediaProxy(
+            fallback_app, storage=self.storage,
+            client=httpx.AsyncClient(transport=s3_transport(self.s3)),
+        )
+
+    def test_streams_object(self):
+        """Test that the object is streamed in chunks with the caching headers."""
+        status, headers, body, chunks = call(self.proxy, PAGE_URL)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, DATA)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(headers['content-type'], 'image/jpeg')
+        self.assertEqual(headers['content-length'], str(len(DATA)))
+        self.assertEqual(headers['cache-control'], 'public, max-age=86400')
+        self.assertEqual(headers['accept-ranges'], 'bytes')
+        self.assertIn('etag', headers)
+        self.assertEqual(
+            [call for call in self.s3.calls if call[0] == 'get_object'],
+            [('get_object', 'media/' + PAGE)]
+        )
+
+    def test_head(self):
+        """Test that HEAD requests return the headers without a body."""
+        status, headers, body, _ = call(self.proxy, PAGE_URL, method='HEAD')
+
+        self.assertEqual((status, body), (200, b''))
+        self.assertEqual(headers['content-length'], str(len(DATA)))
+
+    def test_range(self):
+        """Test that ranges are passed through to the bucket."""
+        status, headers, body, _ = call(self.proxy, PAGE_URL, Range='bytes=10-19')
+
+        self.assertEqual(status, 206)
+        self.assertEqual(body, DATA[10:20])
+        self.assertEqual(headers['content-range'], f'bytes 10-19/{len(DATA)}')
+
+    def test_stale_if_range_fetches_whole_object(self):
+        """Test that a failed If-Range precondition returns the whole object."""
+        status, _, body, _ = call(
+            self.proxy, PAGE_URL, Range='bytes=10-19', **{'If-Range': '"stale"'}
+        )
+
+        self.assertEqual((status, body), (200, DATA))
+
+    def test_if_none_match(self):
+        """Test that a matching ETag gets a 304."""
+        _, headers, _, _ = call(self.proxy, PAGE_URL)
+        status, not_modified, body, _ = call(
+            self.proxy, PAGE_URL, **{'If-None-Match': headers['etag']}
+        )
+
+        self.assertEqual((status, body), (304, b''))
+        self.assertEqual(not_modified['etag'], headers['etag'])
+
+    def test_missing_and_unsafe_names(self):
+        """Test that missing objects and paths outside the storage are not found."""
+        self.assertEqual(call(self.proxy, '/media/series/missing.jpg')[0], 404)
+        self.assertEqual(call(self.proxy, '/media/../secret')[0], 404)
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end of the object is rejected."""
+        status, headers, _, _ = call(self.proxy, PAGE_URL, Range='bytes=999999-')
+
+        self.assertEqual(status, 416)
+        self.assertEqual(headers['content-range'], 'bytes */*')
+
+    def test_other_requests_go_to_django(self):
+        """Test that requests other than media GET/HEAD are passed on."""
+        self.assertEqual(call(self.proxy, '/api/series/')[2], b'django')
+        self.assertEqual(call(self.proxy, PAGE_URL, method='POST')[2], b'django')
+
+    @override_settings(
+        CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['https://manga.kg'],
+        SECURE_REFERRER_POLICY='same-origin', X_FRAME_OPTIONS='DENY',
+    )
+    def test_middleware_headers(self):
+        """Test that proxied responses get the CORS and security headers Django would add."""
+        status, headers, _, _ = call(self.proxy, PAGE_URL, Origin='https://manga.kg')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['access-control-allow-origin'], 'https://manga.kg')
+        self.assertEqual(headers['vary'], 'origin')
+        self.assertEqual(headers['referrer-policy'], 'same-origin')
+        self.assertEqual(headers['x-frame-options'], 'DENY')
+        self.assertEqual(headers['x-content-type-options'], 'nosniff')
+
+        _, headers, _, _ = call(self.proxy, '/media/series/missing.jpg', Origin='https://elsewhere.example')
+        self.assertNotIn('access-control-allow-origin', headers)
+        self.assertEqual(headers['x-frame-options'], 'DENY')
+
+    @override_settings(ASGI_DJANGO_CONCURRENCY=2)
+    def test_django_requests_are_limited(self):
+        """Test that at most ASGI_DJANGO_CONCURRENCY requests reach Django at once."""
+        running, peak = 0, 0
+
+        async def app(scope, receive, send):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            await fallback_app(scope, receive, send)
+
+        proxy = MediaProxy(app, storage=self.storage)
+
+        async def requests():
+            return await asyncio.gather(*(proxy(
+                {'type': 'http', 'method': 'GET', 'path': '/api/series/', 'headers': []},
+                None, lambda message: asyncio.sleep(0),
+            ) for _ in range(6)))
+
+        asyncio.run(requests())
+        self.assertEqual(peak, 2)
+
+    def cached_proxy(self):
+        """Return a proxy over storage with the media cache enabled."""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        overrides = override_settings(MEDIA_CACHE_DIR=cache_dir, MEDIA_CACHE_MAX_SIZE=10 * 1024 ** 2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        storage = FakeS3Storage(client=self.s3)
+        return MediaProxy(
+            fallback_app, storage=storage, client=httpx.AsyncClient(transport=s3_transport(self.s3))
+        )
+
+    def test_cache_fill(self):
+        """Test that misses are written to the media cache and hits served from it."""
+        proxy = self.cached_proxy()
+        status, headers, body, _ = call(proxy, PAGE_URL)
+        self.assertEqual((status, body, headers['x-media-cache']), (200, DATA, 'MISS'))
+        media_cache = proxy.storage.media_cache
+        with open(media_cache.path_for(PAGE), 'rb') as cached:
+            self.assertEqual(cached.read(), DATA)
+        self.assertFalse([name for name in os.listdir(media_cache.directory) if name.startswith('.tmp-')])
+
+        fetches = len(self.s3.calls)
+        status, headers, body, chunks = call(proxy, PAGE_URL)
+        self.assertEqual((status, body, headers['x-media-cache']), (200, DATA, 'HIT'))
+        self.assertEqual(headers['content-length'], str(len(DATA)))
+        self.assertEqual(headers['cache-control'], 'public, max-age=86400')
+        # Streamed in chunks rather than read whole
+        self.assertEqual(max(len(chunk) for chunk in chunks), CHUNK_SIZE)
+        self.assertEqual(len(self.s3.calls), fetches)
+
+    def test_cache_hit_range_and_conditionals(self):
+        """Test that hits honour ranges and conditional requests."""
+        proxy = self.cached_proxy()
+        call(proxy, PAGE_URL)
+
+        status, headers, body, _ = call(proxy, PAGE_URL, Range='bytes=10-19')
+        self.assertEqual((status, body), (206, DATA[10:20]))
+        self.assertEqual(headers['content-range'], f'bytes 10-19/{len(DATA)}')
+
+        status, _, body, _ = call(
+            proxy, PAGE_URL, Range='bytes=10-19', **{'If-Range': '"stale"'}
+        )
+        self.assertEqual((status, body), (200, DATA))
+
+        status, not_modified, body, _ = call(
+            proxy, PAGE_URL, **{'If-None-Match': headers['etag']}
+        )
+        self.assertEqual((status, body, not_modified['etag']), (304, b'', headers['etag']))
+
+        status, headers, _, _ = call(proxy, PAGE_URL, Range='bytes=999999-')
+        self.assertEqual((status, headers['content-range']), (416, f'bytes */{len(DATA)}'))
+
+    def test_reused_names_are_not_cached(self):
+        """Test that objects whose names don't follow their content are always fetched."""
+        proxy = self.cached_proxy()
+        self.storage.put('series/s/cover.jpg', b'old cover')
+        call(proxy, '/media/series/s/cover.jpg')
+        self.storage.put('series/s/cover.jpg', b'new cover')
+
+        status, headers, body, _ = call(proxy, '/media/series/s/cover.jpg')
+        self.assertEqual((status, body), (200, b'new cover'))
+        self.assertNotIn('x-media-cache', headers)
+        self.assertFalse(os.path.exists(proxy.storage.media_cache.path_for('series/s/cover.jpg')))
+
+    def test_lifespan(self):
+        """Test that lifespan events are answered instead of reaching Django."""
+        events = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(events)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.proxy({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -0,0 +1,101 @@
+"""
+Tests for the media URL strategies of the API.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reader import media_urls
+from reader.media_urls import media_url, presigned_url
+from reader.models import Series
+from reader.tests.fakes import FakeS3Storage
+
+
+class MediaUrlTest(SimpleTestCase):
+    """Test building media URLs for each strategy."""
+
+    def setUp(self):
+        """Set up S3 storage and clear the presigned URL cache."""
+        media_urls._presign.cache_clear()
+        self.storage = FakeS3Storage()
+        self.request = RequestFactory().get('/api/series/')
+
+    def presign_calls(self):
+        return [call for call in self.storage.client.calls if call[0] == 'generate_presigned_url']
+
+    @override_settings(MEDIA_URL_STRATEGY='proxy')
+    def test_proxy(self):
+        """Test that proxied URLs point at the media view."""
+        self.assertEqual(media_url('series/1/cover.jpg', storage=self.storage), '/media/series/1/cover.jpg')
+        self.assertEqual(
+            media_url('series/1/cover.jpg', self.request, self.storage),
+            'http://testserver/media/series/1/cover.jpg'
+        )
+
+    @override_settings(MEDIA_URL_STRATEGY='direct', AWS_S3_CUSTOM_DOMAIN='cdn.example.com')
+    def test_direct(self):
+        """Test that direct URLs point at the CDN domain."""
+        storage = FakeS3Storage()
+        self.assertEqual(
+            media_url('series/1/cover.jpg', self.request, storage),
+            'https://cdn.example.com/media/series/1/cover.jpg'
+        )
+
+    @override_settings(MEDIA_URL_STRATEGY='presigned', MEDIA_URL_PRESIGN_EXPIRY=600)
+    def test_presigned(self):
+        """Test that presigned URLs are signed for the configured expiry."""
+        url = media_url('series/1/cover.jpg', self.request, self.storage)
+        self.assertEqual(url, 'https://s3.test/mangakg-media/media/series/1/cover.jpg?X-Amz-Expires=600')
+
+    @override_settings(MEDIA_URL_STRATEGY='presigned', MEDIA_URL_PRESIGN_EXPIRY=600)
+    def test_presigned_urls_are_reused_within_a_period(self):
+        """Test that each object is signed once per signing period."""
+        for now in (1200, 1250, 1499):
+            presigned_url('series/page.jpg', self.storage, now=now)
+        self.assertEqual(len(self.presign_calls()), 1)
+
+        presigned_url('series/page.jpg', self.storage, now=1500)
+        self.assertEqual(len(self.presign_calls()), 2)
+
+    @override_settings(MEDIA_URL_STRATEGY='presigned')
+    def test_presigned_falls_back_to_proxy_for_local_storage(self):
+        """Test that files outside S3 storage are still proxied."""
+        with mock.patch.object(media_urls, 'default_storage', object()):
+            self.assertEqual(media_url('series/1/cover.jpg'), '/media/series/1/cover.jpg')
+
+    @override_settings(MEDIA_URL_STRATEGY='cdn')
+    def test_unknown_strategy(self):
+        """Test that an unknown strategy is a configuration error."""
+        with self.assertRaises(ImproperlyConfigured):
+            media_url('series/1/cover.jpg', storage=self.storage)
+
+
+@override_settings(MEDIA_URL_STRATEGY='presigned', MEDIA_URL_PRESIGN_EXPIRY=600, API_CACHE_TIMEOUT=300)
+class PresignedResponseCacheTest(TestCase):
+    """Test that cached API responses follow the presigning period."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.client = APIClient()
+        Series.objects.create(title='Signed Series')
+        self.url = reverse('reader:series-list')
+
+    def get(self, now):
+        with mock.patch('reader.media_urls.time.time', return_value=now):
+            return self.client.get(self.url)
+
+    def test_new_period_replaces_cached_response(self):
+        """Test that a cached response is reused only within its signing period."""
+        first = self.get(1200)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.get(1499)['X-Cache'], 'HIT')
+
+        later = self.get(1500)
+        self.assertEqual(later['X-Cache'], 'MISS')
+        self.assertNotEqual(later['ETag'], first['ETag'])
@@ -2,9 +2,13 @@
 Unit tests for MangaKG reader models.
 """
 
-from django.test import TestCase
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import IntegrityError
 
 from reader.models import (
@@ -116,6 +120,22 @@ class SeriesModelTest(TestCase):
         self.assertIn(self.artist, series.artists.all())
         self.assertIn(self.category, series.categories.all())
 
+    def test_replaced_cover_gets_new_name(self):
+        """Test that cover names follow their content, so a new cover never reuses a name."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        series = Series.objects.create(title="Cover Series")
+
+        with override_settings(MEDIA_ROOT=media_root):
+            series.cover = SimpleUploadedFile('cover.jpg', b'first')
+            series.save()
+            first = series.cover.name
+            series.cover = SimpleUploadedFile('cover.jpg', b'second')
+            series.save()
+
+        self.assertRegex(first, r'^series/cover-series/cover-[0-9a-f]{32}\.jpg$')
+        self.assertNotEqual(series.cover.name, first)
+
 
 class VolumeModelTest(TestCase):
     """Test cases for Volume model."""
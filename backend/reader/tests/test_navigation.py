@@ -0,0 +1,119 @@
+"""
+Unit tests for chapter and page navigation.
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import navigation
+from reader.models import ApprovalStatus, Chapter, Page, Series, Volume
+
+
+class ChapterNavigationTest(TestCase):
+    """Test finding the chapters before and after a chapter."""
+
+    def setUp(self):
+        """Set up a series with two volumes and chapters outside any volume."""
+        cache.clear()
+        self.series = Series.objects.create(title='Navigation Series')
+        volume_1 = Volume.objects.create(series=self.series, number=1)
+        volume_2 = Volume.objects.create(series=self.series, number=2)
+        self.loose = self.create_chapter(9, None)
+        self.ch2 = self.create_chapter(2, volume_1)
+        self.ch1 = self.create_chapter(1, volume_1)
+        self.ch3 = self.create_chapter(3, volume_2)
+        self.pending = self.create_chapter(2.5, volume_1, ApprovalStatus.PENDING)
+
+    def create_chapter(self, number, volume, approval_status=ApprovalStatus.APPROVED):
+        return Chapter.objects.create(
+            title=f'Chapter {number}',
+            number=number,
+            series=self.series,
+            volume=volume,
+            approval_status=approval_status
+        )
+
+    def neighbour_ids(self, chapter):
+        return tuple(link.id if link else None for link in navigation.chapter_neighbours(chapter))
+
+    def test_reading_order(self):
+        """Test that chapters follow volume and chapter order, loose chapters last."""
+        ids, _ = navigation.chapter_sequence(self.series.pk)
+
+        self.assertEqual(ids, (self.ch1.pk, self.ch2.pk, self.ch3.pk, self.loose.pk))
+
+    def test_neighbours(self):
+        """Test neighbours in the middle and at both ends, skipping unapproved chapters."""
+        self.assertEqual(self.neighbour_ids(self.ch1), (None, self.ch2.pk))
+        self.assertEqual(self.neighbour_ids(self.ch2), (self.ch1.pk, self.ch3.pk))
+        self.assertEqual(self.neighbour_ids(self.loose), (self.ch3.pk, None))
+        self.assertEqual(self.neighbour_ids(self.pending), (None, None))
+
+    def test_sequence_is_cached(self):
+        """Test that repeated lookups run no queries."""
+        navigation.chapter_neighbours(self.ch2)
+
+        with CaptureQueriesContext(connection) as queries:
+            navigation.chapter_neighbours(self.ch3)
+        self.assertEqual(len(queries), 0)
+
+    def test_changes_invalidate_sequence(self):
+        """Test that approving a chapter adds it to the cached sequence."""
+        navigation.chapter_neighbours(self.ch2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pending.approval_status = ApprovalStatus.APPROVED
+            self.pending.save()
+
+        self.assertEqual(self.neighbour_ids(self.ch2), (self.ch1.pk, self.pending.pk))
+
+
+class PageNavigationTest(TestCase):
+    """Test finding the pages before and after a page."""
+
+    def test_page_neighbours(self):
+        """Test neighbours in the middle and at both ends of a chapter."""
+        series = Series.objects.create(title='Page Series')
+        chapter = Chapter.objects.create(title='Chapter 1', number=1, series=series)
+        pages = [
+            Page.objects.create(
+                chapter=chapter, number=number, image=f'p{number}.png', width=10, height=10
+            )
+            for number in (1, 2, 3)
+        ]
+
+        self.assertEqual(navigation.page_neighbours(pages[0]), (None, pages[1]))
+        self.assertEqual(navigation.page_neighbours(pages[1]), (pages[0], pages[2]))
+        self.assertEqual(navigation.page_neighbours(pages[2]), (pages[1], None))
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ChapterDetailNavigationTest(TestCase):
+    """Test the neighbours included in the chapter detail API."""
+
+    def test_prev_and_next_chapter(self):
+        """Test that chapter details link the previous and next chapters."""
+        cache.clear()
+        series = Series.objects.create(title='API Series')
+        chapters = [
+            Chapter.objects.create(
+                title=f'Chapter {number}',
+                number=number,
+                series=series,
+                approval_status=ApprovalStatus.APPROVED
+            )
+            for number in (1, 2)
+        ]
+
+        response = APIClient().get(reverse('reader:chapter-detail', kwargs={'pk': chapters[1].pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['prev_chapter'], {
+            'id': chapters[0].pk, 'title': 'Chapter 1', 'number': 1.0, 'volume_number': None
+        })
+        self.assertIsNone(response.data['next_chapter'])
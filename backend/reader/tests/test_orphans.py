@@ -0,0 +1,183 @@
+"""
+Tests for the storage garbage collector.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from reader import orphans
+from reader.models import Chapter, Page, PageBlob, Series
+from reader.tests.fakes import FakeS3Storage
+
+
+class BloomFilterTest(TestCase):
+    """Test cases for BloomFilter."""
+
+    def test_membership(self):
+        """Test that added items are always found and others rarely are."""
+        bloom = orphans.BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'series/a/{i}.png')
+
+        self.assertTrue(all(f'series/a/{i}.png' in bloom for i in range(1000)))
+        false_positives = sum(f'series/b/{i}.png' in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+class CollectTest(TestCase):
+    """Test cases for collecting unreferenced objects from S3 storage."""
+
+    def setUp(self):
+        """Set up referenced, orphaned and recent objects."""
+        self.storage = FakeS3Storage()
+        series = Series.objects.create(title='GC', cover='series/gc/cover.jpg')
+        chapter = Chapter.objects.create(title='Chapter 1', number=1, series=series)
+        Page.objects.create(
+            chapter=chapter, number=1, image='series/gc/vol0/ch1/page.png',
+            width=100, height=150, mime_type='image/png',
+            variants=[{'name': 'series/gc/vol0/ch1/page-480w.webp', 'width': 480,
+                       'height': 720, 'mime_type': 'image/webp'}],
+        )
+        PageBlob.objects.create(
+            digest='a' * 32, name='series/gc/vol0/ch2/stale.png', width=1, height=1,
+            mime_type='image/png'
+        )
+        PageBlob.objects.create(
+            digest='b' * 32, name='series/gc/vol0/ch2/pending.png', width=1, height=1,
+            mime_type='image/png'
+        )
+        PageBlob.objects.filter(pk='a' * 32).update(created_at=timezone.now() - timedelta(days=2))
+
+        for name in [
+            'series/gc/cover.jpg',
+            'series/gc/vol0/ch1/page.png',
+            'series/gc/vol0/ch1/page-480w.webp',
+            'series/gc/vol0/ch1/orphan.png',
+            'series/gc/vol0/ch2/stale.png',
+            'series/gc/vol0/ch2/pending.png',
+            'series/other/orphan.png',
+            'thumbnails/100w/series/gc/cover.jpg.webp',
+        ]:
+            self.age(name, timedelta(days=2))
+        self.age('series/gc/vol0/ch1/fresh.png', timedelta(minutes=5))
+
+    def age(self, name, age):
+        self.storage.put(name, b'x' * 10)
+        obj = self.storage.client.objects[self.storage._normalize_name(name)]
+        obj['last_modified'] = timezone.now() - age
+
+    def names(self):
+        return sorted(key[len('media/'):] for key in self.storage.client.objects)
+
+    def test_dry_run(self):
+        """Test that a dry run finds the orphans without deleting anything."""
+        found = []
+        result = orphans.collect(
+            self.storage, grace=timedelta(hours=1), dry_run=True,
+            on_orphan=lambda stored: found.append(stored.name)
+        )
+
+        self.assertEqual(sorted(found), [
+            'series/gc/vol0/ch1/orphan.png',
+            'series/gc/vol0/ch2/stale.png',
+            'series/other/orphan.png',
+        ])
+        self.assertEqual((result.scanned, result.recent, result.orphan_bytes), (8, 1, 30))
+        self.assertEqual(result.stale_blobs, 1)
+        self.assertEqual(len(self.names()), 9)
+        self.assertEqual(PageBlob.objects.count(), 2)
+
+    def test_collect(self):
+        """Test that orphans are deleted in batches, listing every series."""
+        self.storage.client.page_size = 2
+        result = orphans.collect(self.storage, grace=timedelta(hours=1), batch_size=2)
+
+        self.assertEqual((result.orphans, result.deleted, result.failed), (3, 3, 0))
+        self.assertEqual(self.names(), [
+            'series/gc/cover.jpg',
+            'series/gc/vol0/ch1/fresh.png',
+            'series/gc/vol0/ch1/page-480w.webp',
+            'series/gc/vol0/ch1/page.png',
+            'series/gc/vol0/ch2/pending.png',
+            'thumbnails/100w/series/gc/cover.jpg.webp',
+        ])
+        self.assertEqual(list(PageBlob.objects.values_list('pk', flat=True)), ['b' * 32])
+        deletes = [count for call, count in self.storage.client.calls if call == 'delete_objects']
+        self.assertEqual(sorted(deletes), [1, 2])
+
+    def test_bloom_filter(self):
+        """Test that collecting with a Bloom filter keeps every referenced object."""
+        result = orphans.collect(self.storage, grace=timedelta(hours=1), bloom=True)
+
+        self.assertLessEqual(result.deleted, 3)
+        self.assertTrue({
+            'series/gc/cover.jpg',
+            'series/gc/vol0/ch1/page.png',
+            'series/gc/vol0/ch1/page-480w.webp',
+            'series/gc/vol0/ch2/pending.png',
+        }.issubset(self.names()))
+
+    def test_collect_thumbnails(self):
+        """Test that thumbnails of unreferenced images are deleted and the rest kept."""
+        self.age('thumbnails/100w/series/gc/vol0/ch1/page.png.webp', timedelta(days=2))
+        self.age('thumbnails/100w/series/gc/old-cover.jpg.webp', timedelta(days=2))
+
+        result = orphans.collect(self.storage, prefix='thumbnails/', grace=timedelta(hours=1))
+
+        self.assertEqual((result.scanned, result.deleted), (3, 1))
+        self.assertNotIn('thumbnails/100w/series/gc/old-cover.jpg.webp', self.names())
+        self.assertIn('thumbnails/100w/series/gc/cover.jpg.webp', self.names())
+
+
+class GCStorageCommandTest(TestCase):
+    """Test the gc_storage command on local storage."""
+
+    def setUp(self):
+        """Set up a temporary media root."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_command(self):
+        """Test that old unreferenced files are deleted and the rest kept."""
+        chapter = Chapter.objects.create(
+            title='Chapter 1', number=1, series=Series.objects.create(title='Local')
+        )
+        Page.objects.create(
+            chapter=chapter, number=1, image='series/local/page.png',
+            width=1, height=1, mime_type='image/png'
+        )
+        old = time.time() - 3 * 24 * 3600
+        for name in [
+            'series/local/page.png', 'series/local/orphan.png', 'series/local/fresh.png',
+            'thumbnails/200w/series/local/page.png.webp', 'thumbnails/200w/series/local/orphan.png.webp',
+        ]:
+            default_storage.save(name, ContentFile(b'data'))
+            if name != 'series/local/fresh.png':
+                os.utime(default_storage.path(name), (old, old))
+
+        out = io.StringIO()
+        call_command('gc_storage', dry_run=True, stdout=out)
+        self.assertIn('Would delete 1 object(s)', out.getvalue())
+        self.assertTrue(default_storage.exists('series/local/orphan.png'))
+
+        out = io.StringIO()
+        call_command('gc_storage', stdout=out)
+        self.assertIn('Deleted 1 object(s)', out.getvalue())
+        self.assertFalse(default_storage.exists('series/local/orphan.png'))
+        self.assertTrue(default_storage.exists('series/local/page.png'))
+        self.assertTrue(default_storage.exists('series/local/fresh.png'))
+        self.assertFalse(default_storage.exists('thumbnails/200w/series/local/orphan.png.webp'))
+        self.assertTrue(default_storage.exists('thumbnails/200w/series/local/page.png.webp'))
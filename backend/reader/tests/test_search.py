@@ -0,0 +1,141 @@
+"""
+Unit tests for the series full-text search index.
+"""
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import search
+from reader.models import Alias, Artist, Author, SearchDocument, Series
+
+
+class NormalizeTest(SimpleTestCase):
+    """Test normalization of indexed text and queries."""
+
+    def test_case_folds_cyrillic(self):
+        """Test that Cyrillic and Kyrgyz letters are case-folded."""
+        self.assertEqual(search.normalize('ӨМҮР Жолу'), 'өмүр жолу')
+
+    def test_folds_yo(self):
+        """Test that ё matches е."""
+        self.assertEqual(search.normalize('Ёлка'), 'елка')
+
+    def test_tokens_drop_punctuation(self):
+        """Test that query syntax characters are not passed through."""
+        self.assertEqual(search.tokens('"moon" OR* (sky)'), ['moon', 'or', 'sky'])
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class SeriesSearchTest(TestCase):
+    """Test searching series through the API and keeping the index current."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.client = APIClient()
+        self.author = Author.objects.create(name='Чыңгыз Айтматов')
+        self.artist = Artist.objects.create(name='Jane Ink')
+        self.series = Series.objects.create(
+            title='Жамийла', description='Повесть о любви в горах'
+        )
+        self.series.authors.add(self.author)
+        self.series.artists.add(self.artist)
+        self.other = Series.objects.create(
+            title='Moon Blade', description='A swordsman mentions Жамийла once.'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('reader:series-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data['results']]
+
+    def test_search_by_title_prefix(self):
+        """Test that query terms match word prefixes, ignoring case."""
+        self.assertEqual(self.search('moo'), ['Moon Blade'])
+        self.assertEqual(self.search('ЖАМИЙ'), ['Жамийла', 'Moon Blade'])
+
+    def test_title_matches_rank_first(self):
+        """Test that title matches outrank description matches."""
+        self.assertEqual(self.search('жамийла')[0], 'Жамийла')
+
+    def test_explicit_ordering_overrides_rank(self):
+        """Test that ?ordering still applies to search results."""
+        self.assertEqual(self.search('жамийла', ordering='title'), ['Moon Blade', 'Жамийла'])
+
+    def test_all_terms_must_match(self):
+        """Test that every term of the query must appear."""
+        self.assertEqual(self.search('moon любви'), [])
+
+    def test_search_by_author_and_artist(self):
+        """Test that series are found by the names of their authors and artists."""
+        self.assertEqual(self.search('айтматов'), ['Жамийла'])
+        self.assertEqual(self.search('jane'), ['Жамийла'])
+
+    def test_renaming_author_updates_index(self):
+        """Test that renamed authors are searchable by their new name."""
+        self.author.name = 'Chingiz Aitmatov'
+        self.author.save()
+
+        self.assertEqual(self.search('aitmatov'), ['Жамийла'])
+        self.assertEqual(self.search('айтматов'), [])
+
+    def test_removing_author_updates_index(self):
+        """Test that series are no longer found by removed authors."""
+        self.author.series.remove(self.series)
+
+        self.assertEqual(self.search('айтматов'), [])
+
+    def test_deleting_artist_updates_index(self):
+        """Test that series are no longer found by deleted artists."""
+        self.artist.delete()
+
+        self.assertEqual(self.search('jane'), [])
+
+    def test_series_and_author_aliases(self):
+        """Test that series are found by their aliases and their authors' aliases."""
+        Alias.objects.create(name='Jamilia', content_object=self.series)
+        Alias.objects.create(name='Айтматов Чыңгыз Төрөкулович', content_object=self.author)
+
+        self.assertEqual(self.search('jamilia'), ['Жамийла'])
+        self.assertEqual(self.search('төрөкулович'), ['Жамийла'])
+
+        Alias.objects.get(name='Jamilia').delete()
+        self.assertEqual(self.search('jamilia'), [])
+
+    def test_deleting_series_removes_document(self):
+        """Test that a deleted series leaves no search document behind."""
+        Alias.objects.create(name='Jamilia', content_object=self.series)
+        self.series.delete()
+
+        self.assertFalse(SearchDocument.objects.filter(series_id=self.series.pk).exists())
+        self.assertEqual(self.search('jamilia'), [])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command recreates lost documents."""
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.search('moon'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Indexed 2 series', out.getvalue())
+        self.assertEqual(self.search('moon'), ['Moon Blade'])
+
+    def test_rebuild_keeps_documents(self):
+        """Test that series stay searchable while the index is rebuilt."""
+        index_series = search.index_series
+        counts = []
+
+        def index_batch(series_ids):
+            counts.append(SearchDocument.objects.count())
+            index_series(series_ids)
+
+        with mock.patch.object(search, 'index_series', side_effect=index_batch):
+            self.assertEqual(search.rebuild(batch_size=1), 2)
+        self.assertEqual(counts, [2, 2])
+        self.assertEqual(self.search('moon'), ['Moon Blade'])
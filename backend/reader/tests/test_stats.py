@@ -0,0 +1,179 @@
+"""
+Unit tests for the materialized series statistics.
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import stats as stats_module
+from reader.admin import ChapterAdmin
+from reader.models import ApprovalStatus, Chapter, Page, Series, SeriesStats
+
+
+class SeriesStatsTestCase(TestCase):
+    """Base class with a series and helpers to read its stats."""
+
+    def setUp(self):
+        self.series = Series.objects.create(title='Stats Series')
+
+    def create_chapter(self, number, approval_status=ApprovalStatus.APPROVED, **kwargs):
+        return Chapter.objects.create(
+            title=f'Chapter {number}',
+            number=number,
+            series=self.series,
+            approval_status=approval_status,
+            **kwargs
+        )
+
+    def create_page(self, chapter, number):
+        return Page.objects.create(
+            chapter=chapter, number=number, image=f'p{number}.png', width=10, height=10
+        )
+
+    def stats(self):
+        return SeriesStats.objects.get(series=self.series)
+
+
+class SeriesStatsSignalTest(SeriesStatsTestCase):
+    """Test that the stats follow changes to chapters and pages."""
+
+    def test_new_series(self):
+        """Test that new series get empty stats dated by their creation."""
+        stats = self.stats()
+
+        self.assertEqual((stats.chapter_count, stats.page_count, stats.views), (0, 0, 0))
+        self.assertIsNone(stats.latest_chapter)
+        self.assertEqual(stats.chapters_updated_at, self.series.created_at)
+
+    def test_approved_chapters_are_counted(self):
+        """Test that only approved chapters and their pages are counted."""
+        published_at = timezone.now() + timedelta(days=1)
+        latest = self.create_chapter(2, published_at=published_at)
+        self.create_page(latest, 1)
+        self.create_page(latest, 2)
+        self.create_page(self.create_chapter(1), 1)
+        self.create_page(self.create_chapter(3, ApprovalStatus.PENDING), 1)
+
+        stats = self.stats()
+        self.assertEqual((stats.chapter_count, stats.page_count), (2, 3))
+        self.assertEqual(stats.latest_chapter, latest)
+        self.assertEqual(stats.chapters_updated_at, published_at)
+
+    def test_approval_and_deletion(self):
+        """Test that approving and deleting chapters and pages update the stats."""
+        chapter = self.create_chapter(1, ApprovalStatus.PENDING)
+        page = self.create_page(chapter, 1)
+        self.assertEqual(self.stats().chapter_count, 0)
+
+        chapter.approval_status = ApprovalStatus.APPROVED
+        chapter.save()
+        self.assertEqual((self.stats().chapter_count, self.stats().page_count), (1, 1))
+
+        page.delete()
+        self.assertEqual(self.stats().page_count, 0)
+
+        chapter.delete()
+        self.assertEqual(self.stats().chapter_count, 0)
+        self.assertIsNone(self.stats().latest_chapter)
+
+    def test_admin_actions(self):
+        """Test that the bulk approve and reject actions update the stats."""
+        chapters = [self.create_chapter(number, ApprovalStatus.PENDING) for number in (1, 2)]
+        admin = ChapterAdmin(Chapter, AdminSite())
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        admin.message_user = lambda *args, **kwargs: None
+
+        admin.approve_chapters(request, Chapter.objects.filter(pk=chapters[0].pk))
+        self.assertEqual(self.stats().chapter_count, 1)
+
+        admin.reject_chapters(request, Chapter.objects.filter(pk=chapters[1].pk))
+        self.assertEqual(self.stats().chapter_count, 1)
+
+    def test_concurrent_refresh_of_new_stats(self):
+        """Test that stats created by another refresh meanwhile are updated, not duplicated."""
+        self.create_chapter(1)
+        SeriesStats.objects.all().delete()
+        compute = stats_module.compute_stats
+
+        def compute_after_other_refresh(series_ids, apps):
+            compute(series_ids, apps=apps)[0].save()
+            SeriesStats.objects.filter(series=self.series).update(chapter_count=5)
+            return compute(series_ids, apps=apps)
+
+        with mock.patch.object(stats_module, 'compute_stats', side_effect=compute_after_other_refresh):
+            with CaptureQueriesContext(connection) as queries:
+                stats_module.refresh_series_stats([self.series.pk])
+
+        self.assertEqual(self.stats().chapter_count, 1)
+        # Rows are never deleted, so views added meanwhile always find them
+        self.assertFalse([query for query in queries if query['sql'].startswith('DELETE')])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command recreates missing stats."""
+        self.create_chapter(1)
+        SeriesStats.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_series_stats', stdout=out)
+
+        self.assertEqual(self.stats().chapter_count, 1)
+        self.assertIn('1 series', out.getvalue())
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class SeriesStatsAPITest(SeriesStatsTestCase):
+    """Test the series list fields and orderings backed by the stats."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def test_list_fields(self):
+        """Test that the series list includes the stats."""
+        chapter = self.create_chapter(1)
+        self.create_page(chapter, 1)
+
+        response = self.client.get(reverse('reader:series-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data['results'][0]
+        self.assertEqual(item['chapter_count'], 1)
+        self.assertEqual(item['page_count'], 1)
+        self.assertEqual(item['views'], 0)
+        self.assertEqual(item['latest_chapter']['id'], chapter.pk)
+
+    def test_order_by_latest_chapter(self):
+        """Test listing the series with the newest chapters first."""
+        newer = Series.objects.create(title='Newer Series')
+        Chapter.objects.create(
+            title='Chapter 1', number=1, series=newer,
+            approval_status=ApprovalStatus.APPROVED,
+            published_at=timezone.now() - timedelta(days=1)
+        )
+        self.create_chapter(1, published_at=timezone.now() - timedelta(days=2))
+        # Updating the series doesn't change the order
+        self.series.save()
+
+        response = self.client.get(
+            reverse('reader:series-list'), {'ordering': '-chapters_updated_at'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [newer.pk, self.series.pk]
+        )
@@ -6,12 +6,14 @@ import os
 import tempfile
 from unittest.mock import Mock, patch, MagicMock
 from django.test import TestCase, override_settings
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.exceptions import ImproperlyConfigured
 from botocore.exceptions import ClientError, NoCredentialsError
 
 from reader.storage import TigrisMediaStorage
 from reader.models import Series, Chapter
+from reader.tests.fakes import FakeS3Storage
 
 
 class TigrisMediaStorageTest(TestCase):
@@ -267,4 +269,106 @@ class TigrisConfigurationTest(TestCase):
             
             # USE_TIGRIS should be False when no credentials are provided
             use_tigris = mock_getenv('AWS_ACCESS_KEY_ID') is not None
-            self.assertFalse(use_tigris)
\ No newline at end of file
+            self.assertFalse(use_tigris)
+
+
+class TigrisBatchOperationsTest(TestCase):
+    """Test cases for the batch operations of TigrisMediaStorage."""
+    
+    def setUp(self):
+        """Set up storage backed by an in-memory client."""
+        self.storage = FakeS3Storage()
+        self.client = self.storage.client
+    
+    def calls(self, operation):
+        return [call for call in self.client.calls if call[0] == operation]
+    
+    @override_settings(AWS_S3_MAX_POOL_CONNECTIONS=4, AWS_S3_BATCH_CONCURRENCY=8, AWS_S3_MAX_ATTEMPTS=3)
+    def test_client_config(self):
+        """Test that the client pool covers the batch concurrency and retries with backoff."""
+        storage = TigrisMediaStorage()
+        
+        self.assertEqual(storage.client_config.max_pool_connections, 8)
+        self.assertTrue(storage.client_config.tcp_keepalive)
+        self.assertEqual(storage.client_config.retries, {'mode': 'standard', 'max_attempts': 3})
+    
+    def test_save_many(self):
+        """Test that small files are saved with one request each, under available names."""
+        self.storage.put('series/a/1.png', b'old')
+        
+        names = self.storage.save_many([
+            ('series/a/1.png', ContentFile(b'one')),
+            ('series/a/2.png', ContentFile(b'two')),
+        ])
+        
+        self.assertEqual(names[1], 'series/a/2.png')
+        self.assertNotEqual(names[0], 'series/a/1.png')
+        self.assertEqual(self.client.objects[f'media/{names[0]}']['data'], b'one')
+        self.assertEqual(len(self.calls('put_object')), 3)
+        self.assertFalse(self.calls('upload_fileobj'))
+    
+    def test_save_many_overwrite(self):
+        """Test that overwriting skips the existence checks."""
+        self.storage.put('series/a/abc.png', b'same')
+        
+        names = self.storage.save_many([('series/a/abc.png', ContentFile(b'same'))], overwrite=True)
+        
+        self.assertEqual(names, ['series/a/abc.png'])
+        self.assertFalse(self.calls('head_object'))
+    
+    @override_settings(AWS_S3_MULTIPART_THRESHOLD=1024, AWS_S3_MULTIPART_CHUNKSIZE=512)
+    def test_save_many_multipart(self):
+        """Test that files over the threshold are uploaded in parts."""
+        storage = FakeS3Storage(client=self.client)
+        
+        storage.save_many([('series/a/big.png', ContentFile(b'x' * 1500))], overwrite=True)
+        
+        self.assertEqual(self.calls('upload_fileobj'), [('upload_fileobj', 'media/series/a/big.png', 3)])
+        self.assertEqual(len(self.client.objects['media/series/a/big.png']['data']), 1500)
+    
+    def test_save_many_client_error(self):
+        """Test that save errors are reported as a configuration problem."""
+        self.client.put_object = Mock(side_effect=ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'PutObject'
+        ))
+        
+        with self.assertRaises(ImproperlyConfigured):
+            self.storage.save_many([('series/a/1.png', ContentFile(b'one'))], overwrite=True)
+    
+    def test_exists_many(self):
+        """Test that existing names are found with concurrent HEAD requests."""
+        self.storage.put('series/a/1.png', b'one')
+        
+        existing = self.storage.exists_many(['series/a/1.png', 'series/a/2.png'])
+        
+        self.assertEqual(existing, {'series/a/1.png'})
+        self.assertEqual(len(self.calls('head_object')), 2)
+    
+    def test_delete_many(self):
+        """Test that objects are deleted in batches of the given size."""
+        for i in range(5):
+            self.storage.put(f'series/a/{i}.png', b'x')
+        
+        failed = self.storage.delete_many([f'series/a/{i}.png' for i in range(5)], batch_size=2)
+        
+        self.assertEqual(failed, [])
+        self.assertEqual(self.client.objects, {})
+        self.assertEqual([count for _, count in self.calls('delete_objects')], [2, 2, 1])
+    
+    @patch('reader.storage.time.sleep')
+    def test_delete_many_retries(self, mock_sleep):
+        """Test that transient per-key errors are retried and permanent ones reported."""
+        self.storage.put('series/a/1.png', b'x')
+        self.storage.put('series/a/2.png', b'x')
+        self.storage.put('series/a/3.png', b'x')
+        self.client.delete_errors = {
+            'media/series/a/1.png': ['SlowDown', 'InternalError'],
+            'media/series/a/2.png': ['AccessDenied'],
+        }
+        
+        failed = self.storage.delete_many(['series/a/1.png', 'series/a/2.png', 'series/a/3.png'])
+        
+        self.assertEqual(failed, ['series/a/2.png'])
+        self.assertEqual(list(self.client.objects), ['media/series/a/2.png'])
+        self.assertEqual([count for _, count in self.calls('delete_objects')], [3, 1, 1])
+        self.assertEqual(mock_sleep.call_count, 2)
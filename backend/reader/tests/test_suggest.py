@@ -0,0 +1,144 @@
+"""
+Unit tests for the typeahead suggestion index.
+"""
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import suggest
+from reader.models import Alias, Series
+from reader.suggest import SuggestIndex, transliterate
+
+
+class TransliterateTest(SimpleTestCase):
+    """Test the keys names are indexed under."""
+
+    def test_cyrillic_to_latin(self):
+        """Test that Russian and Kyrgyz letters are romanized."""
+        self.assertEqual(transliterate('Жамийла'), 'zhamiyla')
+        self.assertEqual(transliterate('Өмүр жолу'), 'omur zholu')
+        self.assertEqual(transliterate('Жаңы'), 'zhangy')
+
+    def test_diacritics_and_punctuation(self):
+        """Test that diacritics and punctuation are dropped."""
+        self.assertEqual(transliterate('Shōnen: Jump!'), 'shonen jump')
+
+
+class SuggestIndexTest(SimpleTestCase):
+    """Test lookups in the trigram index."""
+
+    def setUp(self):
+        """Build a small index."""
+        self.index = SuggestIndex()
+        self.index.add(1, 'Naruto', 'naruto', ['Наруто'])
+        self.index.add(2, 'One Piece', 'one-piece', ['Ван Пис'])
+        self.index.add(3, 'Манас', 'manas')
+        self.index.add(4, 'Naruto Gaiden', 'naruto-gaiden')
+
+    def titles(self, query, **kwargs):
+        return [result['title'] for result in self.index.suggest(query, **kwargs)]
+
+    def test_prefix(self):
+        """Test that title prefixes match, shorter titles first."""
+        self.assertEqual(self.titles('naru'), ['Naruto', 'Naruto Gaiden'])
+
+    def test_typo(self):
+        """Test that misspelled queries still match."""
+        self.assertEqual(self.titles('narto')[0], 'Naruto')
+        self.assertEqual(self.titles('one peice'), ['One Piece'])
+
+    def test_transliteration(self):
+        """Test that Latin queries find Cyrillic titles and the reverse."""
+        self.assertEqual(self.titles('manas'), ['Манас'])
+        self.assertEqual(self.titles('Нару')[0], 'Naruto')
+
+    def test_alias_match(self):
+        """Test that aliases are matched and reported."""
+        results = self.index.suggest('ван пис')
+        self.assertEqual(results[0]['title'], 'One Piece')
+        self.assertEqual(results[0]['match'], 'Ван Пис')
+
+    def test_short_and_unrelated_queries(self):
+        """Test that one-letter and unrelated queries return nothing."""
+        self.assertEqual(self.titles('n'), [])
+        self.assertEqual(self.titles('berserk'), [])
+
+    def test_limit(self):
+        """Test that results are capped at the limit."""
+        self.assertEqual(len(self.titles('naruto', limit=1)), 1)
+
+    def test_remove(self):
+        """Test that removed series are no longer suggested."""
+        self.index.remove(1)
+
+        self.assertEqual(self.titles('naruto'), ['Naruto Gaiden'])
+        self.assertFalse(any(1 in ids for ids in self.index.postings.values()))
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class SuggestAPITest(TestCase):
+    """Test the /api/series/suggest/ endpoint."""
+
+    def setUp(self):
+        """Set up test data and start from an unloaded index."""
+        cache.clear()
+        suggest.reset()
+        self.addCleanup(suggest.reset)
+        self.client = APIClient()
+        self.series = Series.objects.create(title='Жамийла')
+
+    def get(self, query):
+        response = self.client.get(reverse('reader:series-suggest'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data]
+
+    def test_suggest(self):
+        """Test that suggestions are returned with the series slug."""
+        response = self.client.get(reverse('reader:series-suggest'), {'q': 'zhamiy'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['id'], self.series.pk)
+        self.assertEqual(response.data[0]['slug'], self.series.slug)
+
+    def test_index_follows_changes(self):
+        """Test that the loaded index picks up saved and deleted series and aliases."""
+        self.assertEqual(self.get('jamilia'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Alias.objects.create(name='Jamilia', content_object=self.series)
+            Series.objects.create(title='Moon Blade')
+        self.assertEqual(self.get('jamilia'), ['Жамийла'])
+        self.assertEqual(self.get('moon'), ['Moon Blade'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Alias.objects.get(name='Jamilia').delete()
+        self.assertEqual(self.get('jamilia'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.series.delete()
+        self.assertEqual(self.get('zhamiyla'), [])
+
+    def test_local_changes_do_not_trigger_rebuild(self):
+        """Test that changes made by this process keep the index version current."""
+        self.get('moon')
+        with self.captureOnCommitCallbacks(execute=True):
+            Series.objects.create(title='Moon Blade')
+
+        self.assertEqual(suggest._version, suggest.current_version())
+
+    def test_version_is_bumped_on_commit(self):
+        """Test that other processes are only told about committed changes."""
+        self.get('moon')
+        version = suggest.current_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Series.objects.create(title='Moon Blade')
+            self.assertEqual(suggest.current_version(), version)
+            self.assertEqual(self.get('moon'), [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(suggest.current_version(), version + 1)
+        self.assertEqual(self.get('moon'), ['Moon Blade'])
@@ -0,0 +1,113 @@
+"""
+Tests for on-demand thumbnails.
+"""
+
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from reader import thumbnails
+from reader.imaging import probe_image
+from reader.tests.test_ingestion import make_image
+from reader.thumbnails import ensure_thumbnail, thumbnail_name
+
+
+class ThumbnailTest(SimpleTestCase):
+    """Test rendering and serving thumbnails."""
+
+    def setUp(self):
+        """Set up a storage holding one page image."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+
+        self.storage = FileSystemStorage(location=self.media_root)
+        self.name = self.storage.save('series/test/ch1/abc.png', ContentFile(make_image(800, 1200)))
+
+    def test_renders_once_under_deterministic_key(self):
+        """Test that a thumbnail is stored under its key and reused."""
+        with patch.object(thumbnails, 'render_thumbnail', wraps=thumbnails.render_thumbnail) as render:
+            key = ensure_thumbnail(self.name, 100, self.storage)
+            self.assertEqual(ensure_thumbnail(self.name, 100, self.storage), key)
+
+        self.assertEqual(key, 'thumbnails/100w/series/test/ch1/abc.png.webp')
+        self.assertEqual(render.call_count, 1)
+        with self.storage.open(key) as fileobj:
+            info = probe_image(fileobj)
+        self.assertEqual((info.format, info.size), ('WEBP', (100, 150)))
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Test that simultaneous first requests render the thumbnail once."""
+        barrier = threading.Barrier(6)
+        results = []
+
+        def request():
+            barrier.wait()
+            results.append(ensure_thumbnail(self.name, 200, self.storage))
+
+        with patch.object(thumbnails, 'render_thumbnail', wraps=thumbnails.render_thumbnail) as render:
+            threads = [threading.Thread(target=request) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(set(results), {thumbnail_name(self.name, 200)})
+
+    def test_rejected_requests(self):
+        """Test that unknown widths, thumbnails and missing originals are rejected."""
+        with self.assertRaises(ValueError):
+            ensure_thumbnail(self.name, 123, self.storage)
+        with self.assertRaises(ValueError):
+            ensure_thumbnail(thumbnail_name(self.name, 100), 100, self.storage)
+        with self.assertRaises(FileNotFoundError):
+            ensure_thumbnail('series/missing.png', 100, self.storage)
+
+    def test_only_series_images_have_thumbnails(self):
+        """Test that archives, manifests and names leaving series/ are rejected before opening."""
+        names = [
+            'uploads/chapters/s/vol0/ch1/chapter.zip', 'uploads/chapters/s/page.png',
+            'manifests/abc.json', 'series/test/notes.txt', 'series/../uploads/page.png',
+        ]
+        with patch.object(self.storage, 'open') as open_:
+            for name in names:
+                with self.subTest(name=name), self.assertRaises(ValueError):
+                    ensure_thumbnail(name, 100, self.storage)
+        open_.assert_not_called()
+        self.assertEqual(thumbnails.thumbnail_url('uploads/page.png', 100), '/media/uploads/page.png')
+
+    def test_endpoint(self):
+        """Test that the thumbnail endpoint serves immutable WebP images."""
+        url = reverse('reader:thumbnail', kwargs={'width': 320, 'file_path': self.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        bad_width = reverse('reader:thumbnail', kwargs={'width': 50, 'file_path': self.name})
+        self.assertEqual(self.client.get(bad_width).status_code, 404)
+
+    def test_endpoint_rejects_undecodable_images(self):
+        """Test that non-images and images too large to decode are not found."""
+        self.storage.save('manifests/abc.json', ContentFile(b'{}'))
+        self.storage.save('series/test/ch1/broken.png', ContentFile(b'not an image'))
+        for name in ('manifests/abc.json', 'series/test/ch1/broken.png'):
+            url = reverse('reader:thumbnail', kwargs={'width': 100, 'file_path': name})
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+        url = reverse('reader:thumbnail', kwargs={'width': 100, 'file_path': self.name})
+        with patch.object(thumbnails, 'render_thumbnail', side_effect=Image.DecompressionBombError):
+            self.assertEqual(self.client.get(url).status_code, 404)
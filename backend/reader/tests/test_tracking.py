@@ -0,0 +1,215 @@
+"""
+Unit tests for chapter view counting.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reader import tracking
+from reader.models import ApprovalStatus, Chapter, Series
+from reader.tracking import RecentSet, ViewCounter
+
+
+class TrackingTestCase(TestCase):
+    """Base class starting every test with no pending or remembered views."""
+
+    def setUp(self):
+        cache.clear()
+        tracking.reset()
+        self.addCleanup(tracking.reset)
+        self.series = Series.objects.create(title='Tracked Series')
+        self.chapters = [
+            Chapter.objects.create(
+                title=f'Chapter {number}',
+                number=number,
+                series=self.series,
+                approval_status=ApprovalStatus.APPROVED
+            )
+            for number in (1, 2, 3)
+        ]
+
+    def views(self):
+        return [chapter.views for chapter in Chapter.objects.order_by('number')]
+
+
+class ViewCounterTest(TrackingTestCase):
+    """Test buffering and writing views."""
+
+    def test_flush_writes_one_update(self):
+        """Test that pending views of several chapters are written by one query."""
+        counter = ViewCounter(flush_interval=60, max_pending=100)
+        for chapter, count in zip(self.chapters, (3, 1, 0)):
+            for _ in range(count):
+                counter.add(chapter.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counter.flush(), 2)
+
+        updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "reader_chapter"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.views(), [3, 1, 0])
+        self.assertEqual(len(counter), 0)
+
+    def test_flush_adds_views_to_series_stats(self):
+        """Test that flushed views are added to the series stats."""
+        counter = ViewCounter(flush_interval=60, max_pending=100)
+        counter.add(self.chapters[0].pk, 2)
+        counter.add(self.chapters[1].pk, 3)
+        counter.flush()
+
+        self.series.stats.refresh_from_db()
+        self.assertEqual(self.series.stats.views, 5)
+
+    def test_flush_adds_to_existing_views(self):
+        """Test that flushed views are added to the stored count."""
+        Chapter.objects.filter(pk=self.chapters[0].pk).update(views=10)
+        counter = ViewCounter(flush_interval=60, max_pending=100)
+        counter.add(self.chapters[0].pk, 5)
+        counter.flush()
+
+        self.assertEqual(self.views()[0], 15)
+
+    def test_flush_due(self):
+        """Test that a flush is due after enough chapters or enough time."""
+        counter = ViewCounter(flush_interval=60, max_pending=2)
+        self.assertFalse(counter.add(self.chapters[0].pk))
+        self.assertFalse(counter.add(self.chapters[0].pk))
+        self.assertTrue(counter.add(self.chapters[1].pk))
+
+        counter = ViewCounter(flush_interval=0, max_pending=100)
+        self.assertTrue(counter.add(self.chapters[0].pk))
+
+    def test_failed_flush_keeps_views(self):
+        """Test that views are kept for the next flush when writing fails."""
+        counter = ViewCounter(flush_interval=60, max_pending=100)
+        counter.add(self.chapters[0].pk, 2)
+
+        with mock.patch('reader.tracking.write_views', side_effect=RuntimeError('database down')):
+            self.assertEqual(counter.flush(), 0)
+        counter.add(self.chapters[0].pk)
+        counter.flush()
+
+        self.assertEqual(self.views()[0], 3)
+
+
+class RecentSetTest(TestCase):
+    """Test remembering recently counted views in memory."""
+
+    def test_keys_expire_after_the_window(self):
+        """Test that a key is remembered for at least one window and forgotten after two."""
+        with mock.patch('reader.tracking.time.monotonic', return_value=1000):
+            seen = RecentSet(window=60, max_size=100)
+            self.assertTrue(seen.add('a'))
+            self.assertFalse(seen.add('a'))
+        with mock.patch('reader.tracking.time.monotonic', return_value=1090):
+            self.assertFalse(seen.add('a'))
+        with mock.patch('reader.tracking.time.monotonic', return_value=1200):
+            self.assertTrue(seen.add('a'))
+
+    def test_size_is_bounded(self):
+        """Test that a full generation starts a new one, dropping the oldest keys."""
+        seen = RecentSet(window=60, max_size=2)
+        for key in 'abcde':
+            seen.add(key)
+
+        self.assertLessEqual(len(seen._current) + len(seen._previous), 4)
+        self.assertTrue(seen.add('a'))
+
+
+@override_settings(VIEW_FLUSH_INTERVAL=60, VIEW_FLUSH_MAX_PENDING=100, VIEW_DEDUPE_WINDOW=60)
+class RecordViewTest(TrackingTestCase):
+    """Test counting views of clients."""
+
+    def request(self, address):
+        return RequestFactory().get('/', REMOTE_ADDR=address)
+
+    def test_views_are_buffered(self):
+        """Test that views reach the database when flushed."""
+        tracking.record_view(self.request('10.0.0.1'), self.chapters[0].pk)
+        self.assertEqual(self.views()[0], 0)
+
+        tracking.flush()
+        self.assertEqual(self.views()[0], 1)
+
+    def test_repeated_views_are_ignored(self):
+        """Test that a client is counted once per chapter within the window."""
+        self.assertTrue(tracking.record_view(self.request('10.0.0.1'), self.chapters[0].pk))
+        self.assertFalse(tracking.record_view(self.request('10.0.0.1'), self.chapters[0].pk))
+        self.assertTrue(tracking.record_view(self.request('10.0.0.2'), self.chapters[0].pk))
+        self.assertTrue(tracking.record_view(self.request('10.0.0.1'), self.chapters[1].pk))
+        tracking.flush()
+
+        self.assertEqual(self.views(), [2, 1, 0])
+
+    @override_settings(VIEW_FLUSH_MAX_PENDING=2)
+    def test_flushes_when_due(self):
+        """Test that the view that makes a flush due writes the pending views."""
+        tracking.record_view(self.request('10.0.0.1'), self.chapters[0].pk)
+        tracking.record_view(self.request('10.0.0.1'), self.chapters[1].pk)
+
+        self.assertEqual(self.views(), [1, 1, 0])
+
+
+@override_settings(API_CACHE_TIMEOUT=0, VIEW_FLUSH_INTERVAL=60, VIEW_FLUSH_MAX_PENDING=100)
+class ViewAPITest(TrackingTestCase):
+    """Test the view endpoint and ordering by views."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_count_view(self):
+        """Test that posting to the view endpoint counts a view."""
+        url = reverse('reader:chapter-view', kwargs={'pk': self.chapters[0].pk})
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        tracking.flush()
+
+        self.assertEqual(self.views()[0], 1)
+
+    def test_count_view_of_pending_chapter(self):
+        """Test that views of unapproved chapters are rejected."""
+        Chapter.objects.filter(pk=self.chapters[0].pk).update(approval_status=ApprovalStatus.PENDING)
+
+        response = self.client.post(reverse('reader:chapter-view', kwargs={'pk': self.chapters[0].pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(len(tracking.get_counter()), 0)
+
+    def test_chapters_by_views(self):
+        """Test listing the most viewed chapters first."""
+        tracking.write_views({self.chapters[1].pk: 5, self.chapters[2].pk: 2})
+
+        response = self.client.get(reverse('reader:chapter-list'), {'ordering': '-views'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.chapters[1].pk, self.chapters[2].pk, self.chapters[0].pk]
+        )
+
+    def test_series_by_views(self):
+        """Test listing the series with the most chapter views first."""
+        other = Series.objects.create(title='Other Series')
+        other_chapter = Chapter.objects.create(
+            title='Chapter 1', number=1, series=other, approval_status=ApprovalStatus.APPROVED
+        )
+        tracking.write_views({self.chapters[0].pk: 3, self.chapters[1].pk: 3, other_chapter.pk: 5})
+
+        response = self.client.get(reverse('reader:series-list'), {'ordering': '-views'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [self.series.pk, other.pk]
+        )
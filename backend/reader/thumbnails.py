@@ -0,0 +1,145 @@
+"""
+On-demand thumbnails of page and cover images.
+
+A thumbnail is rendered the first time it is requested and stored under a
+key derived from the original's name and the width, so later requests are
+plain media reads. Page and cover names include a hash of their content
+(see ``Series.cover``), so the key changes with the image and thumbnails are
+served as immutable. Thumbnails of images no longer referenced are left for
+``gc_storage``. Concurrent first requests are coalesced: threads of a
+process share a lock, and processes take a short-lived lock in the Django
+cache, so each thumbnail is rendered once.
+
+Only images under ``series/`` (ingested pages and series covers) have
+thumbnails, so the endpoint cannot be made to load chapter archives or
+other large objects; other images are linked as they are.
+"""
+
+import hashlib
+import os
+import posixpath
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from reader.imaging import render_thumbnail
+from reader.media_urls import media_url
+from reader.validators import IMAGE_EXTENSIONS
+
+THUMBNAIL_PREFIX = 'thumbnails'
+# Storage directory of the images that have thumbnails
+SOURCE_PREFIX = 'series/'
+# How long the existence of a stored thumbnail is remembered
+EXISTS_TIMEOUT = 24 * 60 * 60
+
+# Striped locks coalescing renders within a process
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def allowed_widths():
+    return getattr(settings, 'THUMBNAIL_WIDTHS', [100, 200, 320])
+
+
+def thumbnail_name(name, width):
+    """Return the storage name of the ``width`` thumbnail of ``name``."""
+    return f'{THUMBNAIL_PREFIX}/{width}w/{name}.webp'
+
+
+def has_thumbnails(name):
+    """Return True if the stored image ``name`` may be thumbnailed."""
+    return (
+        name.startswith(SOURCE_PREFIX)
+        and posixpath.normpath(name) == name
+        and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def thumbnail_url(name, width, request=None):
+    """
+    Return the URL serving the ``width`` thumbnail of ``name``.
+
+    Images without thumbnails get the URL of the image itself.
+    """
+    if not has_thumbnails(name):
+        return media_url(name, request)
+    url = reverse('reader:thumbnail', kwargs={'width': width, 'file_path': name})
+    return request.build_absolute_uri(url) if request else url
+
+
+def _local_lock(key):
+    return _locks[int(hashlib.md5(key.encode()).hexdigest(), 16) % len(_locks)]
+
+
+def ensure_thumbnail(name, width, storage=None, wait=10):
+    """
+    Return the storage name of a thumbnail, rendering it if it doesn't exist.
+
+    Args:
+        wait: Seconds to wait for another process rendering the same
+            thumbnail before rendering it anyway
+
+    Raises:
+        ValueError: If ``width`` is not one of ``THUMBNAIL_WIDTHS`` or
+            ``name`` has no thumbnails (see ``has_thumbnails``)
+        FileNotFoundError: If the original image does not exist
+        OSError: If the original cannot be read as an image
+        PIL.Image.DecompressionBombError: If the original is too large to
+            decode
+    """
+    if width not in allowed_widths():
+        raise ValueError(f'Thumbnail width {width} is not allowed')
+    if not has_thumbnails(name):
+        raise ValueError(f'{name} has no thumbnails')
+
+    storage = storage or default_storage
+    key = thumbnail_name(name, width)
+    exists_key = 'thumbnail:' + hashlib.md5(key.encode()).hexdigest()
+    if cache.get(exists_key):
+        return key
+
+    with _local_lock(key):
+        if cache.get(exists_key):
+            return key
+        if storage.exists(key):
+            cache.set(exists_key, True, EXISTS_TIMEOUT)
+            return key
+
+        lock_key = exists_key + ':lock'
+        deadline = time.monotonic() + wait
+        while not cache.add(lock_key, True, timeout=wait):
+            time.sleep(0.05)
+            if cache.get(exists_key):
+                return key
+            if time.monotonic() > deadline:
+                # The other renderer is stuck or gone
+                break
+
+        try:
+            if cache.get(exists_key) or storage.exists(key):
+                cache.set(exists_key, True, EXISTS_TIMEOUT)
+                return key
+            _render(storage, name, width, key)
+            cache.set(exists_key, True, EXISTS_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+    return key
+
+
+def _render(storage, name, width, key):
+    if not storage.exists(name):
+        raise FileNotFoundError(name)
+    with storage.open(name, 'rb') as fileobj:
+        data = fileobj.read()
+
+    _, thumbnail = render_thumbnail(
+        data, width, quality=getattr(settings, 'THUMBNAIL_QUALITY', 75)
+    )
+    saved = storage.save(key, ContentFile(thumbnail))
+    if saved != key:
+        # Lost a race to a renderer that gave up waiting; keep one copy
+        storage.delete(saved)
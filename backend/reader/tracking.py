@@ -0,0 +1,215 @@
+"""
+Write-behind counting of chapter views.
+
+Incrementing ``Chapter.views`` on every read would make concurrent readers of
+a popular chapter queue on its row lock. Instead, each process adds views to
+an in-memory counter and writes them out together, with one ``UPDATE`` for
+all the chapters viewed since the last flush (and one for the stats of their
+series), once ``VIEW_FLUSH_INTERVAL`` seconds have passed or
+``VIEW_FLUSH_MAX_PENDING`` chapters are waiting. The request that crosses
+the threshold does the flush; whatever is still pending when the process
+exits is flushed by an ``atexit`` handler.
+
+A client viewing the same chapter again within ``VIEW_DEDUPE_WINDOW``
+seconds is not counted twice. Clients are told apart by user ID, or by the
+address DRF throttling uses for anonymous requests. The views seen recently
+are remembered in memory, per process, in at most two generations of
+``VIEW_DEDUPE_MAX_ENTRIES``, so the check touches neither the database nor
+the shared cache; a client whose views reach several processes may be
+counted once by each.
+
+Counts are written with ``QuerySet.update``, so they do not change
+``updated_at`` or invalidate cached API responses; listings show new counts
+once their cached responses expire.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from rest_framework.throttling import BaseThrottle
+
+from reader import stats
+
+logger = logging.getLogger(__name__)
+
+def write_views(counts):
+    """Add ``{chapter ID: views}`` to ``Chapter.views`` and to the series stats."""
+    from reader.models import Chapter
+
+    if not counts:
+        return 0
+    increment = Case(
+        *(When(pk=chapter_id, then=Value(count)) for chapter_id, count in counts.items()),
+        default=Value(0),
+    )
+    with transaction.atomic():
+        updated = Chapter.objects.filter(pk__in=list(counts)).update(views=F('views') + increment)
+        stats.add_views(counts)
+    return updated
+
+
+class ViewCounter:
+    """
+    Views waiting to be written, per chapter.
+
+    Args:
+        flush_interval: Seconds after which pending views are due to be written
+        max_pending: Number of chapters after which pending views are due
+    """
+
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, chapter_id, count=1):
+        """Count views of a chapter; returns whether a flush is due."""
+        with self._lock:
+            self._pending[chapter_id] += count
+            return (
+                len(self._pending) >= self.max_pending
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+
+    def flush(self):
+        """
+        Write the pending views to the database.
+
+        Views counted while the write is in progress are kept for the next
+        flush. If another thread is already flushing, returns at once.
+
+        Returns:
+            The number of chapters updated
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                counts, self._pending = self._pending, Counter()
+                self._flushed_at = time.monotonic()
+            try:
+                return write_views(counts)
+            except Exception:
+                logger.exception('Failed to write views of %d chapters', len(counts))
+                with self._lock:
+                    self._pending.update(counts)
+                return 0
+        finally:
+            self._flush_lock.release()
+
+
+class RecentSet:
+    """
+    Keys added within the last ``window`` seconds.
+
+    Keys are kept in two generations of ``window`` seconds, so each is
+    remembered for at least ``window`` seconds, unless a generation fills up
+    with ``max_size`` keys and the next one is started early.
+    """
+
+    def __init__(self, window, max_size):
+        self.window = window
+        self.max_size = max_size
+        self._current = set()
+        self._previous = set()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """Add ``key``; returns False if it was added recently."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._started >= self.window or len(self._current) >= self.max_size:
+                # Both generations are stale after two windows without adds
+                self._previous = self._current if now - self._started < 2 * self.window else set()
+                self._current = set()
+                self._started = now
+            if key in self._current or key in self._previous:
+                return False
+            self._current.add(key)
+            return True
+
+
+_counter = None
+_seen = None
+_counter_lock = threading.Lock()
+
+
+def get_counter():
+    """Return this process's view counter."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = ViewCounter(
+                    flush_interval=getattr(settings, 'VIEW_FLUSH_INTERVAL', 10),
+                    max_pending=getattr(settings, 'VIEW_FLUSH_MAX_PENDING', 500),
+                )
+    return _counter
+
+
+def get_seen():
+    """Return this process's set of recently counted views."""
+    global _seen
+    if _seen is None:
+        with _counter_lock:
+            if _seen is None:
+                _seen = RecentSet(
+                    window=getattr(settings, 'VIEW_DEDUPE_WINDOW', 30 * 60),
+                    max_size=getattr(settings, 'VIEW_DEDUPE_MAX_ENTRIES', 100_000),
+                )
+    return _seen
+
+
+def client_ident(request):
+    """Return a string identifying the client that made ``request``."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'addr:{BaseThrottle().get_ident(request)}'
+
+
+def record_view(request, chapter_id):
+    """
+    Count a view of a chapter, unless the client viewed it recently.
+
+    Returns:
+        Whether the view was counted
+    """
+    window = getattr(settings, 'VIEW_DEDUPE_WINDOW', 30 * 60)
+    # Hashes keep the remembered views small
+    if window and not get_seen().add(hash((chapter_id, client_ident(request)))):
+        return False
+    counter = get_counter()
+    if counter.add(chapter_id):
+        counter.flush()
+    return True
+
+
+def flush():
+    """Write this process's pending views to the database."""
+    if _counter is not None:
+        return _counter.flush()
+    return 0
+
+
+def reset():
+    """Discard this process's pending and remembered views."""
+    global _counter, _seen
+    with _counter_lock:
+        _counter = _seen = None
+
+
+atexit.register(flush)
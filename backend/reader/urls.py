@@ -41,6 +41,12 @@ urlpatterns = [
     path('api/series/<slug:slug>/chapters/', views.SeriesChaptersView.as_view(), name='series-chapters'),
     path('api/chapters/<int:chapter_id>/pages/', views.ChapterPagesView.as_view(), name='chapter-pages'),
     
+    # Thumbnails of page and cover images, rendered on first request
+    path('api/thumbnails/<int:width>/<path:file_path>', views.serve_thumbnail, name='thumbnail'),
+    
+    # Chapter page manifests, named after their content
+    path('api/manifests/<slug:digest>.json', views.serve_manifest, name='manifest'),
+    
     # Media serving endpoint for private S3 files
     path('media/<path:file_path>', views.serve_media_file, name='serve-media'),
     
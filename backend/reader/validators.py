@@ -9,6 +9,11 @@ from pathlib import Path
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import UploadedFile
 
+from reader.imaging import probe_image
+
+# File extensions accepted as chapter pages and cover images
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
 
 def validate_file_size(file: UploadedFile, max_size_mb: int = 500):
     """
@@ -82,7 +87,6 @@ def validate_zip_file(file: UploadedFile):
             
             # Validate directory structure - only allow one level of subdirectory
             folder_count = 0
-            valid_image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
             image_count = 0
             
             for name in zf.namelist():
@@ -102,7 +106,7 @@ def validate_zip_file(file: UploadedFile):
                 else:
                     # Validate image files
                     file_ext = Path(name).suffix.lower()
-                    if file_ext in valid_image_extensions:
+                    if file_ext in IMAGE_EXTENSIONS:
                         image_count += 1
                         
                         # Check individual file size
@@ -126,51 +130,47 @@ def validate_zip_file(file: UploadedFile):
         raise ValidationError(f'Error validating ZIP file: {str(e)}')
 
 
-def validate_image_file(file: UploadedFile):
+def _probe_uploaded_image(file: UploadedFile):
+    """
+    Probe an uploaded image once, verifying its data.
+    
+    Args:
+        file: The uploaded file
+        
+    Returns:
+        The ``ImageInfo`` of the image
+    """
+    # Get file path - handle both TemporaryUploadedFile and InMemoryUploadedFile
+    if hasattr(file, 'temporary_file_path'):
+        return probe_image(file.temporary_file_path(), verify=True)
+    
+    file.seek(0)  # Reset file pointer
+    return probe_image(file, verify=True)
+
+
+def validate_image_file(file: UploadedFile, info=None):
     """
     Validate that the uploaded file is a valid image.
     
     Args:
         file: The uploaded file
+        info: The ``ImageInfo`` of the file, if it was already probed
     """
+    # Check file extension
+    if not any(file.name.lower().endswith(ext) for ext in IMAGE_EXTENSIONS):
+        raise ValidationError('File must be a valid image format (JPEG, PNG, GIF, WebP, or BMP).')
+    
     try:
-        from PIL import Image
-        
-        # Check file extension
-        valid_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
-        if not any(file.name.lower().endswith(ext) for ext in valid_extensions):
-            raise ValidationError('File must be a valid image format (JPEG, PNG, GIF, WebP, or BMP).')
-        
-        # Get file path - handle both TemporaryUploadedFile and InMemoryUploadedFile
-        if hasattr(file, 'temporary_file_path'):
-            file_path = file.temporary_file_path()
-        else:
-            file.seek(0)  # Reset file pointer
-            file_path = file
-        
-        # Try to open and verify the image
-        with Image.open(file_path) as img:
-            img.verify()
-            
-        # Reopen to get dimensions (verify() closes the file)
-        # Reset file pointer for in-memory files
-        if not hasattr(file, 'temporary_file_path'):
-            file.seek(0)
-            
-        with Image.open(file_path) as img:
-            width, height = img.size
-            
-            # Check reasonable dimensions
-            if width > 10000 or height > 10000:
-                raise ValidationError('Image dimensions are too large (maximum: 10000x10000).')
-                
-            if width < 100 or height < 100:
-                raise ValidationError('Image dimensions are too small (minimum: 100x100).')
-                
-    except ValidationError:
-        raise
-    except Exception as e:
+        width, height = (info or _probe_uploaded_image(file)).size
+    except ValidationError as e:
         raise ValidationError('File is not a valid image.') from e
+    
+    # Check reasonable dimensions
+    if width > 10000 or height > 10000:
+        raise ValidationError('Image dimensions are too large (maximum: 10000x10000).')
+        
+    if width < 100 or height < 100:
+        raise ValidationError('Image dimensions are too small (minimum: 100x100).')
 
 
 def validate_cover_image(file: UploadedFile):
@@ -180,33 +180,19 @@ def validate_cover_image(file: UploadedFile):
     Args:
         file: The uploaded file
     """
-    # First validate as a regular image
-    validate_image_file(file)
+    # First validate as a regular image, probing the file only once
+    try:
+        info = _probe_uploaded_image(file)
+    except ValidationError as e:
+        raise ValidationError('File is not a valid image.') from e
+    validate_image_file(file, info=info)
     
     # Additional validation for cover images
     max_size = 2 * 1024 * 1024  # 2MB
     if file.size > max_size:
         raise ValidationError('Cover image must be smaller than 2MB.')
     
-    try:
-        from PIL import Image
-        
-        # Get file path - handle both TemporaryUploadedFile and InMemoryUploadedFile
-        if hasattr(file, 'temporary_file_path'):
-            file_path = file.temporary_file_path()
-        else:
-            file.seek(0)  # Reset file pointer
-            file_path = file
-        
-        with Image.open(file_path) as img:
-            width, height = img.size
-            
-            # Prefer portrait orientation for covers
-            aspect_ratio = width / height
-            if aspect_ratio > 1.5:  # Too wide
-                raise ValidationError('Cover image should be portrait or square (not too wide).')
-                
-    except ValidationError:
-        raise
-    except Exception as e:
-        raise ValidationError('Error validating cover image.') from e
\ No newline at end of file
+    # Prefer portrait orientation for covers
+    aspect_ratio = info.width / info.height
+    if aspect_ratio > 1.5:  # Too wide
+        raise ValidationError('Cover image should be portrait or square (not too wide).')
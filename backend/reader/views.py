@@ -2,22 +2,33 @@
 Views for the MangaKG reader app.
 """
 
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.shortcuts import redirect, render, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Prefetch
+from django.db.models import Q, Count, F, Prefetch
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
+from PIL import Image
 
+from .cache import CachedResponseMixin, SERIES, CHAPTERS, PAGES, PEOPLE, CATEGORIES
+from .filters import RankedOrderingFilter, SeriesSearchFilter
+from .manifests import manifest_name, manifest_url, refresh_chapter_manifests
+from .media import serve_media
 from .models import Series, Chapter, Page, Author, Artist, Category, ApprovalStatus
+from .navigation import chapter_neighbours, page_neighbours
+from .pagination import HybridPagination
 from .serializers import (
     SeriesListSerializer, SeriesDetailSerializer,
     ChapterListSerializer, ChapterDetailSerializer,
     PageSerializer, AuthorSerializer, ArtistSerializer, CategorySerializer
 )
+from .suggest import suggest_series
+from .thumbnails import ensure_thumbnail
+from .tracking import record_view
 
 
 @api_view(['GET'])
@@ -37,21 +48,25 @@ def health_check(request):
         }, status=500)
 
 
-class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
+class SeriesViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Series model providing list and detail views.
-    Supports filtering, searching, and pagination.
+    Supports filtering, searching, and page-number or cursor pagination.
     """
+    cache_namespaces = (SERIES, CHAPTERS, PAGES, PEOPLE, CATEGORIES)
     queryset = Series.objects.prefetch_related(
-        'authors', 'artists', 'categories', 'aliases',
-        Prefetch('chapters', queryset=Chapter.objects.filter(approval_status=ApprovalStatus.APPROVED))
-    ).select_related()
+        'authors__aliases', 'artists__aliases', 'categories', 'aliases'
+    )
     
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search covers titles, aliases, author and artist names and descriptions,
+    # ranked by relevance (see reader.search)
+    filter_backends = [DjangoFilterBackend, SeriesSearchFilter, RankedOrderingFilter]
     filterset_fields = ['status', 'kind', 'rating', 'licensed', 'categories', 'authors', 'artists']
-    search_fields = ['title', 'description', 'authors__name', 'artists__name', 'aliases__name']
-    ordering_fields = ['title', 'updated_at', 'created_at']
-    ordering = ['-updated_at']
+    # `?ordering=-chapters_updated_at` lists the series with the newest
+    # chapters first, `?ordering=-views` the most viewed
+    ordering_fields = ['title', 'updated_at', 'created_at', 'chapters_updated_at', 'views']
+    ordering = ['-updated_at', '-id']
+    pagination_class = HybridPagination
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -62,6 +77,25 @@ class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Filter queryset to only include series with approved chapters."""
         queryset = super().get_queryset()
+        approved_chapters = Chapter.objects.filter(approval_status=ApprovalStatus.APPROVED)
+        
+        if self.action == 'list':
+            # Chapter counts, views and the latest chapter come from the
+            # series stats (see reader.stats), joined in the same query, and
+            # can be ordered by through their indexes
+            queryset = queryset.select_related('stats__latest_chapter__volume').annotate(
+                chapters_updated_at=F('stats__chapters_updated_at'),
+                views=F('stats__views'),
+            )
+            ordering = self.request.query_params.get('ordering', '')
+            if 'chapters_updated_at' in ordering or 'views' in ordering:
+                # An inner join lets the database walk the stats index
+                queryset = queryset.filter(stats__isnull=False)
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related(
+                'volumes',
+                Prefetch('chapters', queryset=approved_chapters.select_related('volume'))
+            )
         
         # Filter by categories if specified
         categories = self.request.query_params.get('categories')
@@ -81,21 +115,33 @@ class SeriesViewSet(viewsets.ReadOnlyModelViewSet):
         
         serializer = ChapterListSerializer(chapters, many=True, context={'request': request})
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Suggest series whose title or an alias resembles ``?q``, for typeahead."""
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        return Response(suggest_series(request.query_params.get('q', ''), limit=max(limit, 1)))
 
 
-class ChapterViewSet(viewsets.ReadOnlyModelViewSet):
+class ChapterViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Chapter model providing list and detail views.
     Only shows approved chapters.
     """
+    cache_namespaces = (SERIES, CHAPTERS, PAGES)
     queryset = Chapter.objects.filter(
         approval_status=ApprovalStatus.APPROVED
     ).select_related('series', 'volume').prefetch_related('pages')
     
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['series', 'volume', 'is_final']
-    ordering_fields = ['published_at', 'number']
-    ordering = ['-published_at']
+    # `?ordering=-views` lists the most viewed chapters first
+    ordering_fields = ['published_at', 'number', 'views']
+    ordering = ['-published_at', '-id']
+    pagination_class = HybridPagination
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -103,6 +149,44 @@ class ChapterViewSet(viewsets.ReadOnlyModelViewSet):
             return ChapterDetailSerializer
         return ChapterListSerializer
     
+    def get_queryset(self):
+        """Skip loading pages when only the chapter's existence matters."""
+        queryset = super().get_queryset()
+        if self.action == 'count_view':
+            queryset = queryset.select_related(None).prefetch_related(None).only('pk')
+        elif self.action == 'manifest':
+            queryset = queryset.select_related(None).prefetch_related(None).only('pk', 'series', 'manifest')
+        return queryset
+    
+    @action(detail=True, methods=['post'], url_path='view', url_name='view')
+    def count_view(self, request, pk=None):
+        """
+        Count a view of the chapter.
+        
+        Readers call this when they open a chapter, since chapter responses
+        are served from the cache. Views are written in batches (see
+        reader.tracking).
+        """
+        chapter = self.get_object()
+        record_view(request, chapter.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['get'])
+    def manifest(self, request, pk=None):
+        """
+        Redirect to the chapter's stored page manifest.
+        
+        Manifests are built when chapters are approved (see
+        reader.manifests); one missing for any reason is built here.
+        """
+        chapter = self.get_object()
+        if not chapter.manifest:
+            refresh_chapter_manifests(chapter.series_id, [chapter.pk], neighbours=False)
+            chapter.refresh_from_db(fields=['manifest'])
+            if not chapter.manifest:
+                raise Http404('Manifest not found')
+        return redirect(manifest_url(chapter, request))
+    
     @action(detail=True, methods=['get'])
     def pages(self, request, pk=None):
         """Get pages for a specific chapter."""
@@ -113,8 +197,9 @@ class ChapterViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
+class AuthorViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for Author model."""
+    cache_namespaces = (PEOPLE,)
     queryset = Author.objects.prefetch_related('aliases').all()
     serializer_class = AuthorSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -122,8 +207,9 @@ class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['name']
 
 
-class ArtistViewSet(viewsets.ReadOnlyModelViewSet):
+class ArtistViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for Artist model."""
+    cache_namespaces = (PEOPLE,)
     queryset = Artist.objects.prefetch_related('aliases').all()
     serializer_class = ArtistSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -131,8 +217,9 @@ class ArtistViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['name']
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for Category model."""
+    cache_namespaces = (CATEGORIES,)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -140,10 +227,11 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['name']
 
 
-class SeriesChaptersView(APIView):
+class SeriesChaptersView(CachedResponseMixin, APIView):
     """
     Custom view to get chapters for a specific series by slug.
     """
+    cache_namespaces = (SERIES, CHAPTERS, PAGES)
     
     def get(self, request, slug):
         """Get chapters for a series."""
@@ -156,10 +244,11 @@ class SeriesChaptersView(APIView):
         return Response(serializer.data)
 
 
-class ChapterPagesView(APIView):
+class ChapterPagesView(CachedResponseMixin, APIView):
     """
     Custom view to get pages for a specific chapter.
     """
+    cache_namespaces = (CHAPTERS, PAGES)
     
     def get(self, request, chapter_id):
         """Get pages for a chapter."""
@@ -215,14 +304,15 @@ def chapter_detail(request, series_slug, volume, number):
         )
     
     pages = chapter.pages.all().order_by('number')
+    record_view(request, chapter.pk)
     
     # Get previous and next chapters
-    chapters = series.chapters.filter(approval_status=ApprovalStatus.APPROVED).order_by('volume__number', 'number')
-    chapter_list = list(chapters)
-    current_index = next((i for i, ch in enumerate(chapter_list) if ch.id == chapter.id), None)
-    
-    prev_chapter = chapter_list[current_index - 1] if current_index and current_index > 0 else None
-    next_chapter = chapter_list[current_index + 1] if current_index is not None and current_index < len(chapter_list) - 1 else None
+    prev_link, next_link = chapter_neighbours(chapter)
+    chapters = Chapter.objects.select_related('series', 'volume').in_bulk(
+        [link.id for link in (prev_link, next_link) if link]
+    )
+    prev_chapter = chapters.get(prev_link.id) if prev_link else None
+    next_chapter = chapters.get(next_link.id) if next_link else None
     
     context = {
         'series': series,
@@ -260,11 +350,7 @@ def page_view(request, series_slug, volume, chapter_number, page_number):
     pages = chapter.pages.all().order_by('number')
     
     # Get previous and next pages
-    page_list = list(pages)
-    current_index = next((i for i, p in enumerate(page_list) if p.id == page.id), None)
-    
-    prev_page = page_list[current_index - 1] if current_index and current_index > 0 else None
-    next_page = page_list[current_index + 1] if current_index is not None and current_index < len(page_list) - 1 else None
+    prev_page, next_page = page_neighbours(page)
     
     context = {
         'series': series,
@@ -277,38 +363,44 @@ def page_view(request, series_slug, volume, chapter_number, page_number):
     return render(request, 'reader/page_detail.html', context)
 
 
-@api_view(['GET'])
+@require_safe
 def serve_media_file(request, file_path):
     """
-    Serve media files from S3 storage through Django.
-    This allows us to serve private S3 files with proper authentication.
+    Serve media files from storage through Django.
+
+    Files are streamed in chunks rather than loaded into memory, and
+    ``Range``/``If-Range`` and ``If-None-Match`` requests are honoured.
+    """
+    return serve_media(request, file_path)
+
+
+@require_safe
+def serve_thumbnail(request, width, file_path):
+    """
+    Serve a thumbnail of a page or cover image, rendering it on first use.
+
+    Thumbnails never change once rendered, so they are cached for a year.
     """
-    from django.core.files.storage import default_storage
-    from django.http import HttpResponse, Http404
-    import mimetypes
-    
     try:
-        # Check if file exists
-        if not default_storage.exists(file_path):
-            raise Http404("File not found")
-        
-        # Open the file from S3
-        file = default_storage.open(file_path, 'rb')
-        
-        # Determine content type
-        content_type, _ = mimetypes.guess_type(file_path)
-        if content_type is None:
-            content_type = 'application/octet-stream'
-        
-        # Create response with the file content
-        response = HttpResponse(file.read(), content_type=content_type)
-        
-        # Add caching headers for better performance
-        response['Cache-Control'] = 'public, max-age=86400'  # 24 hours
-        
-        file.close()
-        return response
-        
-    except Exception as e:
-        # Log error but don't expose internal details
-        return HttpResponse(status=404)
\ No newline at end of file
+        name = ensure_thumbnail(file_path, width)
+    except (ValueError, OSError, Image.DecompressionBombError):
+        # Not an image that has thumbnails, missing, or not decodable
+        raise Http404('Thumbnail not found')
+
+    response = serve_media(request, name)
+    if response.status_code in (200, 206, 304):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@require_safe
+def serve_manifest(request, digest):
+    """
+    Serve a stored chapter page manifest.
+
+    Manifests are named after their content, so they are cached for a year.
+    """
+    response = serve_media(request, manifest_name(digest))
+    if response.status_code in (200, 206, 304):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response